@@ -0,0 +1,157 @@
+# Admission control for the analyses: a worker runs at most
+# ANALYSIS_CONCURRENCY of them at once, up to ANALYSIS_QUEUE_SIZE more per lane
+# wait for a slot (interactive ones first, see lanes) for at most
+# ANALYSIS_QUEUE_TIMEOUT seconds, and the others are rejected right away,
+# before their upload is read:
+# - 429 when the queue is full,
+# - 503 when the wait took too long,
+# both with a Retry-After estimated from the recent analysis durations.
+#
+# Only the paths doing analyses are admitted this way: lookups and the status
+# are served whatever the load. The time to answer an admitted analysis, queue
+# included, is observed per lane.
+
+import asyncio
+import contextlib
+import math
+import time
+import typing
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend import lanes, metrics, settings
+
+ANALYSIS_PATHS = ("/api/analyze",)
+
+# weight of the last analysis in the average duration
+SMOOTHING = 0.2
+
+
+class RejectedError(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Admission:
+    def __init__(
+        self,
+        limit: int = settings.ANALYSIS_CONCURRENCY,
+        queue_size: int = settings.ANALYSIS_QUEUE_SIZE,
+        queue_timeout: float = settings.ANALYSIS_QUEUE_TIMEOUT,
+        bulk_share: float = settings.LANE_BULK_SHARE,
+    ):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self._waiters = lanes.Waiters(bulk_share)
+        # in seconds, a guess until an analysis is done
+        self._duration = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        # the time the analyses ahead take to be done
+        ahead = self.running + self.waiting
+        return max(math.ceil(self._duration * ahead / max(self.limit, 1)), 1)
+
+    def _reject(
+        self, status_code: int, detail: str, reason: str, lane: lanes.Lane
+    ) -> RejectedError:
+        metrics.ANALYSES_REJECTED.labels(reason, lane).inc()
+        return RejectedError(status_code, detail, self.retry_after())
+
+    def _release(self, duration: float):
+        self._duration += SMOOTHING * (duration - self._duration)
+        if not self._waiters.wake():
+            self.running -= 1
+
+    async def _wait(self, lane: lanes.Lane):
+        if self._waiters.count(lane) >= self.queue_size:
+            raise self._reject(429, "Too many analyses queued", "queue_full", lane)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(lane, waiter)
+        metrics.ANALYSIS_QUEUE_DEPTH.labels(lane).inc()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            # handed a slot right as the wait ended: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self._release(self._duration)
+
+            self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                raise self._reject(
+                    503,
+                    "Timed out waiting for an analysis slot",
+                    "queue_timeout",
+                    lane,
+                ) from e
+
+            raise
+        finally:
+            metrics.ANALYSIS_QUEUE_DEPTH.labels(lane).dec()
+            metrics.ANALYSIS_QUEUE_SECONDS.labels(lane).observe(
+                time.perf_counter() - start
+            )
+
+    @contextlib.asynccontextmanager
+    async def admit(
+        self, lane: lanes.Lane | None = None
+    ) -> typing.AsyncGenerator[None, None]:
+        if self.limit <= 0:
+            yield
+            return
+
+        # a slot is either free or handed over by a finished analysis
+        if self.running < self.limit and self.waiting == 0:
+            self.running += 1
+        else:
+            await self._wait(lane or lanes.current())
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - start)
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        admission: Admission | None = None,
+        paths: tuple[str, ...] = ANALYSIS_PATHS,
+    ):
+        self.app = app
+        self.admission = admission or Admission()
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        lane = lanes.from_headers(scope["headers"])
+        start = time.perf_counter()
+        try:
+            with lanes.assign(lane):
+                async with self.admission.admit(lane):
+                    await self.app(scope, receive, send)
+
+            metrics.LANE_SECONDS.labels(lane).observe(time.perf_counter() - start)
+        except RejectedError as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
@@ -1,25 +1,44 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 
-from backend import dependencies, settings
+from backend import cache, dependencies, local_cache, schemas, settings
 
 router = APIRouter()
 
 
 @router.get(
     "/",
-    response_description="Return cache keys",
-    summary="Get analysis cache keys",
-    description="Try to get analysis cache keys",
+    response_description="Return summaries of cached analyses",
+    summary="Get analysis cache summaries",
+    description="Try to get summaries of cached analyses (newest first)",
 )
-async def cache_keys(optional_redis: dependencies.OptionalRedis) -> list[str]:
-    if optional_redis is None or not settings.REDIS_CACHE_LIST_AVAILABLE:
+async def cache_summaries(
+    optional_store: dependencies.OptionalStore,
+    cursor: str | None = Query(
+        default=None, description="nextCursor of the previous page"
+    ),
+    limit: int = Query(default=50, ge=1, le=500),
+) -> schemas.CachePage:
+    if optional_store is None or not settings.REDIS_CACHE_LIST_AVAILABLE:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Redis cache is not enabled",
+            detail="Cache is not enabled",
         )
 
-    byte_keys: list[bytes] = optional_redis.keys(f"{settings.REDIS_KEY_PREFIX}:*")  # type: ignore
-    return [
-        byte_key.decode().removeprefix(f"{settings.REDIS_KEY_PREFIX}:")
-        for byte_key in byte_keys
-    ]
+    try:
+        parsed = cache.parse_cursor(cursor) if cursor is not None else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+
+    return optional_store.list_summaries(cursor=parsed, limit=limit)
+
+
+@router.get(
+    "/stats",
+    response_description="Return statistics of the in-memory cache",
+    summary="Get in-memory cache statistics",
+    description="Get hit/miss statistics of the in-memory cache of this worker",
+)
+async def local_cache_stats() -> schemas.LocalCacheStats:
+    return local_cache.local_cache.stats()
@@ -1,30 +1,170 @@
-from fastapi import APIRouter, HTTPException, status
+import hashlib
+import json
+from collections.abc import Iterator
 
-from backend import dependencies, schemas, settings
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+
+from backend import cache, dependencies, local_cache, projection, schemas, utils
 
 router = APIRouter()
 
 
+def _stream_bulk(
+    ids: list[str],
+    got: list[cache.CachedAnalysis | None],
+    projected: projection.Projection | None = None,
+) -> Iterator[bytes]:
+    # assemble the JSON array from the cached bytes, one item at a time
+    yield b"["
+    for index, (id, cached) in enumerate(zip(ids, got, strict=True)):
+        analysis = cached.to_json(projected) if cached is not None else b"null"
+        separator = b"," if index > 0 else b""
+        yield separator + b'{"id":' + json.dumps(id).encode() + b',"analysis":'
+        yield analysis + b"}"
+
+    yield b"]"
+
+
+@router.post(
+    "/bulk",
+    response_description="Return analysis results in the order of the ids",
+    summary="Lookup cached analyses in bulk",
+    description="Try to fetch existing analyses from database in one round trip",
+    response_model=list[schemas.BulkLookupResult],
+)
+async def bulk_lookup(
+    payload: schemas.BulkLookupPayload,
+    *,
+    optional_store: dependencies.OptionalStore,
+    optional_projection: dependencies.OptionalProjection,
+) -> StreamingResponse:
+    if optional_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Cache is not enabled",
+        )
+
+    got = local_cache.fetch(optional_store, payload.ids, optional_projection)
+    return StreamingResponse(
+        _stream_bulk(payload.ids, got, optional_projection),
+        media_type="application/json",
+    )
+
+
+def _entity_tags(etag: str, projected: projection.Projection | None) -> list[str]:
+    # the tags of the identity and gzip representations
+    if projected is not None:
+        digest = hashlib.sha256(json.dumps(projected, sort_keys=True).encode())
+        etag = f"{etag}-{digest.hexdigest()[:8]}"
+
+    # the identity body may still be gzipped by GZipMiddleware, so its tag is
+    # weak. the gzip body is served as stored, byte for byte
+    return [f'W/"{etag}"', f'"{etag}-gzip"']
+
+
+def _matching_tag(if_none_match: str, tags: list[str]) -> str | None:
+    # weak comparison, as If-None-Match requires
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return tags[0]
+
+    return next((tag for tag in tags if tag.removeprefix("W/") in candidates), None)
+
+
 @router.get(
     "/{id}",
     response_description="Return an analysis result",
     summary="Lookup cached analysis",
     description="Try to fetch existing analysis from database",
+    response_model=schemas.Response,
+    responses={304: {"description": "Not modified (If-None-Match)"}},
 )
 async def lookup(
-    id: str, *, optional_redis: dependencies.OptionalRedis
-) -> schemas.Response:
-    if optional_redis is None:
+    id: str,
+    *,
+    optional_store: dependencies.OptionalStore,
+    optional_projection: dependencies.OptionalProjection,
+    accept_encoding: str = Header(default=""),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    if optional_store is None:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Redis cache is not enabled",
+            detail="Cache is not enabled",
         )
 
-    got: bytes | None = optional_redis.get(f"{settings.REDIS_KEY_PREFIX}:{id}")  # type: ignore
-    if got is None:
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if if_none_match is not None:
+        # only the etag is read to answer a conditional request
+        etag = local_cache.fetch_etag(optional_store, id)
+        if etag is not None:
+            tag = _matching_tag(if_none_match, _entity_tags(etag, optional_projection))
+            if tag is not None:
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={**headers, "ETag": tag},
+                )
+
+    (cached,) = local_cache.fetch(
+        optional_store,
+        [id],
+        optional_projection,
+        counted=if_none_match is not None,
+    )
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cache not found",
         )
 
-    return schemas.Response.model_validate_json(got.decode())
+    tags = _entity_tags(cached.etag, optional_projection) if cached.etag else []
+    gzipped = cached.gzipped
+    if (
+        optional_projection is None
+        and gzipped is not None
+        and utils.accepts_encoding(accept_encoding, "gzip")
+    ):
+        # stored gzipped already, GZipMiddleware leaves an encoded body alone
+        if len(tags) > 0:
+            headers["ETag"] = tags[1]
+
+        return Response(
+            content=gzipped,
+            media_type="application/json",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+
+    if len(tags) > 0:
+        headers["ETag"] = tags[0]
+
+    # the cached parts are serialized already, no need to validate them again
+    content = cached.to_json(optional_projection)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/{id}/profile",
+    response_description="Return collapsed stacks (flamegraph.pl, speedscope)",
+    summary="Lookup the profile of an analysis",
+    description="Fetch the sampled stacks of a profiled analysis (admin only)",
+    response_class=Response,
+    dependencies=[Depends(dependencies.verify_profiling_token)],
+)
+async def lookup_profile(
+    id: str, *, optional_store: dependencies.OptionalStore
+) -> Response:
+    if optional_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Cache is not enabled",
+        )
+
+    profile = optional_store.fetch_profile(id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+
+    return Response(content=profile, media_type="text/plain")
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Query, status
+
+from backend import dependencies, schemas
+
+router = APIRouter()
+
+
+@router.get(
+    "/",
+    response_description="Return summaries of matching analyses",
+    summary="Search cached analyses by indicators",
+    description="Find cached analyses containing all of the given indicators (newest first)",
+)
+async def search(
+    optional_store: dependencies.OptionalStore,
+    sha256: str | None = Query(default=None, description="SHA256 of an attachment"),
+    url: str | None = Query(default=None, description="URL in a body"),
+    from_: str | None = Query(default=None, alias="from", description="Sender"),
+    domain: str | None = Query(default=None, description="Domain in a body"),
+    ip: str | None = Query(default=None, description="IP address in a body"),
+    limit: int = Query(default=50, ge=1, le=500),
+) -> list[schemas.CacheSummary]:
+    if optional_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Cache is not enabled",
+        )
+
+    given = {"sha256": sha256, "url": url, "from": from_, "domain": domain, "ip": ip}
+    indicators = [(kind, value) for kind, value in given.items() if value]
+    if len(indicators) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one indicator is required",
+        )
+
+    return optional_store.search(indicators, limit=limit)
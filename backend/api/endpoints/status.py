@@ -1,3 +1,5 @@
+import os
+
 from fastapi import APIRouter
 
 from backend import dependencies, schemas
@@ -7,16 +9,26 @@ router = APIRouter()
 
 @router.get("/")
 async def get_status(
-    optional_redis: dependencies.OptionalRedis,
+    optional_store: dependencies.OptionalStore,
     optional_email_rep: dependencies.OptionalEmailRep,
     optional_inquest: dependencies.OptionalInQuest,
     optional_vt: dependencies.OptionalVirusTotal,
     optional_urlscan: dependencies.OptionalUrlScan,
 ) -> schemas.Status:
+    configured: dict[schemas.Provider, bool] = {
+        "spamassassin": True,
+        "oleid": True,
+        "emailrep": optional_email_rep is not None,
+        "virustotal": optional_vt is not None,
+        "inquest": optional_inquest is not None,
+        "urlscan": optional_urlscan is not None,
+        "openai": os.getenv("OPENAI_API_KEY") is not None,
+    }
     return schemas.Status(
-        cache=optional_redis is not None,
+        cache=optional_store is not None,
         vt=optional_vt is not None,
         inquest=optional_inquest is not None,
         email_rep=optional_email_rep is not None,
         urlscan=optional_urlscan is not None,
+        providers=[provider for provider, ok in configured.items() if ok],
     )
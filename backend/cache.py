@@ -0,0 +1,625 @@
+import gzip
+import hashlib
+import itertools
+import json
+import threading
+import time
+import typing
+import uuid
+import zlib
+from datetime import UTC, datetime
+from functools import cached_property
+
+from loguru import logger
+from pydantic import TypeAdapter
+from redis import Redis, RedisError, ResponseError
+
+from backend import projection, schemas, settings
+from backend.datastructures import DatabaseURL
+
+response_adapter = TypeAdapter(schemas.Response)
+summary_adapter = TypeAdapter(schemas.CacheSummary)
+id_adapter = TypeAdapter(str)
+
+# an analysis is cached as a hash of
+# - "response": the gzipped HTTP body, served to clients as is
+# - "header" and "verdicts": the small parts, so that a projection on them
+#   (e.g. the summary and verdicts profiles) reads neither the body nor
+#   decompresses it
+# - "etag": a digest of the HTTP body
+# attachments and bodies are only cut out of the body
+part_adapters: dict[str, TypeAdapter] = {
+    "attachments": TypeAdapter(list[schemas.Attachment]),
+    "bodies": TypeAdapter(list[schemas.Body]),
+    "header": TypeAdapter(schemas.Header),
+    "verdicts": TypeAdapter(list[schemas.Verdict]),
+}
+PARTS = tuple(part_adapters.keys())
+EML_PARTS = ("attachments", "bodies", "header")
+SEPARATE_PARTS = ("header", "verdicts")
+
+# every part of an analysis, e.g. for an entry kept to serve any projection
+WHOLE: projection.Projection = {"eml": True, "verdicts": True, "id": True}
+
+
+# a compressed field starts with a format version byte. an uncompressed one
+# is JSON and always starts with "{" or "[", so the two can never be confused
+FORMAT_GZIP = b"\x02"
+
+
+def serialize_parts(response: schemas.Response) -> dict[str, bytes]:
+    return {
+        "attachments": part_adapters["attachments"].dump_json(
+            response.eml.attachments, by_alias=True
+        ),
+        "bodies": part_adapters["bodies"].dump_json(response.eml.bodies, by_alias=True),
+        "header": part_adapters["header"].dump_json(response.eml.header, by_alias=True),
+        "verdicts": part_adapters["verdicts"].dump_json(
+            response.verdicts, by_alias=True
+        ),
+    }
+
+
+def _eml_projection(
+    projected: projection.Projection, name: str
+) -> projection.Projection | bool:
+    eml = projected.get("eml", False)
+    if isinstance(eml, bool):
+        return eml
+
+    return eml.get(name, False)
+
+
+def needed_parts(projected: projection.Projection | None = None) -> tuple[str, ...]:
+    if projected is None:
+        return PARTS
+
+    names = [name for name in EML_PARTS if _eml_projection(projected, name)]
+    if "verdicts" in projected:
+        names.append("verdicts")
+
+    return tuple(names)
+
+
+def assemble(
+    id: str,
+    parts: dict[str, bytes],
+    projected: projection.Projection | None = None,
+) -> bytes:
+    # joins the parts in the field order of schemas.Response. without a
+    # projection the result is the same bytes FastAPI would produce
+    if projected is None:
+        projected = WHOLE
+
+    members: list[bytes] = []
+    if "eml" in projected:
+        eml_members: list[bytes] = []
+        for name in EML_PARTS:
+            child = _eml_projection(projected, name)
+            if child is not False:
+                eml_members.append(
+                    b'"'
+                    + name.encode()
+                    + b'":'
+                    + projection.project_json(parts[name], child)
+                )
+
+        members.append(b'"eml":{' + b",".join(eml_members) + b"}")
+
+    if "verdicts" in projected:
+        members.append(
+            b'"verdicts":'
+            + projection.project_json(parts["verdicts"], projected["verdicts"])
+        )
+
+    if "id" in projected:
+        members.append(b'"id":' + id_adapter.dump_json(id))
+
+    return b"{" + b",".join(members) + b"}"
+
+
+def serialize(response: schemas.Response) -> bytes:
+    return assemble(response.id, serialize_parts(response))
+
+
+def encode(serialized: bytes, level: int = settings.REDIS_COMPRESSION_LEVEL) -> bytes:
+    if level <= 0:
+        return serialized
+
+    return FORMAT_GZIP + gzip.compress(serialized, level, mtime=0)
+
+
+def decode(cached: bytes) -> bytes:
+    if cached.startswith(FORMAT_GZIP):
+        return gzip.decompress(memoryview(cached)[1:])
+
+    if cached.startswith((b"{", b"[")):
+        return cached
+
+    raise ValueError(f"Unknown cache format: {cached[:1]!r}")
+
+
+def to_fields(
+    id: str, parts: dict[str, bytes], level: int = settings.REDIS_COMPRESSION_LEVEL
+) -> dict[str, bytes]:
+    serialized = assemble(id, parts)
+    return {
+        "response": encode(serialized, level),
+        **{name: encode(parts[name], level) for name in SEPARATE_PARTS},
+        "etag": hashlib.sha256(serialized).hexdigest()[:32].encode(),
+    }
+
+
+class CachedAnalysis:
+    def __init__(
+        self, id: str, fields: dict[str, bytes | None], ttl: float | None = None
+    ):
+        self.id = id
+        self.fields = fields
+        # seconds the entry has left in Redis (None: no expiry or not known)
+        self.ttl = ttl
+
+    @property
+    def etag(self) -> str | None:
+        etag = self.fields.get("etag")
+        return etag.decode() if etag is not None else None
+
+    @property
+    def gzipped(self) -> bytes | None:
+        cached = self.fields.get("response")
+        if cached is None or not cached.startswith(FORMAT_GZIP):
+            return None
+
+        return cached[1:]
+
+    @cached_property
+    def serialized(self) -> bytes:
+        cached = self.fields.get("response")
+        if cached is None:
+            raise ValueError(f"The body of {self.id} has not been read")
+
+        return decode(cached)
+
+    @cached_property
+    def _parsed(self) -> dict[str, typing.Any]:
+        return json.loads(self.serialized)
+
+    def part(self, name: str) -> bytes:
+        cached = self.fields.get(name)
+        if cached is not None:
+            return decode(cached)
+
+        parsed = self._parsed if name == "verdicts" else self._parsed["eml"]
+        return json.dumps(
+            parsed[name], ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+    def to_json(self, projected: projection.Projection | None = None) -> bytes:
+        if projected is None:
+            return self.serialized
+
+        parts = {name: self.part(name) for name in needed_parts(projected)}
+        return assemble(self.id, parts, projected)
+
+
+def field_names(projected: projection.Projection | None) -> list[str]:
+    if projected is None:
+        return ["response", "etag"]
+
+    # the etag is read even when the projection needs no part (fields=id):
+    # HMGET needs a field, and a missing entry has to be told apart
+    names = needed_parts(projected)
+    fields = ["etag", *(name for name in names if name in SEPARATE_PARTS)]
+    if any(name not in SEPARATE_PARTS for name in names):
+        fields.insert(0, "response")
+
+    return fields
+
+
+def fetch(
+    redis: Redis,
+    ids: list[str],
+    projected: projection.Projection | None = None,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+    with_ttl: bool = False,
+) -> list[CachedAnalysis | None]:
+    names = field_names(projected)
+    pipeline = redis.pipeline(transaction=False)
+    for id in ids:
+        pipeline.hmget(f"{key_prefix}:{id}", names)
+        if with_ttl:
+            pipeline.pttl(f"{key_prefix}:{id}")
+
+    # an entry cached before the hash layout raises WRONGTYPE until the
+    # backfill has rewritten it (see backfill_index): a miss meanwhile
+    results = pipeline.execute(raise_on_error=False)
+    ttls: list[float | None] = [None] * len(ids)
+    if with_ttl:
+        # PTTL is -1 without an expiry and -2 for a missing key
+        ttls = [ttl / 1000 if ttl >= 0 else None for ttl in results[1::2]]
+        results = results[::2]
+
+    fetched: list[CachedAnalysis | None] = []
+    for id, values, ttl in zip(ids, results, ttls, strict=True):
+        if isinstance(values, ResponseError) or all(value is None for value in values):
+            fetched.append(None)
+            continue
+
+        fetched.append(CachedAnalysis(id, dict(zip(names, values, strict=True)), ttl))
+
+    return fetched
+
+
+def fetch_etag(
+    redis: Redis, id: str, key_prefix: str = settings.REDIS_KEY_PREFIX
+) -> str | None:
+    try:
+        etag: bytes | None = redis.hget(f"{key_prefix}:{id}", "etag")  # type: ignore
+    except ResponseError:
+        # not rewritten into a hash yet
+        return None
+
+    return etag.decode() if etag is not None else None
+
+
+def summarize(
+    response: schemas.Response, analyzed_at: float | None = None
+) -> schemas.CacheSummary:
+    header = response.eml.header
+    return schemas.CacheSummary(
+        id=response.id,
+        subject=header.subject,
+        from_=header.from_,
+        date=header.date,
+        analyzed_at=datetime.fromtimestamp(
+            analyzed_at if analyzed_at is not None else time.time(), tz=UTC
+        ),
+        verdicts=[
+            schemas.CacheVerdict(name=verdict.name, malicious=verdict.malicious)
+            for verdict in response.verdicts
+        ],
+    )
+
+
+# the index keys do not match "{key_prefix}:*", so they never show up as entries
+def index_key(key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}-index"
+
+
+def summaries_key(key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}-summaries"
+
+
+# "running" while a worker backfills the index, "done" once it has
+def backfill_key(key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}-backfill"
+
+
+# the pub/sub channel an id is published to whenever its entry is rewritten
+def invalidation_channel(key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}-invalidate"
+
+
+def profile_key(id: str, key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}-profile:{id}"
+
+
+def cache_profile(
+    redis: Redis,
+    id: str,
+    profile: bytes,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+):
+    # collapsed stacks repeat the same frames over and over
+    redis.set(
+        profile_key(id, key_prefix),
+        zlib.compress(profile),
+        ex=expire if expire > 0 else None,
+    )
+
+
+def fetch_profile(
+    redis: Redis, id: str, key_prefix: str = settings.REDIS_KEY_PREFIX
+) -> bytes | None:
+    profile: bytes | None = redis.get(profile_key(id, key_prefix))  # type: ignore
+    return zlib.decompress(profile) if profile is not None else None
+
+
+# kind of indicator -> how to pull its values out of an analysis
+INDICATORS: dict[str, typing.Callable[[schemas.Response], typing.Iterable[str]]] = {
+    "sha256": lambda response: response.sha256s,
+    "url": lambda response: response.urls,
+    "from": lambda response: filter(None, [response.eml.header.from_]),
+    "domain": lambda response: response.domains,
+    "ip": lambda response: response.ip_addresses,
+}
+
+
+def indicator_key(
+    kind: str, value: str, key_prefix: str = settings.REDIS_KEY_PREFIX
+) -> str:
+    # URLs are case sensitive, the other indicators are not
+    normalized = value if kind == "url" else value.lower()
+    return f"{key_prefix}-ioc:{kind}:{normalized}"
+
+
+def indicator_keys(
+    response: schemas.Response, key_prefix: str = settings.REDIS_KEY_PREFIX
+) -> set[str]:
+    return {
+        indicator_key(kind, value, key_prefix)
+        for kind, values in INDICATORS.items()
+        for value in values(response)
+    }
+
+
+def trim_index(
+    redis: Redis,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+):
+    if expire <= 0:
+        return
+
+    # ids analyzed more than `expire` seconds ago are gone from the cache
+    expired: list[str] = [
+        id.decode()
+        for id in redis.zrangebyscore(  # type: ignore
+            index_key(key_prefix), "-inf", time.time() - expire
+        )
+    ]
+    if len(expired) == 0:
+        return
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.zrem(index_key(key_prefix), *expired)
+    pipeline.hdel(summaries_key(key_prefix), *expired)
+    pipeline.execute()
+
+
+def cache_response(
+    redis: Redis,
+    response: schemas.Response,
+    parts: dict[str, bytes] | None = None,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+):
+    ex = expire if expire > 0 else None
+    parts = parts if parts is not None else serialize_parts(response)
+    now = time.time()
+
+    key = f"{key_prefix}:{response.id}"
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hset(key, mapping=to_fields(response.id, parts))  # type: ignore
+    if ex is not None:
+        pipeline.expire(key, ex)
+
+    pipeline.zadd(index_key(key_prefix), {response.id: now})
+    pipeline.hset(
+        summaries_key(key_prefix),
+        response.id,
+        summary_adapter.dump_json(summarize(response, now), by_alias=True),  # type: ignore
+    )
+    for indicator in indicator_keys(response, key_prefix):
+        pipeline.zadd(indicator, {response.id: now})
+        # expires together with the latest analysis containing the indicator,
+        # and drops the analyses which have expired meanwhile
+        if ex is not None:
+            pipeline.zremrangebyscore(indicator, "-inf", now - ex)
+            pipeline.expire(indicator, ex)
+
+    pipeline.publish(invalidation_channel(key_prefix), response.id)
+    pipeline.execute()
+
+    trim_index(redis, expire=expire, key_prefix=key_prefix)
+
+
+def backfill_index(
+    redis: Redis,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+    batch_size: int = 100,
+):
+    # entries cached (as a JSON string) before the hash layout and the index
+    # existed: rewritten into a hash and indexed. SCAN walks the keyspace in
+    # small steps instead of blocking Redis the way KEYS does
+    keys = redis.scan_iter(match=f"{key_prefix}:*", count=batch_size)
+    while batch := list(itertools.islice(keys, batch_size)):
+        pipeline = redis.pipeline(transaction=False)
+        for key in batch:
+            pipeline.get(key)
+            pipeline.ttl(key)
+
+        # hashes raise WRONGTYPE on GET, they have been indexed when written
+        results = pipeline.execute(raise_on_error=False)
+        now = time.time()
+        # a reader sees either the string or the hash
+        pipeline = redis.pipeline(transaction=True)
+        scores: dict[str, float] = {}
+        summaries: dict[str, bytes] = {}
+        for key, cached, ttl in zip(batch, results[::2], results[1::2], strict=True):
+            if not isinstance(cached, bytes):
+                continue
+
+            try:
+                response = response_adapter.validate_json(decode(cached))
+            except (ValueError, OSError, EOFError, zlib.error):
+                # not an analysis, or a corrupt (BadGzipFile) or truncated one
+                continue
+
+            pipeline.delete(key)
+            pipeline.hset(
+                key, mapping=to_fields(response.id, serialize_parts(response))
+            )  # type: ignore
+            if ttl > 0:
+                pipeline.expire(key, ttl)
+
+            # the analysis time is only known through the remaining TTL
+            analyzed_at = now - (expire - ttl) if expire > 0 and ttl > 0 else now
+            scores[response.id] = analyzed_at
+            summaries[response.id] = summary_adapter.dump_json(
+                summarize(response, analyzed_at), by_alias=True
+            )
+
+        if len(scores) > 0:
+            pipeline.zadd(index_key(key_prefix), scores)
+            pipeline.hset(summaries_key(key_prefix), mapping=summaries)  # type: ignore
+            pipeline.execute()
+
+
+# seconds after which a backfill that never finished (its worker died) is
+# taken over by the next worker to start
+BACKFILL_CLAIM_TTL = 3600
+
+
+def start_backfill(
+    redis_url: DatabaseURL | None = settings.REDIS_URL,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+) -> threading.Thread | None:
+    """Backfill the index (see backfill_index) in a thread, once: the first
+    worker to start claims the backfill and the others skip it."""
+    if redis_url is None:
+        return None
+
+    def backfill():
+        redis: Redis = Redis.from_url(str(redis_url))  # type: ignore
+        try:
+            if redis.set(
+                backfill_key(key_prefix), "running", nx=True, ex=BACKFILL_CLAIM_TTL
+            ):
+                backfill_index(redis, expire=expire, key_prefix=key_prefix)
+                redis.set(backfill_key(key_prefix), "done")
+        except RedisError as e:
+            logger.warning(f"Failed to backfill the cache index: {e}")
+        finally:
+            redis.close()
+
+    thread = threading.Thread(target=backfill, name="cache-backfill", daemon=True)
+    thread.start()
+    return thread
+
+
+# a page of summaries starts after the score (analysis time) and the id of the
+# last item of the previous page
+Cursor = tuple[float, str]
+
+
+def encode_cursor(score: float, id: str) -> str:
+    return f"{score!r}:{id}"
+
+
+def parse_cursor(cursor: str) -> Cursor:
+    score, separator, id = cursor.partition(":")
+    if separator == "":
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return float(score), id
+
+
+def _scored_page(
+    redis: Redis, key: str, cursor: Cursor | None, limit: int
+) -> list[tuple[bytes, float]]:
+    if cursor is None:
+        return redis.zrevrangebyscore(
+            key, "+inf", "-inf", start=0, num=limit + 1, withscores=True
+        )  # type: ignore
+
+    # members are ordered by score, then by id (both descending): the members
+    # tied with the last item served come first, and those up to its id have
+    # been served already
+    score, last = cursor
+    last_id = last.encode()
+    scored: list[tuple[bytes, float]] = []
+    start = 0
+    while len(scored) <= limit:
+        batch: list[tuple[bytes, float]] = redis.zrevrangebyscore(
+            key, score, "-inf", start=start, num=limit + 1, withscores=True
+        )  # type: ignore
+        scored.extend(item for item in batch if item[1] < score or item[0] < last_id)
+        if len(batch) <= limit:
+            break
+
+        start += len(batch)
+
+    return scored[: limit + 1]
+
+
+def list_summaries(
+    redis: Redis,
+    cursor: Cursor | None = None,
+    limit: int = 50,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+) -> schemas.CachePage:
+    trim_index(redis, expire=expire, key_prefix=key_prefix)
+
+    # newest first
+    scored = _scored_page(redis, index_key(key_prefix), cursor, limit)
+    page = scored[:limit]
+    if len(page) == 0:
+        return schemas.CachePage()
+
+    got: list[bytes | None] = redis.hmget(
+        summaries_key(key_prefix), [id for id, _ in page]
+    )  # type: ignore
+    last_id, last_score = page[-1]
+    return schemas.CachePage(
+        items=[
+            summary_adapter.validate_json(summary)
+            for summary in got
+            if summary is not None
+        ],
+        next_cursor=encode_cursor(last_score, last_id.decode())
+        if len(scored) > limit
+        else None,
+    )
+
+
+# seconds the intersection of a search outlives it, should it fail half way
+SEARCH_KEY_TTL = 60
+
+
+def search(
+    redis: Redis,
+    indicators: list[tuple[str, str]],
+    limit: int = 50,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+) -> list[schemas.CacheSummary]:
+    keys = [indicator_key(kind, value, key_prefix) for kind, value in indicators]
+    # members analyzed before the horizon belong to expired analyses
+    horizon = time.time() - expire if expire > 0 else None
+
+    source = keys[0]
+    intersected = len(keys) > 1
+    pipeline = redis.pipeline(transaction=False)
+    if intersected:
+        # the intersection runs in Redis, into a key of its own which only
+        # lives as long as this search
+        source = f"{key_prefix}-search:{uuid.uuid4().hex}"
+        pipeline.zinterstore(source, keys, aggregate="MIN")
+        pipeline.expire(source, SEARCH_KEY_TTL)
+
+    pipeline.zrevrangebyscore(
+        source,
+        "+inf",
+        horizon if horizon is not None else "-inf",
+        start=0,
+        num=limit,
+        withscores=True,
+    )
+    if intersected:
+        pipeline.delete(source)
+
+    results = pipeline.execute()
+    scored: list[tuple[bytes, float]] = results[2] if intersected else results[0]
+
+    if len(scored) == 0:
+        return []
+
+    got: list[bytes | None] = redis.hmget(
+        summaries_key(key_prefix), [id for id, _ in scored]
+    )  # type: ignore
+    return [summary_adapter.validate_json(summary) for summary in got if summary]
@@ -1,13 +1,13 @@
 import httpx
 from starlette.datastructures import Secret
 
-from backend import schemas
+from backend import schemas, settings
 
 
 class EmailRep(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
+    def __init__(self, api_key: Secret, base_url: str = settings.EMAIL_REP_URL) -> None:
         super().__init__(
-            base_url="https://emailrep.io",
+            base_url=base_url,
             headers={"key": str(api_key), "user-agent": "EML-Analyzer"},
         )
 
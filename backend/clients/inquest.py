@@ -3,13 +3,13 @@ import io
 import httpx
 from starlette.datastructures import Secret
 
-from backend import schemas
+from backend import schemas, settings
 
 
 class InQuest(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
+    def __init__(self, api_key: Secret, base_url: str = settings.INQUEST_URL) -> None:
         super().__init__(
-            base_url="https://labs.inquest.net",
+            base_url=base_url,
             headers={"Authorization": f"Basic: {api_key}"},
         )
 
@@ -3,14 +3,12 @@ from urllib.parse import urlparse
 import httpx
 from starlette.datastructures import Secret
 
-from backend import schemas
+from backend import schemas, settings
 
 
 class UrlScan(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
-        super().__init__(
-            base_url="https://urlscan.io", headers={"api-key": str(api_key)}
-        )
+    def __init__(self, api_key: Secret, base_url: str = settings.URLSCAN_URL) -> None:
+        super().__init__(base_url=base_url, headers={"api-key": str(api_key)})
 
     async def lookup(
         self,
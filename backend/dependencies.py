@@ -1,11 +1,13 @@
+import functools
+import secrets
 import typing
 from contextlib import asynccontextmanager, contextmanager
 
-from fastapi import Depends
+from fastapi import Depends, Header, HTTPException, Query, status
 from redis import Redis
 from starlette.datastructures import Secret
 
-from backend import clients, settings
+from backend import clients, projection, schemas, settings, stores
 from backend.datastructures import DatabaseURL
 
 
@@ -23,64 +25,104 @@ def _get_optional_redis(
             redis.close()
 
 
-def get_optional_redis():
-    with _get_optional_redis(settings.REDIS_URL) as optional_redis:
-        yield optional_redis
+@functools.cache
+def _get_sqlite_store(path: str) -> stores.SQLiteStore:
+    # shared by the requests of a process, it keeps a connection per thread
+    return stores.SQLiteStore(path)
+
+
+@contextmanager
+def _get_optional_store(
+    redis_url: DatabaseURL | None = settings.REDIS_URL,
+    sqlite_path: str | None = settings.SQLITE_PATH,
+) -> typing.Generator[stores.AbstractStore | None, None, None]:
+    if redis_url is not None:
+        with _get_optional_redis(redis_url) as redis:
+            yield stores.RedisStore(redis)  # type: ignore
+    elif sqlite_path is not None:
+        yield _get_sqlite_store(sqlite_path)
+    else:
+        yield None
+
+
+def get_optional_store():
+    with _get_optional_store(settings.REDIS_URL, settings.SQLITE_PATH) as store:
+        yield store
 
 
 @asynccontextmanager
-async def _get_optional_vt(api_key: Secret | None = settings.VIRUSTOTAL_API_KEY):
+async def _get_optional_vt(
+    api_key: Secret | None = settings.VIRUSTOTAL_API_KEY,
+    url: str = settings.VIRUSTOTAL_URL,
+):
     if api_key is None:
         yield None
     else:
-        async with clients.VirusTotal(apikey=str(api_key)) as client:
+        async with clients.VirusTotal(apikey=str(api_key), host=url) as client:
             yield client
 
 
 async def get_optional_vt():
-    async with _get_optional_vt(settings.VIRUSTOTAL_API_KEY) as client:
+    async with _get_optional_vt(
+        settings.VIRUSTOTAL_API_KEY, settings.VIRUSTOTAL_URL
+    ) as client:
         yield client
 
 
 @asynccontextmanager
-async def _get_optional_inquest(api_key: Secret | None = settings.INQUEST_API_KEY):
+async def _get_optional_inquest(
+    api_key: Secret | None = settings.INQUEST_API_KEY,
+    url: str = settings.INQUEST_URL,
+):
     if api_key is None:
         yield None
     else:
-        async with clients.InQuest(api_key=api_key) as client:
+        async with clients.InQuest(api_key=api_key, base_url=url) as client:
             yield client
 
 
 async def get_optional_inquest():
-    async with _get_optional_inquest(settings.INQUEST_API_KEY) as client:
+    async with _get_optional_inquest(
+        settings.INQUEST_API_KEY, settings.INQUEST_URL
+    ) as client:
         yield client
 
 
 @asynccontextmanager
-async def _get_optional_urlscan(api_key: Secret | None = settings.URLSCAN_API_KEY):
+async def _get_optional_urlscan(
+    api_key: Secret | None = settings.URLSCAN_API_KEY,
+    url: str = settings.URLSCAN_URL,
+):
     if api_key is None:
         yield None
     else:
-        async with clients.UrlScan(api_key=api_key) as client:
+        async with clients.UrlScan(api_key=api_key, base_url=url) as client:
             yield client
 
 
 async def get_optional_urlscan():
-    async with _get_optional_urlscan(settings.URLSCAN_API_KEY) as client:
+    async with _get_optional_urlscan(
+        settings.URLSCAN_API_KEY, settings.URLSCAN_URL
+    ) as client:
         yield client
 
 
 @asynccontextmanager
-async def _get_optional_email_rep(api_key: Secret | None = settings.EMAIL_REP_API_KEY):
+async def _get_optional_email_rep(
+    api_key: Secret | None = settings.EMAIL_REP_API_KEY,
+    url: str = settings.EMAIL_REP_URL,
+):
     if api_key is None:
         yield None
     else:
-        async with clients.EmailRep(api_key=api_key) as client:
+        async with clients.EmailRep(api_key=api_key, base_url=url) as client:
             yield client
 
 
 async def get_optional_email_rep():
-    async with _get_optional_email_rep(settings.EMAIL_REP_API_KEY) as client:
+    async with _get_optional_email_rep(
+        settings.EMAIL_REP_API_KEY, settings.EMAIL_REP_URL
+    ) as client:
         yield client
 
 
@@ -92,7 +134,78 @@ def get_spam_assassin() -> clients.SpamAssassin:
     )
 
 
-OptionalRedis = typing.Annotated[Redis | None, Depends(get_optional_redis)]
+def get_projection(
+    fields: str | None = Query(
+        default=None,
+        description="Comma separated fields to return, e.g. id,eml.header.subject",
+    ),
+    profile: typing.Literal["full", "summary", "verdicts"] = Query(
+        default="full", description="Named set of fields (ignored if fields is set)"
+    ),
+) -> projection.Projection | None:
+    if fields is None:
+        return projection.PROFILES[profile]
+
+    try:
+        return projection.parse_fields(fields)
+    except projection.InvalidProjectionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+
+
+def get_analysis_options(
+    providers: typing.Annotated[
+        list[schemas.Provider] | None,
+        Query(description="Verdict providers to run (all if not set)"),
+    ] = None,
+    extract_iocs: bool = Query(
+        default=True, description="Extract URLs, emails, domains and IPs"
+    ),
+    include_raw: bool = Query(
+        default=True, description="Return attachment data and body contents"
+    ),
+) -> schemas.AnalysisOptions:
+    return schemas.AnalysisOptions(
+        providers=providers, extract_iocs=extract_iocs, include_raw=include_raw
+    )
+
+
+def _is_profiling_token(
+    value: str | None, token: Secret | None = settings.PROFILING_TOKEN
+) -> bool:
+    if token is None or value is None:
+        return False
+
+    return secrets.compare_digest(value.encode(), str(token).encode())
+
+
+def get_profiling_requested(
+    x_profile: str | None = Header(
+        default=None, description="PROFILING_TOKEN, to profile the analysis"
+    ),
+) -> bool:
+    return _is_profiling_token(x_profile, settings.PROFILING_TOKEN)
+
+
+def verify_profiling_token(
+    x_profile: str | None = Header(default=None, description="PROFILING_TOKEN"),
+):
+    if settings.PROFILING_TOKEN is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Profiling is not enabled",
+        )
+
+    if not _is_profiling_token(x_profile, settings.PROFILING_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token"
+        )
+
+
+OptionalStore = typing.Annotated[
+    stores.AbstractStore | None, Depends(get_optional_store)
+]
 
 OptionalInQuest = typing.Annotated[
     clients.InQuest | None, Depends(get_optional_inquest)
@@ -106,3 +219,10 @@ OptionalUrlScan = typing.Annotated[
 
 OptionalEmailRep = typing.Annotated[clients.EmailRep, Depends(get_optional_email_rep)]
 SpamAssassin = typing.Annotated[clients.SpamAssassin, Depends(get_spam_assassin)]
+OptionalProjection = typing.Annotated[
+    projection.Projection | None, Depends(get_projection)
+]
+AnalysisOptions = typing.Annotated[
+    schemas.AnalysisOptions, Depends(get_analysis_options)
+]
+ProfilingRequested = typing.Annotated[bool, Depends(get_profiling_requested)]
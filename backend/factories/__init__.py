@@ -1,5 +1,5 @@
 from .emailrep import EmailRepVerdictFactory  # noqa: F401
-from .eml import EmlFactory  # noqa: F401
+from .eml import EmlFactory, HeaderFactory  # noqa: F401
 from .inquest import InQuestVerdictFactory  # noqa: F401
 from .oldid import OleIDVerdictFactory  # noqa: F401
 from .response import ResponseFactory  # noqa: F401
@@ -6,14 +6,15 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas
+from backend import clients, metrics, schemas
 
 from .abstract import AbstractAsyncFactory
 
 
 @future_safe
 async def lookup(email: str, *, client: clients.EmailRep) -> schemas.EmailRepLookup:
-    return await client.lookup(email)
+    with metrics.count_failures("emailrep"):
+        return await client.lookup(email)
 
 
 @future_safe
@@ -1,23 +1,36 @@
+import base64
 import datetime
+import hashlib
+import uuid
+from collections.abc import Callable, Iterator
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+from functools import partial
 from io import BytesIO
-from typing import Any
+from typing import TYPE_CHECKING, Any, TypeVar
 
-import dateparser
-from eml_parser import EmlParser
-from ioc_finder import parse_domain_names, parse_email_addresses, parse_ipv4_addresses
 from returns.functions import raise_exception
 from returns.maybe import Maybe
 from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.result import ResultE, safe
 
-from backend import schemas
-from backend.outlookmsgfile import Message
+from backend import memory, metrics, schemas, settings
+from backend.guard import LimitExceededError
+from backend.mime import LazyMessage
 from backend.utils import parse_urls_from_body
 from backend.validator import is_eml_file
 
 from .abstract import AbstractFactory
 
+# the parsing libraries are imported where they are used: the API process
+# only imports this module, the parsing runs in a worker forked from a
+# server which has them imported and warmed up (see preload)
+if TYPE_CHECKING:
+    from eml_parser import EmlParser
+
+T = TypeVar("T")
+
 
 def is_inline_forward_attachment(attachment: dict) -> bool:
     content_header = attachment.get("content_header", {})
@@ -39,11 +52,40 @@ def is_inline_forward_attachment(attachment: dict) -> bool:
     return is_rfc822 and is_inline
 
 
+@safe
+def check_structure(
+    data: bytes,
+    *,
+    max_depth: int = settings.MIME_MAX_DEPTH,
+    max_parts: int = settings.MIME_MAX_PARTS,
+) -> bytes:
+    depths: Iterator[int]
+    if is_eml_file(data):
+        depths = (part.depth for part in LazyMessage(data).walk())
+    else:
+        from backend.outlookmsgfile import Message
+
+        # assume data is a msg file: its attachments, recipients and embedded
+        # messages are counted from the directory, before anything is loaded
+        depths = Message(BytesIO(data)).walk()
+
+    for count, depth in enumerate(depths, start=1):
+        if depth > max_depth:
+            raise LimitExceededError(f"MIME depth limit ({max_depth}) exceeded")
+
+        if count > max_parts:
+            raise LimitExceededError(f"MIME part limit ({max_parts}) exceeded")
+
+    return data
+
+
 @safe
 def to_eml(data: bytes) -> bytes:
     if is_eml_file(data):
         return data
 
+    from backend.outlookmsgfile import Message
+
     # assume data is a msg file
     file = BytesIO(data)
     message = Message(file)
@@ -51,12 +93,91 @@ def to_eml(data: bytes) -> bytes:
     return email.as_bytes()
 
 
+def get_parser(*, include_attachment_data: bool = True) -> "EmlParser":
+    from eml_parser import EmlParser
+
+    return EmlParser(
+        include_raw_body=True, include_attachment_data=include_attachment_data
+    )
+
+
 @safe
-def parse(data: bytes) -> dict:
-    parser = EmlParser(include_raw_body=True, include_attachment_data=True)
+def parse(data: bytes, *, include_attachment_data: bool = True) -> dict:
+    parser = get_parser(include_attachment_data=include_attachment_data)
     return parser.decode_email_bytes(data)
 
 
+def is_detachable(part: EmailMessage) -> bool:
+    # text parts (and HTML files) may end up in bodies and message/rfc822 parts
+    # are traversed by eml_parser, so only opaque binary data can be detached
+    if part.get_content_maintype() in ["text", "message", "multipart"]:
+        return False
+
+    filename = part.get_filename("").lower()
+    return not filename.endswith((".html", ".htm"))
+
+
+def _fill_attachment(
+    attachment: dict, data: bytes, *, include_attachment_data: bool = True
+) -> dict:
+    from eml_parser import EmlParser
+
+    attachment["size"] = len(data)
+    attachment["hash"] = EmlParser.get_file_hash(data)
+
+    mime_type, mime_type_short = EmlParser.get_mime_type(data)
+    if mime_type is not None and mime_type_short is not None:
+        attachment["mime_type"] = mime_type
+        attachment["mime_type_short"] = mime_type_short
+
+    if include_attachment_data:
+        attachment["raw"] = base64.b64encode(data)
+
+    return attachment
+
+
+@safe
+def parse_msg(data: bytes, *, include_attachment_data: bool = True) -> dict:
+    from backend.outlookmsgfile import Message
+
+    # binary attachments are replaced by unique placeholders while the message
+    # goes through eml_parser, then filled in from the MAPI data directly.
+    # this skips base64 encoding, serializing and decoding them again.
+    detached: dict[str, bytes] = {}
+
+    def detach(part: EmailMessage, attachment_data: bytes) -> bytes | None:
+        if not is_detachable(part):
+            return None
+
+        placeholder = uuid.uuid4().hex.encode()
+        detached[hashlib.sha256(placeholder).hexdigest()] = attachment_data
+        return placeholder
+
+    serialized = Message(BytesIO(data)).to_email(detach=detach).as_bytes()
+    parser = get_parser(include_attachment_data=include_attachment_data)
+    parsed = parser.decode_email_bytes(serialized)
+
+    for attachment in parsed.get("attachment") or []:
+        sha256 = attachment.get("hash", {}).get("sha256")
+        attachment_data = detached.pop(sha256, None)
+        if attachment_data is not None:
+            _fill_attachment(
+                attachment,
+                attachment_data,
+                include_attachment_data=include_attachment_data,
+            )
+
+    return parsed
+
+
+def to_parsed(data: bytes, *, include_attachment_data: bool = True) -> ResultE[dict]:
+    if is_eml_file(data):
+        return parse(data, include_attachment_data=include_attachment_data)
+
+    # assume data is a msg file
+    return parse_msg(data, include_attachment_data=include_attachment_data)
+
+
 def parse_datetime(
     dt: str | datetime.datetime | None,
 ) -> datetime.datetime | str | None:
@@ -64,6 +185,8 @@ def parse_datetime(
         return dt
 
     if isinstance(dt, str):
+        import dateparser
+
         return dateparser.parse(dt) or dt
 
     return None
@@ -133,13 +256,25 @@ def normalize_header(parsed: dict) -> dict:
     return parsed
 
 
-def _normalize_body(body: dict[str, Any]) -> dict[str, Any]:
+def _normalize_body(
+    body: dict[str, Any], *, extract_iocs: bool = True
+) -> dict[str, Any]:
+    from ioc_finder import (
+        parse_domain_names,
+        parse_email_addresses,
+        parse_ipv4_addresses,
+    )
+
     content = body.get("content", "")
     content_type = body.get("content_type", "")
-    body["urls"] = parse_urls_from_body(content, content_type)
-    body["emails"] = parse_email_addresses(content)
-    body["domains"] = parse_domain_names(content)
-    body["ip_addresses"] = parse_ipv4_addresses(content)
+    if extract_iocs:
+        body["urls"] = parse_urls_from_body(content, content_type)
+        body["emails"] = parse_email_addresses(content)
+        body["domains"] = parse_domain_names(content)
+        body["ip_addresses"] = parse_ipv4_addresses(content)
+    else:
+        for key in ["urls", "emails", "domains", "ip_addresses"]:
+            body[key] = []
 
     for key in ["uri", "email", "domain", "ip"]:
         body.pop(key, None)
@@ -148,9 +283,11 @@ def _normalize_body(body: dict[str, Any]) -> dict[str, Any]:
 
 
 @safe
-def normalize_bodies(parsed: dict) -> dict:
+def normalize_bodies(parsed: dict, *, extract_iocs: bool = True) -> dict:
     bodies = parsed.get("body", [])
-    parsed["bodies"] = [_normalize_body(body) for body in bodies]
+    parsed["bodies"] = [
+        _normalize_body(body, extract_iocs=extract_iocs) for body in bodies
+    ]
     parsed.pop("body", None)
     return parsed
 
@@ -175,14 +312,80 @@ def transform(parsed: dict) -> schemas.Eml:
     return schemas.Eml.model_validate(parsed)
 
 
+@safe
+def to_header_bytes(data: bytes) -> bytes:
+    if is_eml_file(data):
+        return LazyMessage(data).header_bytes
+
+    from backend.outlookmsgfile import Message
+
+    # assume data is a msg file, attachments are not needed at all
+    message = Message(BytesIO(data)).to_email(detach=lambda _part, _data: b"")
+    return LazyMessage(message.as_bytes()).header_bytes
+
+
+def _parse_header_block(header_bytes: bytes) -> dict:
+    from eml_parser import EmlParser
+
+    # eml_parser only parses whole messages (decode_email_bytes). Its header
+    # normalization is reused by setting the message it works on (msg) and
+    # calling parse_email directly: both are internals of eml_parser 2.0, the
+    # version pinned in pyproject.toml
+    parser = EmlParser(parse_attachments=False)
+    parser.msg = BytesHeaderParser(policy=parser.policy).parsebytes(header_bytes)
+    return parser.parse_email().get("header", {})
+
+
+@safe
+def parse_header(data: bytes) -> dict:
+    # only the header block is handed over, so eml_parser has no body to decode
+    return {"header": _parse_header_block(data)}
+
+
+@safe
+def transform_header(parsed: dict) -> schemas.Header:
+    return schemas.Header.model_validate(parsed["header"])
+
+
+def _stage(name: str, func: Callable[..., T]) -> Callable[..., T]:
+    return metrics.timed(name, memory.measured(name, func))
+
+
 class EmlFactory(AbstractFactory):
-    def call(self, data: bytes) -> schemas.Eml:
+    def call(
+        self,
+        data: bytes,
+        *,
+        extract_iocs: bool = True,
+        include_attachment_data: bool = True,
+    ) -> schemas.Eml:
         result: ResultE[schemas.Eml] = flow(
-            to_eml(data),
-            bind(parse),
-            bind(normalize_attachments),
-            bind(normalize_bodies),
+            _stage("check_structure", check_structure)(data),
+            bind(
+                _stage(
+                    "to_parsed",
+                    partial(to_parsed, include_attachment_data=include_attachment_data),
+                )
+            ),
+            bind(_stage("normalize_attachments", normalize_attachments)),
+            bind(
+                _stage(
+                    "normalize_bodies",
+                    partial(normalize_bodies, extract_iocs=extract_iocs),
+                )
+            ),
+            bind(_stage("normalize_header", normalize_header)),
+            bind(_stage("transform", transform)),
+        )
+        return result.alt(raise_exception).unwrap()
+
+
+class HeaderFactory(AbstractFactory):
+    def call(self, data: bytes) -> schemas.Header:
+        result: ResultE[schemas.Header] = flow(
+            to_header_bytes(data),
+            bind(parse_header),
             bind(normalize_header),
-            bind(transform),
+            bind(transform_header),
         )
         return result.alt(raise_exception).unwrap()
@@ -7,12 +7,13 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas, settings, types
+from backend import clients, metrics, schemas, settings, types
 
 
 @future_safe
 async def lookup(sha256: str, *, client: clients.InQuest) -> schemas.InQuestLookup:
-    return await client.lookup(sha256)
+    with metrics.count_failures("inquest"):
+        return await client.lookup(sha256)
 
 
 @future_safe
@@ -9,7 +9,7 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas, types
+from backend import clients, guard, lanes, metrics, schemas, types
 
 from .abstract import AbstractAsyncFactory
 from .emailrep import EmailRepVerdictFactory
@@ -26,48 +26,68 @@ def log_exception(exception: Exception):
 
 
 @future_safe
-async def parse(eml_file: bytes) -> schemas.Response:
-    return schemas.Response(
-        eml=EmlFactory().call(eml_file), id=hashlib.sha256(eml_file).hexdigest()
+async def parse(
+    eml_file: bytes, *, options: schemas.AnalysisOptions
+) -> schemas.Response:
+    call = partial(
+        EmlFactory().call,
+        extract_iocs=options.extract_iocs,
+        # OleID inspects the attachment data
+        include_attachment_data=options.include_raw or options.wants("oleid"),
     )
+    async with lanes.pool(lanes.PARSER).acquire():
+        eml = await guard.run(call, eml_file)
+
+    return schemas.Response(eml=eml, id=hashlib.sha256(eml_file).hexdigest())
 
 
 @future_safe
 async def get_spam_assassin_verdict(
     eml_file: bytes, *, client: clients.SpamAssassin
 ) -> schemas.Verdict:
-    return await SpamAssassinVerdictFactory(client).call(eml_file)
+    async with lanes.pool("spamassassin").acquire():
+        with metrics.span("provider", "spamassassin"):
+            return await SpamAssassinVerdictFactory(client).call(eml_file)
 
 
 @future_safe
 async def get_oleid_verdict(attachments: list[schemas.Attachment]) -> schemas.Verdict:
-    return OleIDVerdictFactory().call(attachments)
+    with metrics.span("provider", "oleid"):
+        return OleIDVerdictFactory().call(attachments)
 
 
 @future_safe
 async def get_email_rep_verdicts(from_, *, client: clients.EmailRep) -> schemas.Verdict:
-    return await EmailRepVerdictFactory(client).call(from_)
+    async with lanes.pool("emailrep").acquire():
+        with metrics.span("provider", "emailrep"):
+            return await EmailRepVerdictFactory(client).call(from_)
 
 
 @future_safe
 async def get_urlscan_verdict(
     urls: types.ListSet[str], *, client: clients.UrlScan
 ) -> schemas.Verdict:
-    return await UrlScanVerdictFactory(client).call(urls)
+    async with lanes.pool("urlscan").acquire():
+        with metrics.span("provider", "urlscan"):
+            return await UrlScanVerdictFactory(client).call(urls)
 
 
 @future_safe
 async def get_inquest_verdict(
     sha256s: types.ListSet[str], *, client: clients.InQuest
 ) -> schemas.Verdict:
-    return await InQuestVerdictFactory(client).call(sha256s)
+    async with lanes.pool("inquest").acquire():
+        with metrics.span("provider", "inquest"):
+            return await InQuestVerdictFactory(client).call(sha256s)
 
 
 @future_safe
 async def get_vt_verdict(
     sha256s: types.ListSet[str], *, client: clients.VirusTotal
 ) -> schemas.Verdict:
-    return await VirusTotalVerdictFactory(client).call(sha256s)
+    async with lanes.pool("virustotal").acquire():
+        with metrics.span("provider", "virustotal"):
+            return await VirusTotalVerdictFactory(client).call(sha256s)
 
 
 @future_safe
@@ -80,24 +100,31 @@ async def set_verdicts(
     optional_vt: clients.VirusTotal | None = None,
     optional_urlscan: clients.UrlScan | None = None,
     optional_inquest: clients.InQuest | None = None,
+    options: schemas.AnalysisOptions,
 ) -> schemas.Response:
-    f_results: list[FutureResultE[schemas.Verdict]] = [
-        get_spam_assassin_verdict(eml_file, client=spam_assassin),
-        get_oleid_verdict(response.eml.attachments),
-    ]
-
-    if response.eml.header.from_ is not None and optional_email_rep is not None:
+    f_results: list[FutureResultE[schemas.Verdict]] = []
+    if options.wants("spamassassin"):
+        f_results.append(get_spam_assassin_verdict(eml_file, client=spam_assassin))
+
+    if options.wants("oleid"):
+        f_results.append(get_oleid_verdict(response.eml.attachments))
+
+    if (
+        response.eml.header.from_ is not None
+        and optional_email_rep is not None
+        and options.wants("emailrep")
+    ):
         f_results.append(
             get_email_rep_verdicts(response.eml.header.from_, client=optional_email_rep)
         )
 
-    if optional_vt is not None:
+    if optional_vt is not None and options.wants("virustotal"):
         f_results.append(get_vt_verdict(response.sha256s, client=optional_vt))
 
-    if optional_inquest is not None:
+    if optional_inquest is not None and options.wants("inquest"):
         f_results.append(get_inquest_verdict(response.sha256s, client=optional_inquest))
 
-    if optional_urlscan is not None:
+    if optional_urlscan is not None and options.wants("urlscan"):
         f_results.append(get_urlscan_verdict(response.urls, client=optional_urlscan))
 
     results = await aiometer.run_all([f_result.awaitable for f_result in f_results])
@@ -109,6 +136,16 @@ async def set_verdicts(
     return response
 
 
+def drop_raw(response: schemas.Response) -> schemas.Response:
+    for attachment in response.eml.attachments:
+        attachment.raw = ""
+
+    for body in response.eml.bodies:
+        body.content = ""
+
+    return response
+
+
 class ResponseFactory(AbstractAsyncFactory):
     @classmethod
     async def call(
@@ -120,9 +157,11 @@ class ResponseFactory(AbstractAsyncFactory):
         optional_vt: clients.VirusTotal | None = None,
         optional_urlscan: clients.UrlScan | None = None,
         optional_inquest: clients.InQuest | None = None,
+        options: schemas.AnalysisOptions | None = None,
     ) -> schemas.Response:
+        options = options or schemas.AnalysisOptions()
         f_result: FutureResultE[schemas.Response] = flow(
-            parse(eml_file),
+            parse(eml_file, options=options),
             bind(
                 partial(
                     set_verdicts,
@@ -132,8 +171,11 @@ class ResponseFactory(AbstractAsyncFactory):
                     optional_vt=optional_vt,
                     optional_urlscan=optional_urlscan,
                     optional_inquest=optional_inquest,
+                    options=options,
                 )
             ),
         )
-        result = await f_result.awaitable()
+        with metrics.ANALYSES_IN_FLIGHT.track_inprogress():
+            result = await f_result.awaitable()
+
         return unsafe_perform_io(result.alt(raise_exception).unwrap())
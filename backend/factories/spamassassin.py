@@ -6,7 +6,7 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas
+from backend import clients, metrics, schemas
 
 from .abstract import AbstractAsyncFactory
 
@@ -15,7 +15,8 @@ from .abstract import AbstractAsyncFactory
 async def report(
     eml_file: bytes, *, client: clients.SpamAssassin
 ) -> schemas.SpamAssassinReport:
-    return await client.report(eml_file)
+    with metrics.count_failures("spamassassin"):
+        return await client.report(eml_file)
 
 
 @future_safe
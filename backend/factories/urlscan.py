@@ -8,14 +8,15 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas, settings, types
+from backend import clients, metrics, schemas, settings, types
 
 from .abstract import AbstractAsyncFactory
 
 
 @future_safe
 async def lookup(url: str, *, client: clients.UrlScan) -> schemas.UrlScanLookup:
-    return await client.lookup(url)
+    with metrics.count_failures("urlscan"):
+        return await client.lookup(url)
 
 
 @future_safe
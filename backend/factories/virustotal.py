@@ -8,7 +8,7 @@ from returns.pipeline import flow
 from returns.pointfree import bind
 from returns.unsafe import unsafe_perform_io
 
-from backend import clients, schemas, settings, types
+from backend import clients, metrics, schemas, settings, types
 
 from .abstract import AbstractAsyncFactory
 
@@ -17,7 +17,8 @@ NAME = "VirusTotal"
 
 @future_safe
 async def get_file_object(sha256: str, *, client: clients.VirusTotal) -> vt.Object:
-    return await client.get_object_async(f"/files/{sha256}")
+    with metrics.count_failures("virustotal"):
+        return await client.get_object_async(f"/files/{sha256}")
 
 
 @future_safe
@@ -0,0 +1,15 @@
+# Imported once by the forkserver of the parser workers (see guard): every
+# worker is forked from it with the parsing libraries imported and warmed up,
+# instead of setting them up again for each email.
+
+from loguru import logger
+
+from backend import preload
+
+try:
+    preload.warm_parser()
+except Exception as e:
+    # a cold worker is slower, not broken
+    logger.warning(f"Failed to warm the parser workers up: {e}")
+
+preload.freeze()
@@ -0,0 +1,171 @@
+# Run CPU/memory hungry work (parsing hostile emails) in a throwaway worker.
+#
+# Each call forks a fresh worker from a forkserver which has the parsing
+# modules preloaded and warmed up (see forkserver), so a worker starts in a few
+# milliseconds. The worker runs under RLIMIT_CPU/RLIMIT_AS and is killed once
+# it exceeds the wall-clock timeout. A killed worker is never reused: the next
+# call gets a new one.
+
+import asyncio
+import multiprocessing
+import resource
+import signal
+import typing
+from multiprocessing.connection import Connection
+from multiprocessing.context import ForkServerContext, SpawnContext
+
+from backend import memory as memory_usage
+from backend import metrics, profiler, settings
+
+T = typing.TypeVar("T")
+
+_context: ForkServerContext | SpawnContext
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload(["backend.forkserver"])
+else:
+    _context = multiprocessing.get_context("spawn")
+
+MEGABYTE = 1024 * 1024
+
+
+class LimitExceededError(Exception):
+    pass
+
+
+def _ready() -> bool:
+    return True
+
+
+async def start(isolation: bool = settings.PARSER_ISOLATION):
+    """Start the forkserver now rather than on the first analysis: the first
+    worker is forked once it has preloaded and warmed up."""
+    if isolation:
+        await run(_ready, isolation=True)
+
+
+def _set_limits(cpu_time: int, memory: int):
+    if cpu_time > 0:
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+
+    if memory > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory * MEGABYTE, memory * MEGABYTE))
+
+
+def _call(func: typing.Callable[..., T], args: tuple) -> T:
+    try:
+        with memory_usage.traced():
+            return func(*args)
+    except memory_usage.BudgetExceededError as e:
+        raise LimitExceededError(str(e)) from e
+
+
+def _work(
+    conn: Connection,
+    func: typing.Callable[..., typing.Any],
+    args: tuple,
+    cpu_time: int,
+    memory: int,
+    profile_interval: float,
+    tracker: memory_usage.Tracker | None,
+):
+    _set_limits(cpu_time, memory)
+    # the spans, the stacks and the memory usages go back to the request which
+    # started the worker
+    with (
+        metrics.collect() as spans,
+        profiler.profile(profile_interval) as profile,
+        memory_usage.collect(tracker),
+    ):
+        try:
+            value = _call(func, args)
+            ok = True
+        except MemoryError:
+            value = LimitExceededError(f"Memory limit ({memory} MB) exceeded")
+            ok = False
+        except Exception as e:
+            value = e
+            ok = False
+
+    usages = tracker.usages if tracker is not None else []
+    try:
+        conn.send((ok, value, spans, dict(profile.stacks), usages))
+    except Exception:
+        # the exception (or the result) is not picklable
+        conn.send(
+            (False, RuntimeError(str(value)), spans, dict(profile.stacks), usages)
+        )
+    finally:
+        conn.close()
+
+
+def _describe_exit(exitcode: int | None, *, cpu_time: int) -> str:
+    if exitcode in (-signal.SIGXCPU, -signal.SIGKILL):
+        return f"CPU time limit ({cpu_time} seconds) exceeded"
+
+    return f"Worker exited unexpectedly (exit code: {exitcode})"
+
+
+def _stop(process: multiprocessing.process.BaseProcess):
+    if process.is_alive():
+        process.kill()
+
+    process.join()
+
+
+async def run(
+    func: typing.Callable[..., T],
+    *args: typing.Any,
+    isolation: bool = settings.PARSER_ISOLATION,
+    time_limit: int = settings.PARSER_TIMEOUT,
+    cpu_time: int = settings.PARSER_CPU_TIME_LIMIT,
+    memory: int = settings.PARSER_MEMORY_LIMIT,
+) -> T:
+    if not isolation:
+        return _call(func, args)
+
+    profile = profiler.current()
+    profile_interval = profile.interval if profile is not None else 0
+    # the worker accounts into a tracker of its own
+    tracker = memory_usage.current()
+    if tracker is not None:
+        tracker = memory_usage.Tracker(tracker.budget, detailed=tracker.detailed)
+
+    receiver, sender = _context.Pipe(duplex=False)
+    process = _context.Process(
+        target=_work,
+        args=(sender, func, args, cpu_time, memory, profile_interval, tracker),
+        daemon=True,
+    )
+    # starting, reading a (large) result from and reaping the worker block:
+    # none of it runs on the event loop
+    try:
+        await asyncio.to_thread(process.start)
+    finally:
+        sender.close()
+
+    try:
+        # poll also returns when the worker dies (then recv raises EOFError)
+        if not await asyncio.to_thread(receiver.poll, time_limit):
+            raise LimitExceededError(f"Time limit ({time_limit} seconds) exceeded")
+
+        try:
+            ok, value, spans, stacks, usages = await asyncio.to_thread(receiver.recv)
+        except EOFError:
+            await asyncio.to_thread(process.join)
+            raise LimitExceededError(
+                _describe_exit(process.exitcode, cpu_time=cpu_time)
+            ) from None
+    finally:
+        # a recv still running (cancelled request) ends once the worker is gone
+        await asyncio.to_thread(_stop, process)
+        receiver.close()
+
+    metrics.add(spans)
+    profiler.add(stacks)
+    memory_usage.add(usages)
+    if ok:
+        return value
+
+    raise value
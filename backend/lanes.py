@@ -0,0 +1,176 @@
+# Priority lanes: an analysis is either interactive (an analyst in the UI, the
+# default) or bulk (automated submissions, sent with "X-Priority: bulk").
+#
+# The lane of a request is a context variable, set by the admission (see
+# admission). Wherever analyses compete for a limited resource, the admission
+# queue, the parser workers and every verdict provider, a slot freed goes to
+# the interactive lane first, except that bulk gets at least LANE_BULK_SHARE
+# of the slots handed over while both lanes wait, so that it never starves.
+#
+# The pools are per worker, like the admission, and separate: a slow provider
+# only holds back the analyses waiting for it.
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import time
+import typing
+
+from backend import metrics, settings
+
+Lane = typing.Literal["interactive", "bulk"]
+
+LANES: tuple[Lane, ...] = ("interactive", "bulk")
+
+HEADER = b"x-priority"
+
+PARSER = "parser"
+
+_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar(
+    "lane", default="interactive"
+)
+
+
+def current() -> Lane:
+    return _lane.get()
+
+
+@contextlib.contextmanager
+def assign(lane: Lane) -> typing.Generator[None, None, None]:
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def from_headers(headers: typing.Iterable[tuple[bytes, bytes]]) -> Lane:
+    for key, value in headers:
+        if key.lower() == HEADER and value.decode("latin-1").strip().lower() == "bulk":
+            return "bulk"
+
+    return "interactive"
+
+
+class Waiters:
+    """Futures waiting for a slot, one FIFO queue per lane."""
+
+    def __init__(self, bulk_share: float = settings.LANE_BULK_SHARE):
+        self.bulk_share = bulk_share
+        self._queues: dict[Lane, collections.deque[asyncio.Future[None]]] = {
+            lane: collections.deque() for lane in LANES
+        }
+        # the bulk slots owed, a slot is handed to bulk once it reaches 1
+        self._credit = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def count(self, lane: Lane) -> int:
+        return len(self._queues[lane])
+
+    def append(self, lane: Lane, waiter: asyncio.Future[None]):
+        self._queues[lane].append(waiter)
+
+    def remove(self, waiter: asyncio.Future[None]):
+        for queue in self._queues.values():
+            with contextlib.suppress(ValueError):
+                queue.remove(waiter)
+
+    def _next_lane(self) -> Lane | None:
+        interactive, bulk = self._queues["interactive"], self._queues["bulk"]
+        if len(interactive) > 0 and len(bulk) > 0:
+            self._credit += self.bulk_share
+            if self._credit >= 1:
+                self._credit -= 1
+                return "bulk"
+
+            return "interactive"
+
+        if len(interactive) > 0:
+            return "interactive"
+
+        return "bulk" if len(bulk) > 0 else None
+
+    def wake(self) -> bool:
+        """Hand a slot to the next waiter still waiting, if any."""
+        while (lane := self._next_lane()) is not None:
+            waiter = self._queues[lane].popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return True
+
+        return False
+
+
+class Pool:
+    """At most `limit` holders at once (0: no limit), waiters served by lane."""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        bulk_share: float = settings.LANE_BULK_SHARE,
+    ):
+        self.name = name
+        self.limit = limit
+        self.running = 0
+        self.waiters = Waiters(bulk_share)
+
+    def release(self):
+        if not self.waiters.wake():
+            self.running -= 1
+
+    async def _wait(self, lane: Lane):
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(lane, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # handed a slot right as the wait was cancelled: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+
+            self.waiters.remove(waiter)
+            raise
+
+    @contextlib.asynccontextmanager
+    async def acquire(
+        self, lane: Lane | None = None
+    ) -> typing.AsyncGenerator[None, None]:
+        if self.limit <= 0:
+            yield
+            return
+
+        lane = lane or current()
+        start = time.perf_counter()
+        # a slot is either free or handed over by a holder done with it
+        if self.running < self.limit and len(self.waiters) == 0:
+            self.running += 1
+        else:
+            await self._wait(lane)
+
+        metrics.POOL_WAIT_SECONDS.labels(self.name, lane).observe(
+            time.perf_counter() - start
+        )
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_pools: dict[str, Pool] = {}
+
+
+def pool(name: str) -> Pool:
+    """The pool of the parser workers or of a verdict provider."""
+    if name not in _pools:
+        limit = (
+            settings.PARSER_CONCURRENCY
+            if name == PARSER
+            else settings.PROVIDER_CONCURRENCY
+        )
+        _pools[name] = Pool(name, limit)
+
+    return _pools[name]
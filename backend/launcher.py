@@ -0,0 +1,26 @@
+# Start the production processes under circus (circus.ini): gunicorn with as
+# many uvicorn workers as gunicorn.conf.py computes (WEB_CONCURRENCY, or
+# WORKERS_PER_CORE and MAX_WORKERS) on the socket circus holds, and spamd.
+#
+# spamd scans a message per child, so it gets a child per web worker unless
+# SPAMD_MAX_CHILDREN is set.
+#
+# usage: python -m backend.launcher [CIRCUS_INI]
+
+import os
+import runpy
+import sys
+
+
+def workers(config: str = "gunicorn.conf.py") -> int:
+    return int(runpy.run_path(config)["workers"])
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    os.environ.setdefault("SPAMD_MAX_CHILDREN", str(workers()))
+    os.execvp("circusd", ["circusd", *(argv or ["circus.ini"])])
+
+
+if __name__ == "__main__":
+    main()
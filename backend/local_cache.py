@@ -0,0 +1,205 @@
+# A per-worker LRU of cached analyses in front of Redis.
+#
+# Hot ids (an incident being triaged, a SOAR playbook polling) are served from
+# memory without a Redis round trip or a decompression. An entry lives for at
+# most LOCAL_CACHE_TTL seconds and never longer than its Redis entry. When an
+# analysis is cached again, its id is published on a Redis channel and every
+# worker drops its copy; the TTL bounds the staleness if a message is lost.
+
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from loguru import logger
+from redis import Redis, RedisError
+from redis.client import PubSubWorkerThread
+
+from backend import cache, metrics, projection, schemas, settings, stores
+from backend.datastructures import DatabaseURL
+
+
+class LocalCache:
+    def __init__(
+        self,
+        max_size: int = settings.LOCAL_CACHE_SIZE * 1024 * 1024,
+        ttl: float = settings.LOCAL_CACHE_TTL,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        # id -> (expires at, entry size, analysis), least recently used first
+        self._entries: OrderedDict[str, tuple[float, int, cache.CachedAnalysis]] = (
+            OrderedDict()
+        )
+        self._size = 0
+        # invalidations come from the listener thread
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, id: str, count: bool = True) -> cache.CachedAnalysis | None:
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(id)
+                entry = None
+
+            if entry is None:
+                self.misses += count
+                return None
+
+            self._entries.move_to_end(id)
+            self.hits += count
+            return entry[2]
+
+    def put(self, analysis: cache.CachedAnalysis):
+        ttl = min(self.ttl, analysis.ttl) if analysis.ttl is not None else self.ttl
+        # the body is decompressed once here instead of on every hit
+        size = len(analysis.serialized) + sum(
+            len(value) for value in analysis.fields.values() if value is not None
+        )
+        if ttl <= 0 or size > self.max_size:
+            return
+
+        with self._lock:
+            self._remove(analysis.id)
+            self._entries[analysis.id] = (self.clock() + ttl, size, analysis)
+            self._size += size
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> schemas.LocalCacheStats:
+        lookups = self.hits + self.misses
+        return schemas.LocalCacheStats(
+            enabled=self.enabled,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups > 0 else None,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+            entries=len(self),
+            size=self.size,
+            max_size=self.max_size,
+        )
+
+    def invalidate(self, id: str):
+        with self._lock:
+            if self._remove(id):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, id: str) -> bool:
+        entry = self._entries.pop(id, None)
+        if entry is None:
+            return False
+
+        self._size -= entry[1]
+        return True
+
+
+local_cache = LocalCache()
+
+
+def fetch(
+    store: stores.AbstractStore,
+    ids: list[str],
+    projected: projection.Projection | None = None,
+    local: LocalCache = local_cache,
+    counted: bool = False,
+) -> list[cache.CachedAnalysis | None]:
+    # an embedded store is read from memory (mapped) already
+    if not local.enabled or not store.remote:
+        analyses = store.fetch(ids, projected)
+        if not counted:
+            _count_lookups("store", analyses)
+
+        return analyses
+
+    # a conditional request was counted by fetch_etag already
+    fetched = {id: local.get(id, count=not counted) for id in ids}
+    missing = [id for id, analysis in fetched.items() if analysis is None]
+    if not counted:
+        _count_lookups("local", list(fetched.values()))
+
+    if len(missing) > 0:
+        # read whole entries, a cached entry serves every projection
+        analyses = store.fetch(missing, cache.WHOLE, with_ttl=True)
+        if not counted:
+            _count_lookups("store", analyses)
+
+        for analysis in analyses:
+            if analysis is not None:
+                local.put(analysis)
+                fetched[analysis.id] = analysis
+
+    return [fetched[id] for id in ids]
+
+
+def _count_lookups(name: str, found: list[typing.Any]):
+    misses = found.count(None)
+    metrics.count_lookups(name, hits=len(found) - misses, misses=misses)
+
+
+def fetch_etag(
+    store: stores.AbstractStore, id: str, local: LocalCache = local_cache
+) -> str | None:
+    if local.enabled and store.remote:
+        analysis = local.get(id)
+        _count_lookups("local", [analysis])
+        if analysis is not None:
+            return analysis.etag
+
+    etag = store.fetch_etag(id)
+    _count_lookups("store", [etag])
+    return etag
+
+
+def listen(
+    redis_url: DatabaseURL | None = settings.REDIS_URL,
+    local: LocalCache = local_cache,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+) -> PubSubWorkerThread | None:
+    if redis_url is None or not local.enabled:
+        return None
+
+    def invalidate(message: dict[str, typing.Any]):
+        local.invalidate(message["data"].decode())
+
+    def on_error(e: BaseException, pubsub: typing.Any, thread: PubSubWorkerThread):
+        # messages may have been missed while disconnected
+        logger.warning(f"Cache invalidation listener failed: {e}")
+        local.clear()
+        time.sleep(1)
+
+    redis: Redis = Redis.from_url(str(redis_url))  # type: ignore
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(**{cache.invalidation_channel(key_prefix): invalidate})
+    except RedisError as e:
+        # entries still expire after LOCAL_CACHE_TTL
+        logger.warning(f"Failed to subscribe to cache invalidations: {e}")
+        return None
+
+    return pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=on_error)
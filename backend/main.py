@@ -1,10 +1,29 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.staticfiles import StaticFiles
 from loguru import logger
 
-from backend import settings
+from backend import admission, cache, guard, local_cache, metrics, settings
 from backend.api.api import api_router
+from backend.staticfiles import PrecompressedStaticFiles
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # every worker drops its copy of an analysis once it is cached again
+    listener = local_cache.listen(settings.REDIS_URL)
+    # indexes the entries cached before the index existed, off the request path
+    cache.start_backfill(settings.REDIS_URL)
+    # a worker takes traffic once its parser workers can be forked warm
+    try:
+        await guard.start()
+    except Exception as e:
+        logger.warning(f"Failed to start the parser workers: {e}")
+
+    yield
+    if listener is not None:
+        listener.stop()
 
 
 def create_app():
@@ -15,13 +34,22 @@ def create_app():
     app = FastAPI(
         debug=settings.DEBUG,
         title=settings.PROJECT_NAME,
+        lifespan=lifespan,
     )
     # add middleware
     app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.add_middleware(metrics.ServerTimingMiddleware)
+    # outermost, an analysis over the limit is rejected before its upload is read
+    app.add_middleware(admission.AdmissionMiddleware)
 
     # add routes
     app.include_router(api_router, prefix="/api")
-    app.mount("/", StaticFiles(html=True, directory="frontend/dist/"), name="index")
+    app.add_route("/metrics", metrics.metrics, include_in_schema=False)
+    app.mount(
+        "/",
+        PrecompressedStaticFiles(html=True, directory="frontend/dist/"),
+        name="index",
+    )
 
     return app
 
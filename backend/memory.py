@@ -0,0 +1,178 @@
+# Where the memory of an analysis goes: the allocations of every parsing stage
+# traced with tracemalloc, and the growth of the peak RSS of the process.
+#
+# A tracker is created per request (a context variable) and tracing runs where
+# the stages run, an isolated parser worker sending its usages back with the
+# result (see guard). Usages are observed into histograms and, with
+# MEMORY_TRACKING, returned in the debug section of the response along with
+# the lines allocating the most. An analysis whose traced memory exceeds
+# MEMORY_BUDGET fails once the stage is done, before the worker hits its hard
+# limit (PARSER_MEMORY_LIMIT) and is killed.
+#
+# tracemalloc slows the parsing down and traces every thread of the process:
+# without isolation, concurrent requests are counted as well.
+
+import contextlib
+import contextvars
+import os
+import resource
+import sys
+import tracemalloc
+import typing
+
+from backend import metrics, settings
+
+T = typing.TypeVar("T")
+
+MEGABYTE = 1024 * 1024
+
+# allocation sites reported per stage
+TOP_SITES = 3
+
+# the snapshots allocate as well
+_IGNORED = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+# ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+class Usage(typing.NamedTuple):
+    stage: str
+    # bytes still allocated once the stage is done
+    allocated: int
+    # bytes allocated at the peak of the stage
+    peak: int
+    # growth of the peak RSS of the process
+    peak_rss: int
+    # "file:line +size" of the lines allocating the most
+    sites: list[str]
+
+
+class Tracker:
+    def __init__(self, budget: int = 0, detailed: bool = False):
+        # in bytes, 0: no budget
+        self.budget = budget
+        self.detailed = detailed
+        self.baseline = 0
+        self.usages: list[Usage] = []
+
+
+def new_tracker(
+    tracking: bool = settings.MEMORY_TRACKING, budget: int = settings.MEMORY_BUDGET
+) -> Tracker | None:
+    if not tracking and budget <= 0:
+        return None
+
+    return Tracker(budget * MEGABYTE, detailed=tracking)
+
+
+_tracker: contextvars.ContextVar[Tracker | None] = contextvars.ContextVar(
+    "tracker", default=None
+)
+
+
+def current() -> Tracker | None:
+    return _tracker.get()
+
+
+@contextlib.contextmanager
+def collect(tracker: Tracker | None) -> typing.Generator[Tracker | None, None, None]:
+    if tracker is None:
+        yield None
+        return
+
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+
+
+def add(usages: typing.Iterable[Usage]):
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.usages.extend(usages)
+
+
+@contextlib.contextmanager
+def traced() -> typing.Generator[None, None, None]:
+    """Trace the allocations if there is a tracker to account them to."""
+    tracker = _tracker.get()
+    if tracker is None:
+        yield
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    tracker.baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def _top_sites(before: tracemalloc.Snapshot) -> list[str]:
+    after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    sites: list[str] = []
+    stats = after.compare_to(before.filter_traces(_IGNORED), "lineno")
+    for stat in stats[:TOP_SITES]:
+        frame = stat.traceback[0]
+        filename = os.path.basename(frame.filename)
+        sites.append(f"{filename}:{frame.lineno} {stat.size_diff:+d}")
+
+    return sites
+
+
+def measured(name: str, func: typing.Callable[..., T]) -> typing.Callable[..., T]:
+    def wrapper(*args: typing.Any, **kwargs: typing.Any) -> T:
+        tracker = _tracker.get()
+        if tracker is None or not tracemalloc.is_tracing():
+            return func(*args, **kwargs)
+
+        # taken first, so that the snapshot itself is in the baseline
+        snapshot = tracemalloc.take_snapshot() if tracker.detailed else None
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        rss = _peak_rss()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            allocated, peak = tracemalloc.get_traced_memory()
+            tracker.usages.append(
+                Usage(
+                    stage=name,
+                    allocated=allocated - before,
+                    peak=peak - before,
+                    peak_rss=_peak_rss() - rss,
+                    sites=_top_sites(snapshot) if snapshot is not None else [],
+                )
+            )
+
+        if tracker.budget > 0 and peak - tracker.baseline > tracker.budget:
+            raise BudgetExceededError(
+                f"Memory budget ({tracker.budget // MEGABYTE} MB) exceeded in {name}"
+            )
+
+        return result
+
+    return wrapper
+
+
+def observe(tracker: Tracker | None):
+    if tracker is None:
+        return
+
+    for usage in tracker.usages:
+        metrics.STAGE_MEMORY_BYTES.labels(usage.stage).observe(usage.peak)
+        metrics.STAGE_RSS_BYTES.labels(usage.stage).observe(usage.peak_rss)
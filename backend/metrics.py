@@ -0,0 +1,233 @@
+# Where the time of an analysis goes: spans around the parsing stages and the
+# verdict providers, returned in a Server-Timing header and exported, with the
+# in-flight analyses, the admission queue and the latency per lane, cache
+# lookups, provider failures and the memory of the stages (see memory), on
+# /metrics.
+#
+# Spans are collected per request (a context variable) and observed into the
+# histograms once the request is done, including the ones recorded by an
+# isolated parser worker (see guard). With several workers, point
+# PROMETHEUS_MULTIPROC_DIR to an empty directory: every worker writes its
+# samples there and /metrics aggregates them.
+
+import contextlib
+import contextvars
+import os
+import time
+import typing
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+T = typing.TypeVar("T")
+
+Kind = typing.Literal["stage", "provider"]
+
+# (kind, name, seconds)
+Span = tuple[Kind, str, float]
+
+# parsing stages take milliseconds, providers up to their timeouts
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "eml_analyzer_stage_seconds",
+    "Time spent in an analysis stage",
+    ["stage"],
+    buckets=BUCKETS,
+)
+PROVIDER_SECONDS = Histogram(
+    "eml_analyzer_provider_seconds",
+    "Time spent in a verdict provider call",
+    ["provider"],
+    buckets=BUCKETS,
+)
+PROVIDER_FAILURES = Counter(
+    "eml_analyzer_provider_failures",
+    "Failed verdict provider calls",
+    ["provider", "reason"],
+)
+ANALYSES_IN_FLIGHT = Gauge(
+    "eml_analyzer_analyses_in_flight",
+    "Analyses being run",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "eml_analyzer_cache_lookups",
+    "Cached analysis lookups, the hit ratio is hits / (hits + misses)",
+    ["cache", "result"],
+)
+
+ANALYSIS_QUEUE_DEPTH = Gauge(
+    "eml_analyzer_analysis_queue_depth",
+    "Analyses waiting for a slot (see admission)",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+ANALYSIS_QUEUE_SECONDS = Histogram(
+    "eml_analyzer_analysis_queue_seconds",
+    "Time an analysis waited for a slot",
+    ["lane"],
+    buckets=BUCKETS,
+)
+ANALYSES_REJECTED = Counter(
+    "eml_analyzer_analyses_rejected",
+    "Analyses rejected by the admission control",
+    ["reason", "lane"],
+)
+LANE_SECONDS = Histogram(
+    "eml_analyzer_lane_seconds",
+    "Time to answer an analysis, queue included, per lane (see lanes)",
+    ["lane"],
+    buckets=BUCKETS,
+)
+POOL_WAIT_SECONDS = Histogram(
+    "eml_analyzer_pool_wait_seconds",
+    "Time waited for the parser workers or a verdict provider",
+    ["pool", "lane"],
+    buckets=BUCKETS,
+)
+
+# in bytes, from 64 kB to 1 GB
+MEMORY_BUCKETS = tuple(float(4**exponent * 1024) for exponent in range(3, 11))
+
+STAGE_MEMORY_BYTES = Histogram(
+    "eml_analyzer_stage_memory_bytes",
+    "Peak traced memory of an analysis stage (see MEMORY_TRACKING)",
+    ["stage"],
+    buckets=MEMORY_BUCKETS,
+)
+STAGE_RSS_BYTES = Histogram(
+    "eml_analyzer_stage_rss_bytes",
+    "Growth of the peak RSS during an analysis stage (see MEMORY_TRACKING)",
+    ["stage"],
+    buckets=MEMORY_BUCKETS,
+)
+
+_HISTOGRAMS: dict[Kind, Histogram] = {
+    "stage": STAGE_SECONDS,
+    "provider": PROVIDER_SECONDS,
+}
+
+_spans: contextvars.ContextVar[list[Span] | None] = contextvars.ContextVar(
+    "spans", default=None
+)
+
+
+@contextlib.contextmanager
+def collect() -> typing.Generator[list[Span], None, None]:
+    spans: list[Span] = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+def add(spans: typing.Iterable[Span]):
+    collected = _spans.get()
+    if collected is not None:
+        collected.extend(spans)
+
+
+@contextlib.contextmanager
+def span(kind: Kind, name: str) -> typing.Generator[None, None, None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add([(kind, name, time.perf_counter() - start)])
+
+
+def _failure_reason(e: BaseException) -> str:
+    # httpx and openai errors carry the response, vt ones an error code
+    status_code = getattr(getattr(e, "response", None), "status_code", None)
+    code = getattr(e, "code", None)
+    if status_code == 429 or code == "QuotaExceededError":
+        return "rate_limited"
+
+    # an unknown file or URL, rather an answer than a failure
+    if status_code == 404 or code == "NotFoundError":
+        return "not_found"
+
+    # TimeoutError, httpx's ReadTimeout, openai's APITimeoutError...
+    if "Timeout" in type(e).__name__:
+        return "timeout"
+
+    return "error"
+
+
+@contextlib.contextmanager
+def count_failures(provider: str) -> typing.Generator[None, None, None]:
+    try:
+        yield
+    except Exception as e:
+        PROVIDER_FAILURES.labels(provider, _failure_reason(e)).inc()
+        raise
+
+
+def timed(name: str, func: typing.Callable[..., T]) -> typing.Callable[..., T]:
+    def wrapper(*args: typing.Any, **kwargs: typing.Any) -> T:
+        with span("stage", name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def count_lookups(cache: str, hits: int, misses: int):
+    CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def server_timing(spans: list[Span], total: float) -> str:
+    entries = [(name, seconds) for _, name, seconds in spans] + [("total", total)]
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in entries)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        with collect() as spans:
+
+            async def send_with_timing(message: Message):
+                if message["type"] == "http.response.start" and len(spans) > 0:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        server_timing(spans, time.perf_counter() - start),
+                    )
+
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                for kind, name, seconds in spans:
+                    _HISTOGRAMS[kind].labels(name).observe(seconds)
+
+
+def metrics(request: Request) -> Response:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,128 @@
+# A lazy MIME reader which indexes a message by byte offsets.
+#
+# Unlike email.message_from_bytes (and eml_parser on top of it), nothing is
+# decoded: the header block of a part is parsed the first time it is accessed
+# and multipart bodies are split on their boundaries on demand. This makes
+# walking the structure of a multi-megabyte message (see check_structure) and
+# cutting out its header block (see HeaderFactory) cheap.
+
+import email.message
+import email.policy
+import re
+from collections.abc import Iterator
+from email.parser import BytesHeaderParser
+from functools import cached_property
+
+HEADER_END_PATTERN = re.compile(rb"\r?\n\r?\n")
+
+
+class Part:
+    def __init__(
+        self, data: bytes, start: int = 0, end: int | None = None, depth: int = 0
+    ):
+        self.data = data
+        self.start = start
+        self.end = len(data) if end is None else end
+        self.depth = depth
+
+    @cached_property
+    def body_start(self) -> int:
+        # a part starting with an empty line has no headers at all
+        if self.data.startswith(b"\n", self.start):
+            return self.start + 1
+
+        if self.data.startswith(b"\r\n", self.start):
+            return self.start + 2
+
+        match = HEADER_END_PATTERN.search(self.data, self.start, self.end)
+        if match is None:
+            return self.end
+
+        return match.end()
+
+    @property
+    def header_bytes(self) -> bytes:
+        return self.data[self.start : self.body_start]
+
+    @cached_property
+    def headers(self) -> email.message.EmailMessage:
+        parser = BytesHeaderParser(policy=email.policy.default)
+        return parser.parsebytes(self.header_bytes)  # type: ignore
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get_content_type()
+
+    @property
+    def is_multipart(self) -> bool:
+        return self.headers.get_content_maintype() == "multipart"
+
+    @property
+    def is_message(self) -> bool:
+        return self.content_type == "message/rfc822"
+
+    @cached_property
+    def children(self) -> list["Part"]:
+        if self.is_message:
+            # an encapsulated message is a single part made of the whole body
+            return [Part(self.data, self.body_start, self.end, self.depth + 1)]
+
+        if not self.is_multipart:
+            return []
+
+        boundary = self.headers.get_boundary()
+        if boundary is None:
+            return []
+
+        return self._split(boundary)
+
+    def _split(self, boundary: str) -> list["Part"]:
+        delimiter = re.compile(
+            rb"^--"
+            + re.escape(boundary.encode("utf-8", "surrogateescape"))
+            + rb"(--)?[ \t]*(?:\r?\n|$)",
+            re.MULTILINE,
+        )
+
+        parts: list[Part] = []
+        part_start: int | None = None
+        for match in delimiter.finditer(self.data, self.body_start, self.end):
+            if part_start is not None:
+                # the line break in front of a delimiter belongs to the delimiter
+                part_end = match.start()
+                if self.data.startswith(b"\r\n", part_end - 2):
+                    part_end -= 2
+                elif self.data.startswith(b"\n", part_end - 1):
+                    part_end -= 1
+
+                parts.append(
+                    Part(
+                        self.data, part_start, max(part_end, part_start), self.depth + 1
+                    )
+                )
+
+            if match.group(1) is not None:
+                # close delimiter
+                return parts
+
+            part_start = match.end()
+
+        # the close delimiter is missing, the last part runs to the end
+        if part_start is not None and part_start < self.end:
+            parts.append(Part(self.data, part_start, self.end, self.depth + 1))
+
+        return parts
+
+    def walk(self) -> Iterator["Part"]:
+        # depth first, without recursion: the depth is not capped here, the
+        # caller stops walking (see check_structure)
+        stack: list[Part] = [self]
+        while len(stack) > 0:
+            part = stack.pop()
+            yield part
+            stack.extend(reversed(part.children))
+
+
+class LazyMessage(Part):
+    def __init__(self, data: bytes):
+        super().__init__(data)
@@ -19,6 +19,7 @@ import email.parser
 import email.policy
 import os
 import re
+from collections.abc import Callable, Iterator
 from email.message import EmailMessage
 from email.utils import formataddr, formatdate
 from functools import reduce
@@ -30,19 +31,54 @@ from loguru import logger
 
 FALLBACK_ENCODING = "cp1252"
 
+# A detach hook receives a header-only attachment part and the attachment
+# data. It may return a (small) placeholder to serialize instead of the data,
+# or None to keep the data in the message.
+Detach = Callable[[EmailMessage, bytes], bytes | None]
+
+
+# The storages of the attachments and recipients of a message, and the one of
+# an embedded message (PR_ATTACH_DATA_OBJ) inside its attachment storage
+ATTACHMENT_PREFIX = "__attach_version1.0_#"
+RECIPIENT_PREFIX = "__recip_version1.0_#"
+EMBEDDED_MESSAGE_STORAGE = "__substg1.0_3701000D"
+
 
 class Message:
     def __init__(self, filename_or_stream: str | BinaryIO):
         self.filename_or_stream = filename_or_stream
 
-    def to_email(self) -> EmailMessage:
+    def to_email(self, detach: Detach | None = None) -> EmailMessage:
         with CompoundFileReader(self.filename_or_stream) as doc:
             doc.rtf_attachments = 0
-            return load_message_stream(doc.root, True, doc)
+            return load_message_stream(doc.root, True, doc, detach=detach)
+
+    def walk(self) -> Iterator[int]:
+        """Yield the depth of the message and of every attachment, recipient
+        and embedded message in it, reading the directory of the file only."""
+        with CompoundFileReader(self.filename_or_stream) as doc:
+            yield from walk_message_storage(doc.root, 0)
+
+
+def walk_message_storage(entry: CompoundFileEntity, depth: int) -> Iterator[int]:
+    # the same depths as the MIME parts of the converted message: a part of
+    # the message, then the message embedded in an attachment part
+    yield depth
+    for child in entry:
+        if child.name.startswith(RECIPIENT_PREFIX):
+            yield depth + 1
+        elif child.name.startswith(ATTACHMENT_PREFIX):
+            yield depth + 1
+            for storage in child:
+                if storage.name == EMBEDDED_MESSAGE_STORAGE and storage.isdir:
+                    yield from walk_message_storage(storage, depth + 2)
 
 
 def load_message_stream(  # noqa: C901
-    entry: CompoundFileEntity, is_top_level: bool, doc: CompoundFileReader
+    entry: CompoundFileEntity,
+    is_top_level: bool,
+    doc: CompoundFileReader,
+    detach: Detach | None = None,
 ):
     # Load stream data.
     props = parse_properties(entry["__properties_version1.0"], is_top_level, entry, doc)
@@ -134,7 +170,9 @@ def load_message_stream(  # noqa: C901
         rtf = compressed_rtf.decompress(rtf)
 
         # Add RTF file as an attachment.
-        msg.add_attachment(rtf, maintype="text", subtype="rtf", filename=fn)
+        add_bytes_attachment(
+            msg, rtf, maintype="text", subtype="rtf", filename=fn, detach=detach
+        )
 
     # # Copy over string values of remaining properties as headers
     # # so we don't lose any information.
@@ -145,13 +183,37 @@ def load_message_stream(  # noqa: C901
     # Add attachments.
     for stream in entry:
         if stream.name.startswith("__attach_version1.0_#"):
-            process_attachment(msg, stream, doc)
+            process_attachment(msg, stream, doc, detach=detach)
 
     return msg
 
 
+def add_bytes_attachment(
+    msg: EmailMessage,
+    data: bytes,
+    *,
+    maintype: str,
+    subtype: str,
+    filename: str,
+    detach: Detach | None = None,
+):
+    if detach is not None:
+        # Build the headers exactly as add_attachment would, without
+        # base64-encoding the data just to let the hook look at them.
+        part = EmailMessage()
+        part.set_content(b"", maintype=maintype, subtype=subtype, filename=filename)
+        placeholder = detach(part, data)
+        if placeholder is not None:
+            data = placeholder
+
+    msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+
+
 def process_attachment(
-    msg: EmailMessage, entry: CompoundFileEntity, doc: CompoundFileReader
+    msg: EmailMessage,
+    entry: CompoundFileEntity,
+    doc: CompoundFileReader,
+    detach: Detach | None = None,
 ):
     # Load attachment stream.
     props = parse_properties(entry["__properties_version1.0"], False, entry, doc)
@@ -178,11 +240,13 @@ def process_attachment(
     if isinstance(blob, str):
         msg.add_attachment(blob, filename=filename)
     elif isinstance(blob, bytes):
-        msg.add_attachment(
+        add_bytes_attachment(
+            msg,
             blob,
             maintype=mime_type.split("/", 1)[0],
             subtype=mime_type.split("/", 1)[-1],
             filename=filename,
+            detach=detach,
         )
     else:  # a Message instance
         msg.add_attachment(blob, filename=filename)
@@ -0,0 +1,82 @@
+# Import and warm up, ahead of the first request, what the lazy imports defer:
+# the parsing libraries (dateparser and its language data, the libmagic
+# database, the ioc_finder grammars), the verdict providers and the pydantic
+# schemas of the API.
+#
+# A process forking workers (the gunicorn master with preload_app, the
+# forkserver of the parser workers) warms up once, then freezes its heap:
+# gc.freeze() moves every object to a generation the collector never visits,
+# so that the workers do not write to (and copy) the pages they share with
+# it copy-on-write.
+
+import gc
+import importlib
+from email.message import EmailMessage
+
+from fastapi import FastAPI
+
+from backend import settings
+
+PARSER_MODULES = (
+    "bs4",
+    "dateparser",
+    "eml_parser",
+    "html2text",
+    "ioc_finder",
+    "backend.outlookmsgfile",
+)
+APP_MODULES = ("openai", "oletools.oleid")
+
+
+def sample() -> bytes:
+    """A small email going through every parsing stage."""
+    message = EmailMessage()
+    message["From"] = "Preload <preload@example.com>"
+    message["To"] = "preload@example.com"
+    message["Subject"] = "Preload"
+    message["Date"] = "Mon, 14 Jul 2025 10:00:00 +0000"
+    message["Received"] = (
+        "from mail.example.com (mail.example.com [192.0.2.1]) by mx.example.com;"
+        " Mon, 14 Jul 2025 10:00:00 +0000"
+    )
+    message.set_content("Visit https://example.com or write to info@example.com")
+    message.add_alternative('<a href="https://example.com">example</a>', "html")
+    message.add_attachment(
+        b"\x00" * 64, maintype="application", subtype="octet-stream", filename="a.bin"
+    )
+    return message.as_bytes()
+
+
+def warm_parser():
+    from backend.factories import EmlFactory, HeaderFactory
+
+    for name in PARSER_MODULES:
+        importlib.import_module(name)
+
+    # the first call loads what the libraries load lazily (language data, the
+    # libmagic database, compiled patterns...)
+    data = sample()
+    EmlFactory().call(data)
+    HeaderFactory().call(data)
+
+
+def warm_app(app: FastAPI, *, isolation: bool = settings.PARSER_ISOLATION):
+    for name in APP_MODULES:
+        importlib.import_module(name)
+
+    # builds the JSON schemas of every model, served on /docs
+    app.openapi()
+
+    # an isolated parser worker is forked from a server warmed up on its own
+    if not isolation:
+        warm_parser()
+
+
+def freeze():
+    gc.collect()
+    gc.freeze()
+
+
+def preload(app: FastAPI):
+    warm_app(app)
+    freeze()
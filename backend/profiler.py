@@ -0,0 +1,132 @@
+# Profile a single analysis with a sampling profiler.
+#
+# A thread samples the stack of the profiled thread every PROFILING_INTERVAL
+# seconds, which costs next to nothing to the profiled code. It is a wall-clock
+# profile: sampling the event loop thread shows concurrent requests as well.
+# Stacks are counted in the collapsed format ("root;caller;callee count"
+# lines), which flamegraph.pl and speedscope read. An isolated parser worker
+# samples itself and sends its stacks back with the result (see guard).
+#
+# An analysis is profiled when an admin asks for it (X-Profile header holding
+# PROFILING_TOKEN) or, if PROFILING_SLOW_THRESHOLD is set, always, and then
+# kept only when it took longer than the threshold. Profiles are stored next
+# to the cached analysis.
+
+import collections
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+import types
+import typing
+
+from loguru import logger
+
+from backend import settings, stores
+
+# bounds the collapsed output of a pathological recursion
+MAX_DEPTH = 200
+
+
+def _collapse(frame: types.FrameType | None) -> str:
+    names: list[str] = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    # root first, ";" separates the frames
+    return ";".join(reversed(names))
+
+
+class Profile:
+    def __init__(self, interval: float = settings.PROFILING_INTERVAL):
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+
+    def merge(self, stacks: typing.Mapping[str, int]):
+        self.stacks.update(stacks)
+
+    def collapsed(self) -> bytes:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        ).encode()
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: Profile, thread_id: int):
+        super().__init__(name="profiler", daemon=True)
+        self.profile = profile
+        self.thread_id = thread_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.profile.stacks[_collapse(frame)] += 1
+
+
+_current: contextvars.ContextVar[Profile | None] = contextvars.ContextVar(
+    "profile", default=None
+)
+
+
+def current() -> Profile | None:
+    return _current.get()
+
+
+def add(stacks: typing.Mapping[str, int]):
+    profile = _current.get()
+    if profile is not None:
+        profile.merge(stacks)
+
+
+@contextlib.contextmanager
+def profile(interval: float) -> typing.Generator[Profile, None, None]:
+    """Sample the calling thread every interval seconds (never if 0)."""
+    result = Profile(interval)
+    sampler = _Sampler(result, threading.get_ident()) if interval > 0 else None
+    token = _current.set(result)
+    if sampler is not None:
+        sampler.start()
+
+    try:
+        yield result
+    finally:
+        if sampler is not None:
+            sampler.stopped.set()
+            sampler.join()
+
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def capture(
+    id: str,
+    *,
+    requested: bool,
+    optional_store: stores.AbstractStore | None,
+    threshold: float = settings.PROFILING_SLOW_THRESHOLD,
+    interval: float = settings.PROFILING_INTERVAL,
+) -> typing.Generator[None, None, None]:
+    """Profile the analysis of id if requested or if it may be slow, and store
+    the profile if it was requested or slow."""
+    if optional_store is None or (not requested and threshold <= 0):
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        with profile(interval) as result:
+            yield
+    finally:
+        # a failing analysis (e.g. a limit exceeded) is kept as well
+        if requested or time.perf_counter() - start >= threshold:
+            try:
+                optional_store.cache_profile(id, result.collapsed())
+            except Exception as e:
+                logger.warning(f"Failed to store the profile of {id}: {e}")
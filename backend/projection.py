@@ -0,0 +1,141 @@
+# Trim analysis responses down to the fields a client asks for.
+#
+# A projection is a tree of field names as they appear in the JSON response
+# (camelCase aliases), e.g. {"id": True, "eml": {"header": {"subject": True}}}.
+# It is applied either to a model before serialization (as pydantic's include)
+# or to the JSON parts of a cached analysis.
+
+import json
+import types
+import typing
+
+from pydantic import BaseModel
+
+from backend import schemas
+
+Projection = dict[str, typing.Union[bool, "Projection"]]
+
+
+class InvalidProjectionError(ValueError):
+    pass
+
+
+def _unwrap(annotation: typing.Any) -> tuple[type[BaseModel] | None, bool]:
+    # returns the model of a field (if any) and whether it is a list of it
+    is_list = False
+    while True:
+        origin = typing.get_origin(annotation)
+        if origin in (typing.Union, types.UnionType):
+            args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            if len(args) != 1:
+                return None, is_list
+
+            annotation = args[0]
+        elif origin is list:
+            is_list = True
+            annotation = typing.get_args(annotation)[0]
+        else:
+            break
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, is_list
+
+    return None, is_list
+
+
+def _find_field(model: type[BaseModel], alias: str) -> tuple[str, typing.Any]:
+    for name, field in model.model_fields.items():
+        if alias in (field.alias, name):
+            return name, field.annotation
+
+    raise InvalidProjectionError(f"Unknown field: {alias}")
+
+
+def _merge(projection: Projection, path: list[str], model: type[BaseModel]):
+    alias, rest = path[0], path[1:]
+    name, annotation = _find_field(model, alias)
+    key = model.model_fields[name].alias or name
+
+    if len(rest) == 0:
+        projection[key] = True
+        return
+
+    submodel, _ = _unwrap(annotation)
+    if submodel is None:
+        raise InvalidProjectionError(f"{alias} has no fields")
+
+    child = projection.setdefault(key, {})
+    if child is True:
+        # the whole field is already included
+        return
+
+    _merge(typing.cast(Projection, child), rest, submodel)
+
+
+def parse_fields(fields: str, model: type[BaseModel] = schemas.Response) -> Projection:
+    projection: Projection = {}
+    for field in fields.split(","):
+        path = [segment.strip() for segment in field.split(".")]
+        if any(segment == "" for segment in path):
+            raise InvalidProjectionError(f"Invalid field: {field}")
+
+        _merge(projection, path, model)
+
+    return projection
+
+
+def _summary() -> Projection:
+    header: Projection = {
+        field.alias or name: True
+        for name, field in schemas.Header.model_fields.items()
+        if name != "header"
+    }
+    return {"id": True, "verdicts": True, "eml": {"header": header}}
+
+
+PROFILES: dict[str, Projection | None] = {
+    "full": None,
+    "summary": _summary(),
+    "verdicts": {"id": True, "verdicts": True},
+}
+
+
+def to_include(
+    projection: Projection, model: type[BaseModel] = schemas.Response
+) -> dict[str, typing.Any]:
+    include: dict[str, typing.Any] = {}
+    for alias, child in projection.items():
+        name, annotation = _find_field(model, alias)
+        if isinstance(child, bool):
+            include[name] = child
+            continue
+
+        submodel, is_list = _unwrap(annotation)
+        assert submodel is not None
+        sub_include = to_include(child, submodel)
+        include[name] = {"__all__": sub_include} if is_list else sub_include
+
+    return include
+
+
+def project(value: typing.Any, projection: Projection) -> typing.Any:
+    # the same as to_include, for a JSON value (a cached part)
+    if isinstance(value, list):
+        return [project(item, projection) for item in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    return {
+        key: item if projection[key] is True else project(item, projection[key])  # type: ignore
+        for key, item in value.items()
+        if key in projection
+    }
+
+
+def project_json(data: bytes, projection: Projection | bool) -> bytes:
+    if projection is True:
+        return data
+
+    projected = project(json.loads(data), typing.cast(Projection, projection))
+    return json.dumps(projected, ensure_ascii=False, separators=(",", ":")).encode()
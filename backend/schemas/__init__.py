@@ -1,6 +1,15 @@
+from .cache import (  # noqa: F401
+    CachePage,
+    CacheSummary,
+    CacheVerdict,
+    LocalCacheStats,
+)
+from .debug import Debug, StageMemory  # noqa: F401
 from .emailrep import EmailRepLookup  # noqa: F401
-from .eml import Attachment, Body, Eml  # noqa: F401
+from .eml import Attachment, Body, Eml, Header  # noqa: F401
 from .inquest import InQuestLookup  # noqa: F401
+from .lookup import BulkLookupPayload, BulkLookupResult  # noqa: F401
+from .options import PROVIDERS, AnalysisOptions, Provider  # noqa: F401
 from .payload import FilePayload, Payload  # noqa: F401
 from .response import Response  # noqa: F401
 from .spamassasin import SpamAssassinDetail, SpamAssassinReport  # noqa: F401
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from pydantic import Field
+
+from .api_model import APIModel
+
+
+class CacheVerdict(APIModel):
+    name: str
+    malicious: bool
+
+
+class CacheSummary(APIModel):
+    id: str
+    subject: str
+    from_: str | None = Field(default=None, alias="from")
+    date: datetime | None = None
+    analyzed_at: datetime
+    verdicts: list[CacheVerdict] = Field(default_factory=list)
+
+
+class CachePage(APIModel):
+    items: list[CacheSummary] = Field(default_factory=list)
+    next_cursor: str | None = Field(
+        default=None, description="Cursor of the next page, null on the last page"
+    )
+
+
+class LocalCacheStats(APIModel):
+    enabled: bool
+    hits: int
+    misses: int
+    hit_ratio: float | None = Field(
+        default=None, description="hits / (hits + misses), null before any lookup"
+    )
+    evictions: int
+    invalidations: int
+    entries: int
+    size: int = Field(description="Size of the entries (in bytes)")
+    max_size: int = Field(description="Size limit (in bytes)")
@@ -0,0 +1,23 @@
+from pydantic import Field
+
+from .api_model import APIModel
+
+
+class StageMemory(APIModel):
+    stage: str
+    allocated: int = Field(
+        ..., description="Bytes still allocated once the stage is done"
+    )
+    peak: int = Field(..., description="Bytes allocated at the peak of the stage")
+    peak_rss: int = Field(
+        ..., description="Growth of the peak RSS of the process (in bytes)"
+    )
+    sites: list[str] = Field(
+        default_factory=list, description="Lines allocating the most (file:line +size)"
+    )
+
+
+class Debug(APIModel):
+    memory: list[StageMemory] = Field(
+        default_factory=list, description="Memory usage of the parsing stages"
+    )
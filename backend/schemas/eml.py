@@ -13,7 +13,7 @@ class Hash(APIModel):
 
 
 class Attachment(APIModel):
-    raw: str
+    raw: str = Field(default="", description="Base64 encoded data, empty if omitted")
     filename: str
     size: int
     extension: str | None = None
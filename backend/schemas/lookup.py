@@ -0,0 +1,15 @@
+from pydantic import Field
+
+from .api_model import APIModel
+from .response import Response
+
+
+class BulkLookupPayload(APIModel):
+    ids: list[str] = Field(min_length=1, max_length=500)
+
+
+class BulkLookupResult(APIModel):
+    id: str
+    analysis: Response | None = Field(
+        default=None, description="Cached analysis, null if it is not found"
+    )
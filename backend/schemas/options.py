@@ -0,0 +1,32 @@
+import typing
+
+from pydantic import Field
+
+from .api_model import APIModel
+
+Provider = typing.Literal[
+    "spamassassin", "oleid", "emailrep", "virustotal", "inquest", "urlscan", "openai"
+]
+PROVIDERS: tuple[Provider, ...] = typing.get_args(Provider)
+
+
+class AnalysisOptions(APIModel):
+    providers: list[Provider] | None = Field(
+        default=None,
+        description="Verdict providers to run, all available ones if not set",
+    )
+    extract_iocs: bool = Field(
+        default=True,
+        description="Whether to extract URLs, emails, domains and IPs from bodies",
+    )
+    include_raw: bool = Field(
+        default=True,
+        description="Whether to return attachment data and body contents",
+    )
+
+    @property
+    def is_full(self) -> bool:
+        return self.providers is None and self.extract_iocs and self.include_raw
+
+    def wants(self, provider: Provider) -> bool:
+        return self.providers is None or provider in self.providers
@@ -4,6 +4,7 @@ from functools import cached_property
 from pydantic import Field
 
 from .api_model import APIModel
+from .debug import Debug
 from .eml import Eml
 from .verdict import Verdict
 
@@ -12,6 +13,8 @@ class Response(APIModel):
     eml: Eml
     verdicts: list[Verdict] = Field(default_factory=list)
     id: str
+    # never cached, added to the HTTP body of the analysis only (see MEMORY_TRACKING)
+    debug: Debug | None = Field(default=None, exclude=True)
 
     @cached_property
     def urls(self) -> set[str]:
@@ -19,6 +22,20 @@ class Response(APIModel):
             itertools.chain.from_iterable([body.urls for body in self.eml.bodies])
         )
 
+    @cached_property
+    def domains(self) -> set[str]:
+        return set(
+            itertools.chain.from_iterable([body.domains for body in self.eml.bodies])
+        )
+
+    @cached_property
+    def ip_addresses(self) -> set[str]:
+        return set(
+            itertools.chain.from_iterable(
+                [body.ip_addresses for body in self.eml.bodies]
+            )
+        )
+
     @cached_property
     def sha256s(self) -> set[str]:
         return {attachment.hash.sha256 for attachment in self.eml.attachments}
@@ -1,6 +1,7 @@
 from pydantic import Field
 
 from .api_model import APIModel
+from .options import AnalysisOptions, Provider
 
 
 class Status(APIModel):
@@ -17,3 +18,10 @@ class Status(APIModel):
     email_rep: bool = Field(
         default=False, description="Whether EmailRep integration is enabled or not"
     )
+    providers: list[Provider] = Field(
+        default_factory=list, description="Verdict providers which can be selected"
+    )
+    options: list[str] = Field(
+        default_factory=lambda: list(AnalysisOptions.model_fields.keys()),
+        description="Analysis options which can be set per request (query params)",
+    )
@@ -24,12 +24,48 @@ SPAMASSASSIN_HOST: str = config("SPAMASSASSIN_HOST", cast=str, default="127.0.0.
 SPAMASSASSIN_PORT: int = config("SPAMASSASSIN_PORT", cast=int, default=783)
 SPAMASSASSIN_TIMEOUT: int = config("SPAMASSASSIN_TIMEOUT", cast=int, default=10)
 
+# Parser guard
+# a warmed forkserver per gunicorn worker (~75 MB private each, see README)
+PARSER_ISOLATION: bool = config("PARSER_ISOLATION", cast=bool, default=False)
+PARSER_TIMEOUT: int = config("PARSER_TIMEOUT", cast=int, default=60)
+PARSER_CPU_TIME_LIMIT: int = config("PARSER_CPU_TIME_LIMIT", cast=int, default=30)
+PARSER_MEMORY_LIMIT: int = config("PARSER_MEMORY_LIMIT", cast=int, default=2048)
+MIME_MAX_DEPTH: int = config("MIME_MAX_DEPTH", cast=int, default=50)
+MIME_MAX_PARTS: int = config("MIME_MAX_PARTS", cast=int, default=1000)
+
+# Admission control: analyses run at once per worker (0: no limit), analyses
+# waiting for a slot and how long they wait (in seconds) before a 503
+ANALYSIS_CONCURRENCY: int = config("ANALYSIS_CONCURRENCY", cast=int, default=8)
+ANALYSIS_QUEUE_SIZE: int = config("ANALYSIS_QUEUE_SIZE", cast=int, default=16)
+ANALYSIS_QUEUE_TIMEOUT: float = config("ANALYSIS_QUEUE_TIMEOUT", cast=float, default=10)
+
+# Priority lanes: minimum share of the slots handed to bulk analyses while
+# interactive ones wait too, parser workers and calls per provider run at once
+# per worker (0: no limit)
+LANE_BULK_SHARE: float = config("LANE_BULK_SHARE", cast=float, default=0.2)
+PARSER_CONCURRENCY: int = config("PARSER_CONCURRENCY", cast=int, default=4)
+PROVIDER_CONCURRENCY: int = config("PROVIDER_CONCURRENCY", cast=int, default=4)
+
+# Memory accounting: trace the allocations of every parsing stage (slow, for
+# debugging) and fail an analysis exceeding the budget (in MB, 0: no budget)
+MEMORY_TRACKING: bool = config("MEMORY_TRACKING", cast=bool, default=False)
+MEMORY_BUDGET: int = config("MEMORY_BUDGET", cast=int, default=0)
+
 # Redis
 REDIS_URL: DatabaseURL | None = config("REDIS_URL", cast=DatabaseURL, default=None)
 REDIS_EXPIRE: int = config("REDIS_EXPIRE", cast=int, default=3600)
 REDIS_KEY_PREFIX: str = config("REDIS_KEY_PREFIX", cast=str, default="analysis")
+# gzip level (1-9) of cached analyses, 0 stores them as plain JSON
+REDIS_COMPRESSION_LEVEL: int = config("REDIS_COMPRESSION_LEVEL", cast=int, default=6)
+# per-worker LRU in front of Redis: size in MB (0 disables it), TTL in seconds
+LOCAL_CACHE_SIZE: int = config("LOCAL_CACHE_SIZE", cast=int, default=64)
+LOCAL_CACHE_TTL: int = config("LOCAL_CACHE_TTL", cast=int, default=60)
 REDIS_CACHE_LIST_AVAILABLE: bool = config("REDIS_CACHE_LIST_AVAILABLE", cast=bool, default=True)
 
+# SQLite (used instead of Redis if REDIS_URL is not set)
+SQLITE_PATH: str | None = config("SQLITE_PATH", cast=str, default=None)
+SQLITE_MMAP_SIZE: int = config("SQLITE_MMAP_SIZE", cast=int, default=256)
+
 # 3rd party API keys
 VIRUSTOTAL_API_KEY: Secret | None = config(
     "VIRUSTOTAL_API_KEY", cast=Secret, default=None
@@ -40,6 +76,20 @@ EMAIL_REP_API_KEY: Secret | None = config(
     "EMAIL_REP_API_KEY", cast=Secret, default=None
 )
 
+# Profiling: analyses are profiled on request (X-Profile header holding the
+# token) and, if the threshold (in seconds) is set, when they are that slow
+PROFILING_TOKEN: Secret | None = config("PROFILING_TOKEN", cast=Secret, default=None)
+PROFILING_SLOW_THRESHOLD: float = config(
+    "PROFILING_SLOW_THRESHOLD", cast=float, default=0
+)
+PROFILING_INTERVAL: float = config("PROFILING_INTERVAL", cast=float, default=0.01)
+
+# 3rd party API endpoints (e.g. local stand-ins for load testing)
+VIRUSTOTAL_URL: str = config("VIRUSTOTAL_URL", default="https://www.virustotal.com")
+INQUEST_URL: str = config("INQUEST_URL", default="https://labs.inquest.net")
+URLSCAN_URL: str = config("URLSCAN_URL", default="https://urlscan.io")
+EMAIL_REP_URL: str = config("EMAIL_REP_URL", default="https://emailrep.io")
+
 # Async/aiometer
 ASYNC_MAX_AT_ONCE: int | None = config("ASYNC_MAX_AT_ONCE", cast=int, default=None)
 ASYNC_MAX_PER_SECOND: float | None = config(
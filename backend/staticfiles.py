@@ -0,0 +1,88 @@
+# Serve the frontend bundle with precompressed siblings and cache headers.
+#
+# The frontend build writes foo.js.br and foo.js.gz next to foo.js, so a file
+# is never compressed per request. Vite names the bundled assets after their
+# content hash, which lets browsers keep them forever; everything else
+# (index.html in particular) is revalidated on every load.
+
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from backend.utils import accepts_encoding
+
+# preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# e.g. assets/index-B9SHoNqY.js
+IMMUTABLE_PATTERN = re.compile(r"(^|/)assets/[^/]+-[\w-]{8}\.\w+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def find_encoded(
+    full_path: str, accept_encoding: str
+) -> tuple[str, str, os.stat_result] | None:
+    for encoding, suffix in ENCODINGS:
+        if not accepts_encoding(accept_encoding, encoding):
+            continue
+
+        try:
+            stat_result = os.stat(full_path + suffix)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+
+        return encoding, full_path + suffix, stat_result
+
+    return None
+
+
+def has_encoded(full_path: str) -> bool:
+    return any(os.path.isfile(full_path + suffix) for _, suffix in ENCODINGS)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = os.fspath(full_path)
+        request_headers = Headers(scope=scope)
+        relative_path = full_path.replace(os.sep, "/")
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+            if IMMUTABLE_PATTERN.search(relative_path)
+            else REVALIDATE_CACHE_CONTROL
+        }
+        if has_encoded(full_path):
+            headers["Vary"] = "Accept-Encoding"
+
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        encoded = find_encoded(full_path, request_headers.get("accept-encoding", ""))
+        if encoded is not None:
+            encoding, full_path, stat_result = encoded
+            headers["Content-Encoding"] = encoding
+
+        # FileResponse answers range requests from the file directly, and its
+        # etag (size + mtime) differs between the encoded siblings
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        return response
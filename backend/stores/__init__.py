@@ -0,0 +1,3 @@
+from .abstract import AbstractStore  # noqa: F401
+from .redis import RedisStore  # noqa: F401
+from .sqlite import SQLiteStore  # noqa: F401
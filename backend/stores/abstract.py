@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+
+from backend import cache, projection, schemas
+
+
+class AbstractStore(ABC):
+    # whether reads go over the network (and are worth a local cache)
+    remote: bool = False
+
+    @abstractmethod
+    def cache_response(
+        self, response: schemas.Response, parts: dict[str, bytes] | None = None
+    ):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def fetch(
+        self,
+        ids: list[str],
+        projected: projection.Projection | None = None,
+        *,
+        with_ttl: bool = False,
+    ) -> list[cache.CachedAnalysis | None]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def fetch_etag(self, id: str) -> str | None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def cache_profile(self, id: str, profile: bytes):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def fetch_profile(self, id: str) -> bytes | None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def list_summaries(
+        self, cursor: cache.Cursor | None = None, limit: int = 50
+    ) -> schemas.CachePage:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def search(
+        self, indicators: list[tuple[str, str]], limit: int = 50
+    ) -> list[schemas.CacheSummary]:
+        raise NotImplementedError()
@@ -0,0 +1,74 @@
+from redis import Redis
+
+from backend import cache, projection, schemas, settings
+
+from .abstract import AbstractStore
+
+
+class RedisStore(AbstractStore):
+    remote = True
+
+    def __init__(
+        self,
+        redis: Redis,
+        expire: int = settings.REDIS_EXPIRE,
+        key_prefix: str = settings.REDIS_KEY_PREFIX,
+    ):
+        self.redis = redis
+        self.expire = expire
+        self.key_prefix = key_prefix
+
+    def cache_response(
+        self, response: schemas.Response, parts: dict[str, bytes] | None = None
+    ):
+        cache.cache_response(
+            self.redis,
+            response,
+            parts,
+            expire=self.expire,
+            key_prefix=self.key_prefix,
+        )
+
+    def fetch(
+        self,
+        ids: list[str],
+        projected: projection.Projection | None = None,
+        *,
+        with_ttl: bool = False,
+    ) -> list[cache.CachedAnalysis | None]:
+        return cache.fetch(
+            self.redis, ids, projected, key_prefix=self.key_prefix, with_ttl=with_ttl
+        )
+
+    def fetch_etag(self, id: str) -> str | None:
+        return cache.fetch_etag(self.redis, id, key_prefix=self.key_prefix)
+
+    def cache_profile(self, id: str, profile: bytes):
+        cache.cache_profile(
+            self.redis, id, profile, expire=self.expire, key_prefix=self.key_prefix
+        )
+
+    def fetch_profile(self, id: str) -> bytes | None:
+        return cache.fetch_profile(self.redis, id, key_prefix=self.key_prefix)
+
+    def list_summaries(
+        self, cursor: cache.Cursor | None = None, limit: int = 50
+    ) -> schemas.CachePage:
+        return cache.list_summaries(
+            self.redis,
+            cursor=cursor,
+            limit=limit,
+            expire=self.expire,
+            key_prefix=self.key_prefix,
+        )
+
+    def search(
+        self, indicators: list[tuple[str, str]], limit: int = 50
+    ) -> list[schemas.CacheSummary]:
+        return cache.search(
+            self.redis,
+            indicators,
+            limit=limit,
+            expire=self.expire,
+            key_prefix=self.key_prefix,
+        )
@@ -0,0 +1,260 @@
+# An embedded store for single node deployments without Redis.
+#
+# Analyses are kept in a SQLite database in WAL mode, which the workers of a
+# node share: readers neither block each other nor the writer, and a writer
+# waits for the lock (busy timeout) instead of failing. Reads go through a
+# memory map. Expired rows are skipped on read and deleted on write, and the
+# freed pages are handed back to the file system (incremental vacuum).
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import typing
+import zlib
+
+from backend import cache, projection, schemas, settings
+
+from .abstract import AbstractStore
+
+# seconds a writer waits for another worker to release the lock
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    analyzed_at REAL NOT NULL,
+    expires_at REAL,
+    etag BLOB NOT NULL,
+    summary BLOB NOT NULL,
+    header BLOB NOT NULL,
+    verdicts BLOB NOT NULL,
+    -- the large column goes last: reading the others stops before its pages
+    response BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_analyzed_at ON analyses (analyzed_at);
+CREATE INDEX IF NOT EXISTS analyses_expires_at ON analyses (expires_at);
+
+CREATE TABLE IF NOT EXISTS indicators (
+    key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    PRIMARY KEY (key, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS indicators_id ON indicators (id);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    id TEXT PRIMARY KEY,
+    expires_at REAL,
+    profile BLOB NOT NULL
+);
+"""
+
+ALIVE = "(expires_at IS NULL OR expires_at > ?)"
+
+COLUMNS = ("etag", "header", "verdicts", "response")
+
+
+class SQLiteStore(AbstractStore):
+    def __init__(
+        self,
+        path: str,
+        expire: int = settings.REDIS_EXPIRE,
+        compression_level: int = settings.REDIS_COMPRESSION_LEVEL,
+        mmap_size: int = settings.SQLITE_MMAP_SIZE * 1024 * 1024,
+    ):
+        self.path = path
+        self.expire = expire
+        self.compression_level = compression_level
+        self.mmap_size = mmap_size
+
+        # a connection per thread (and per process, workers may be forked)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        # autocommit, transactions are started explicitly
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        # only takes effect on a new database
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.executescript(SCHEMA)
+        return conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # the connections of the parent process must not be shared
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+        conn: sqlite3.Connection | None = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = self._local.connection = self._connect()
+
+        return conn
+
+    def close(self):
+        conn: sqlite3.Connection | None = getattr(self._local, "connection", None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+    @contextlib.contextmanager
+    def _transaction(self) -> typing.Generator[sqlite3.Connection, None, None]:
+        conn = self.connection
+        # take the write lock up front, a deferred transaction which has read
+        # already fails with SQLITE_BUSY when it has to wait for it
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("COMMIT")
+
+    def cache_response(
+        self, response: schemas.Response, parts: dict[str, bytes] | None = None
+    ):
+        parts = parts if parts is not None else cache.serialize_parts(response)
+        fields = cache.to_fields(response.id, parts, self.compression_level)
+        now = time.time()
+        expires_at = now + self.expire if self.expire > 0 else None
+        summary = cache.summary_adapter.dump_json(
+            cache.summarize(response, now), by_alias=True
+        )
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses"
+                " (id, analyzed_at, expires_at, summary, etag, header, verdicts,"
+                " response) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    response.id,
+                    now,
+                    expires_at,
+                    summary,
+                    *[fields[name] for name in COLUMNS],
+                ),
+            )
+            conn.execute("DELETE FROM indicators WHERE id = ?", (response.id,))
+            conn.executemany(
+                "INSERT INTO indicators (key, id, analyzed_at) VALUES (?, ?, ?)",
+                [(key, response.id, now) for key in cache.indicator_keys(response)],
+            )
+            compacted = self._compact(conn, now)
+
+        if compacted > 0:
+            conn.execute("PRAGMA incremental_vacuum")
+
+    def _compact(self, conn: sqlite3.Connection, now: float) -> int:
+        conn.execute(
+            "DELETE FROM indicators WHERE id IN"
+            " (SELECT id FROM analyses WHERE expires_at <= ?)",
+            (now,),
+        )
+        return (
+            conn.execute("DELETE FROM analyses WHERE expires_at <= ?", (now,)).rowcount
+            + conn.execute(
+                "DELETE FROM profiles WHERE expires_at <= ?", (now,)
+            ).rowcount
+        )
+
+    def fetch(
+        self,
+        ids: list[str],
+        projected: projection.Projection | None = None,
+        *,
+        with_ttl: bool = False,
+    ) -> list[cache.CachedAnalysis | None]:
+        if len(ids) == 0:
+            return []
+
+        columns = cache.field_names(projected)
+        unique = list(dict.fromkeys(ids))
+        now = time.time()
+        rows = self.connection.execute(
+            f"SELECT id, expires_at, {', '.join(columns)} FROM analyses"
+            f" WHERE id IN ({', '.join('?' * len(unique))}) AND {ALIVE}",
+            (*unique, now),
+        )
+
+        fetched: dict[str, cache.CachedAnalysis] = {}
+        for id, expires_at, *values in rows:
+            ttl = expires_at - now if with_ttl and expires_at is not None else None
+            fetched[id] = cache.CachedAnalysis(
+                id, dict(zip(columns, values, strict=True)), ttl
+            )
+
+        return [fetched.get(id) for id in ids]
+
+    def fetch_etag(self, id: str) -> str | None:
+        row = self.connection.execute(
+            f"SELECT etag FROM analyses WHERE id = ? AND {ALIVE}", (id, time.time())
+        ).fetchone()
+        return row[0].decode() if row is not None else None
+
+    def cache_profile(self, id: str, profile: bytes):
+        now = time.time()
+        expires_at = now + self.expire if self.expire > 0 else None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (id, expires_at, profile)"
+                " VALUES (?, ?, ?)",
+                (id, expires_at, zlib.compress(profile)),
+            )
+            compacted = self._compact(conn, now)
+
+        if compacted > 0:
+            conn.execute("PRAGMA incremental_vacuum")
+
+    def fetch_profile(self, id: str) -> bytes | None:
+        row = self.connection.execute(
+            f"SELECT profile FROM profiles WHERE id = ? AND {ALIVE}", (id, time.time())
+        ).fetchone()
+        return zlib.decompress(row[0]) if row is not None else None
+
+    def list_summaries(
+        self, cursor: cache.Cursor | None = None, limit: int = 50
+    ) -> schemas.CachePage:
+        # newest first, then by id like the Redis index. the cursor is the time
+        # and the id of the last item served
+        analyzed_at, id = cursor if cursor is not None else (float("inf"), "")
+        rows: list[tuple[bytes, float, str]] = self.connection.execute(
+            "SELECT summary, analyzed_at, id FROM analyses"
+            " WHERE (analyzed_at < ? OR (analyzed_at = ? AND id < ?))"
+            f" AND {ALIVE} ORDER BY analyzed_at DESC, id DESC LIMIT ?",
+            (analyzed_at, analyzed_at, id, time.time(), limit + 1),
+        ).fetchall()
+        page = rows[:limit]
+        return schemas.CachePage(
+            items=[
+                cache.summary_adapter.validate_json(summary) for summary, _, _ in page
+            ],
+            next_cursor=cache.encode_cursor(page[-1][1], page[-1][2])
+            if len(rows) > limit
+            else None,
+        )
+
+    def search(
+        self, indicators: list[tuple[str, str]], limit: int = 50
+    ) -> list[schemas.CacheSummary]:
+        keys = list({cache.indicator_key(kind, value) for kind, value in indicators})
+        # analyses having every indicator, newest first
+        rows = self.connection.execute(
+            "SELECT analyses.summary FROM indicators"
+            " JOIN analyses ON analyses.id = indicators.id"
+            f" WHERE indicators.key IN ({', '.join('?' * len(keys))}) AND {ALIVE}"
+            " GROUP BY indicators.id HAVING COUNT(*) = ?"
+            " ORDER BY MIN(indicators.analyzed_at) DESC LIMIT ?",
+            (*keys, time.time(), len(keys), limit),
+        )
+        return [cache.summary_adapter.validate_json(summary) for (summary,) in rows]
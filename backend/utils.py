@@ -4,12 +4,11 @@ import urllib.parse
 from io import BytesIO
 from typing import Any
 
-import html2text
-from bs4 import BeautifulSoup
-from ioc_finder import parse_urls
-
 from backend.schemas.eml import Attachment
 
+# bs4, html2text and ioc_finder are imported where they are used: they take
+# a second to import and only the parser workers need them (see preload)
+
 
 def is_html(content_type: str) -> bool:
     return "text/html" in content_type
@@ -42,6 +41,8 @@ def normalize_urls(urls: typing.Iterable[str]) -> set[str]:
 
 
 def get_href_links(html: str) -> set[str]:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     links: set[str] = {str(link.get("href")) for link in soup.findAll("a")}
     return {
@@ -52,6 +53,9 @@ def get_href_links(html: str) -> set[str]:
 
 
 def parse_urls_from_body(content: str, content_type: str) -> set[str]:
+    import html2text
+    from ioc_finder import parse_urls
+
     urls: set[str] = set()
 
     if is_html(content_type):
@@ -83,6 +87,26 @@ def is_truthy(v: Any) -> bool:
         return False
 
 
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    # the coding named explicitly wins over "*", e.g. in "*;q=0, gzip"
+    q_values: dict[str, str] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if name in (coding, "*"):
+            q_values.setdefault(name, params.strip().removeprefix("q=").strip())
+
+    q = q_values.get(coding, q_values.get("*"))
+    if q is None:
+        return False
+
+    # e.g. "gzip;q=0" means not acceptable
+    try:
+        return q == "" or float(q) > 0
+    except ValueError:
+        return False
+
+
 def attachment_to_file(attachment: Attachment) -> BytesIO:
     bytes_ = base64.b64decode(attachment.raw)
 
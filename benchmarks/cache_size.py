@@ -0,0 +1,45 @@
+# Report the bytes stored per cached analysis (plain JSON vs the fields of the
+# cached hash) over the fixture corpus.
+#
+# usage: python -m benchmarks.cache_size [gzip level]
+
+import functools
+import glob
+import sys
+import timeit
+
+from backend import cache, factories, schemas, settings
+
+
+def load(fields: dict[str, bytes]) -> bytes:
+    return cache.CachedAnalysis("id", dict(fields)).serialized
+
+
+def main(level: int = settings.REDIS_COMPRESSION_LEVEL):
+    plain_total = encoded_total = 0
+    decode_time = 0.0
+    for path in sorted(glob.glob("tests/fixtures/emails/**/*.eml", recursive=True)):
+        with open(path, "rb") as f:
+            eml = factories.EmlFactory().call(f.read())
+
+        parts = cache.serialize_parts(schemas.Response(eml=eml, id=path))
+        fields = cache.to_fields(path, parts, level)
+        decode_time += timeit.timeit(functools.partial(load, fields), number=10) / 10
+
+        plain = len(cache.assemble(path, parts))
+        compressed = sum(len(field) for field in fields.values())
+        plain_total += plain
+        encoded_total += compressed
+        print(  # noqa: T201
+            f"{path}: {plain:,} -> {compressed:,} bytes ({compressed / plain:.1%})"
+        )
+
+    print(  # noqa: T201
+        f"all fixtures: {plain_total:,} -> {encoded_total:,} bytes "
+        f"({encoded_total / plain_total:.1%}), "
+        f"decode={decode_time * 1000:.2f} ms in total"
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
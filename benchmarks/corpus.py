@@ -0,0 +1,540 @@
+# Generate synthetic emails, .eml and .msg, along the axes which hurt in
+# production: large attachments, HTML bodies full of links, long Received
+# chains, many MIME parts, deep nesting and .msg files with embedded messages.
+#
+# The output only depends on the parameters (and the seed), so a size can be
+# regenerated at any time instead of being checked in. The .msg files are
+# written with a minimal compound file (CFB) writer, as read by
+# backend.outlookmsgfile.
+#
+# usage: python -m benchmarks.corpus OUTPUT_DIR [AXIS ...]
+
+import argparse
+import base64
+import datetime
+import os
+import random
+import struct
+import sys
+import typing
+from email.utils import format_datetime
+
+DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+MEGABYTE = 1024 * 1024
+
+
+def _received(hops: int, rng: random.Random) -> list[str]:
+    # the newest hop comes first, each one a few seconds after the previous
+    return [
+        f"Received: from mx{i}.example.com (mx{i}.example.com [10.0.{i // 256 % 256}.{i % 256}])\n"
+        f"\tby mx{i + 1}.example.com with ESMTPS id {rng.getrandbits(48):012x}\n"
+        f"\tfor <bar@example.com>; {format_datetime(DATE - datetime.timedelta(seconds=(hops - i) * 7))}"
+        for i in reversed(range(hops))
+    ]
+
+
+def _links(links: int) -> str:
+    return "".join(
+        f'<a href="https://host{i}.example.com/path/{i}?id={i}">link {i}</a><br>\n'
+        for i in range(links)
+    )
+
+
+def _base64(data: bytes) -> bytes:
+    return base64.encodebytes(data)
+
+
+def eml(
+    *,
+    attachment_size: int = 0,
+    links: int = 0,
+    hops: int = 0,
+    parts: int = 0,
+    depth: int = 0,
+    subject: str = "synthetic",
+    seed: int = 0,
+) -> bytes:
+    """Build an email with an attachment of attachment_size random bytes, an
+    HTML body with links anchors, hops Received headers, parts extra
+    attachments (text) and the whole content nested depth multiparts deep."""
+    rng = random.Random(seed)
+    headers = [
+        *_received(hops, rng),
+        "From: Foo <foo@example.com>",
+        "To: Bar <bar@example.com>",
+        f"Subject: {subject}",
+        f"Date: {format_datetime(DATE)}",
+        f"Message-ID: <{rng.getrandbits(64):016x}@example.com>",
+        "MIME-Version: 1.0",
+    ]
+
+    chunks: list[bytes] = []
+    for i in range(depth):
+        chunks.append(
+            f'Content-Type: multipart/mixed; boundary="nested{i}"\n\n--nested{i}\n'.encode()
+        )
+
+    chunks.append(b'Content-Type: multipart/mixed; boundary="mixed"\n\n')
+    chunks.append(
+        b"--mixed\nContent-Type: text/plain; charset=utf-8\n\n"
+        b"See https://example.com/plain for details.\n"
+    )
+    if links > 0:
+        chunks.append(
+            b"--mixed\nContent-Type: text/html; charset=utf-8\n\n"
+            + f"<html><body>\n{_links(links)}</body></html>\n".encode()
+        )
+
+    for i in range(parts):
+        chunks.append(
+            b"--mixed\nContent-Type: text/plain\n"
+            + f'Content-Disposition: attachment; filename="part{i}.txt"\n\n'.encode()
+            + f"part {i}\n".encode()
+        )
+
+    if attachment_size > 0:
+        chunks.append(
+            b"--mixed\nContent-Type: application/octet-stream\n"
+            b'Content-Disposition: attachment; filename="random.bin"\n'
+            b"Content-Transfer-Encoding: base64\n\n"
+            + _base64(rng.randbytes(attachment_size))
+        )
+
+    chunks.append(b"--mixed--\n")
+    for i in reversed(range(depth)):
+        chunks.append(f"--nested{i}--\n".encode())
+
+    return "\n".join(headers).encode() + b"\n" + b"".join(chunks)
+
+
+# compound file (CFB) writer, version 3: 512 byte sectors, 64 byte mini sectors
+
+Storage = dict[str, typing.Union[bytes, "Storage"]]
+
+SECTOR_SIZE = 512
+MINI_SECTOR_SIZE = 64
+MINI_STREAM_CUTOFF = 4096
+
+FREE_SECTOR = 0xFFFFFFFF
+END_OF_CHAIN = 0xFFFFFFFE
+FAT_SECTOR = 0xFFFFFFFD
+DIFAT_SECTOR = 0xFFFFFFFC
+NO_STREAM = 0xFFFFFFFF
+
+
+class _Entry:
+    def __init__(self, index: int, name: str, type: int, data: bytes = b""):
+        self.index = index
+        self.name = name
+        self.type = type
+        self.data = data
+        self.left = NO_STREAM
+        self.right = NO_STREAM
+        self.child = NO_STREAM
+        self.start = END_OF_CHAIN
+
+    def pack(self) -> bytes:
+        name = self.name.encode("utf-16-le") + b"\x00\x00"
+        return struct.pack(
+            "<64sHBBIII16sIQQIQ",
+            name,
+            len(name),
+            self.type,
+            1,  # black, the tree is not checked by readers
+            self.left,
+            self.right,
+            self.child,
+            b"\x00" * 16,
+            0,
+            0,
+            0,
+            self.start,
+            len(self.data),
+        )
+
+
+def _flatten(storage: Storage, parent: _Entry, entries: list[_Entry]):
+    children: list[_Entry] = []
+    for name, value in storage.items():
+        if isinstance(value, bytes):
+            entry = _Entry(len(entries), name, 2, value)
+            entries.append(entry)
+        else:
+            entry = _Entry(len(entries), name, 1)
+            entries.append(entry)
+            _flatten(value, entry, entries)
+
+        children.append(entry)
+
+    # siblings form a binary search tree, ordered by length then name
+    children.sort(key=lambda entry: (len(entry.name), entry.name.upper()))
+
+    def tree(items: list[_Entry]) -> int:
+        if len(items) == 0:
+            return NO_STREAM
+
+        middle = len(items) // 2
+        items[middle].left = tree(items[:middle])
+        items[middle].right = tree(items[middle + 1 :])
+        return items[middle].index
+
+    parent.child = tree(children)
+
+
+def _chain(fat: list[int], start: int, count: int):
+    for sector in range(start, start + count - 1):
+        fat[sector] = sector + 1
+
+    fat[start + count - 1] = END_OF_CHAIN
+
+
+def _sectors(size: int, sector_size: int = SECTOR_SIZE) -> int:
+    return -(-size // sector_size)
+
+
+def _pad(data: bytes, sector_size: int = SECTOR_SIZE) -> bytes:
+    return data + b"\x00" * (-len(data) % sector_size)
+
+
+def _mini_stream(entries: list[_Entry]) -> tuple[bytes, list[int], list[_Entry]]:
+    # small streams live in the mini stream, which is stored like a stream
+    mini_stream = bytearray()
+    mini_fat: list[int] = []
+    large: list[_Entry] = []
+    for entry in entries:
+        if entry.type != 2 or len(entry.data) == 0:
+            continue
+
+        if len(entry.data) >= MINI_STREAM_CUTOFF:
+            large.append(entry)
+            continue
+
+        entry.start = len(mini_fat)
+        count = _sectors(len(entry.data), MINI_SECTOR_SIZE)
+        mini_fat.extend([FREE_SECTOR] * count)
+        _chain(mini_fat, entry.start, count)
+        mini_stream += _pad(entry.data, MINI_SECTOR_SIZE)
+
+    return bytes(mini_stream), mini_fat, large
+
+
+def _fat_size(payload_sectors: int) -> tuple[int, int]:
+    # the FAT covers itself and the DIFAT, which lists the FAT sectors beyond
+    # the 109 listed in the header
+    fat_count, difat_count = 1, 0
+    while True:
+        total = difat_count + fat_count + payload_sectors
+        needed_fat = _sectors(total * 4)
+        needed_difat = _sectors(max(needed_fat - 109, 0) * 4, SECTOR_SIZE - 4)
+        if (needed_fat, needed_difat) == (fat_count, difat_count):
+            return fat_count, difat_count
+
+        fat_count, difat_count = needed_fat, needed_difat
+
+
+def _difat(fat_sectors: list[int], difat_sectors: list[int]) -> bytes:
+    difat = bytearray()
+    listed = fat_sectors[109:]
+    for index, _ in enumerate(difat_sectors):
+        ids = listed[index * 127 : (index + 1) * 127]
+        ids += [FREE_SECTOR] * (127 - len(ids))
+        following = (
+            difat_sectors[index + 1] if index + 1 < len(difat_sectors) else END_OF_CHAIN
+        )
+        difat += struct.pack("<128I", *ids, following)
+
+    return bytes(difat)
+
+
+def compound_file(storage: Storage) -> bytes:
+    root = _Entry(0, "Root Entry", 5)
+    entries = [root]
+    _flatten(storage, root, entries)
+
+    root.data, mini_fat, large = _mini_stream(entries[1:])
+    directory = _pad(b"".join(entry.pack() for entry in entries))
+    mini_fat_data = _pad(struct.pack(f"<{len(mini_fat)}I", *mini_fat))
+    streams = [root, *large]
+
+    fat_count, difat_count = _fat_size(
+        len(directory) // SECTOR_SIZE
+        + len(mini_fat_data) // SECTOR_SIZE
+        + sum(_sectors(len(entry.data)) for entry in streams)
+    )
+    fat = [FREE_SECTOR] * (fat_count * SECTOR_SIZE // 4)
+    difat_sectors = list(range(difat_count))
+    fat_sectors = list(range(difat_count, difat_count + fat_count))
+    for sector in difat_sectors:
+        fat[sector] = DIFAT_SECTOR
+    for sector in fat_sectors:
+        fat[sector] = FAT_SECTOR
+
+    next_sector = difat_count + fat_count
+    directory_start = next_sector
+    _chain(fat, directory_start, len(directory) // SECTOR_SIZE)
+    next_sector += len(directory) // SECTOR_SIZE
+
+    mini_fat_start = END_OF_CHAIN
+    if len(mini_fat) > 0:
+        mini_fat_start = next_sector
+        _chain(fat, mini_fat_start, len(mini_fat_data) // SECTOR_SIZE)
+        next_sector += len(mini_fat_data) // SECTOR_SIZE
+
+    for entry in streams:
+        count = _sectors(len(entry.data))
+        if count == 0:
+            continue
+
+        entry.start = next_sector
+        _chain(fat, next_sector, count)
+        next_sector += count
+
+    # the directory holds the start sectors, pack it again
+    directory = _pad(b"".join(entry.pack() for entry in entries))
+
+    header_fat = fat_sectors[:109] + [FREE_SECTOR] * (109 - min(fat_count, 109))
+    header = struct.pack(
+        "<8s16sHHHHH6sIIIIIIIII109I",
+        b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+        b"\x00" * 16,
+        0x3E,
+        3,
+        0xFFFE,
+        9,
+        6,
+        b"\x00" * 6,
+        0,
+        fat_count,
+        directory_start,
+        0,
+        MINI_STREAM_CUTOFF,
+        mini_fat_start,
+        len(mini_fat_data) // SECTOR_SIZE,
+        difat_sectors[0] if difat_count > 0 else END_OF_CHAIN,
+        difat_count,
+        *header_fat,
+    )
+
+    return b"".join(
+        [
+            _pad(header),
+            _difat(fat_sectors, difat_sectors),
+            struct.pack(f"<{len(fat)}I", *fat),
+            directory,
+            mini_fat_data,
+            *[_pad(entry.data) for entry in streams],
+        ]
+    )
+
+
+# MAPI properties of a .msg file
+
+PT_LONG = 0x0003
+PT_OBJECT = 0x000D
+PT_UNICODE = 0x001F
+PT_BINARY = 0x0102
+
+PR_SUBJECT = 0x0037
+PR_TRANSPORT_MESSAGE_HEADERS = 0x007D
+PR_BODY = 0x1000
+PR_ATTACH_DATA = 0x3701
+PR_ATTACH_METHOD = 0x3705
+PR_ATTACH_LONG_FILENAME = 0x3707
+PR_ATTACH_MIME_TAG = 0x370E
+
+ATTACH_BY_VALUE = 1
+ATTACH_EMBEDDED_MSG = 5
+
+
+def _properties(
+    header: bytes, properties: list[tuple[int, int, typing.Any]]
+) -> Storage:
+    storage: Storage = {}
+    stream = bytearray(header)
+    for tag, type, value in properties:
+        if type == PT_LONG:
+            stream += struct.pack("<HHIIi", type, tag, 0, value, 0)
+            continue
+
+        name = f"__substg1.0_{tag:04X}{type:04X}"
+        if type == PT_OBJECT:
+            storage[name] = value
+            stream += struct.pack("<HHIII", type, tag, 0, 0xFFFFFFFF, 0)
+            continue
+
+        data = value.encode("utf-16-le") if type == PT_UNICODE else value
+        storage[name] = data
+        stream += struct.pack("<HHIII", type, tag, 0, len(data), 0)
+
+    storage["__properties_version1.0"] = bytes(stream)
+    return storage
+
+
+def _message(
+    *,
+    top_level: bool,
+    attachment_size: int,
+    links: int,
+    hops: int,
+    attachments: int,
+    depth: int,
+    subject: str,
+    rng: random.Random,
+) -> Storage:
+    headers = "\r\n".join(
+        [
+            *[line.replace("\n", "\r\n") for line in _received(hops, rng)],
+            "From: Foo <foo@example.com>",
+            "To: Bar <bar@example.com>",
+            f"Subject: {subject}",
+            f"Date: {format_datetime(DATE)}",
+        ]
+    )
+    urls = "".join(f"https://host{i}.example.com/path/{i}\r\n" for i in range(links))
+
+    children: list[Storage] = []
+    for i in range(attachments):
+        children.append(
+            _properties(
+                b"\x00" * 8,
+                [
+                    (PR_ATTACH_METHOD, PT_LONG, ATTACH_BY_VALUE),
+                    (PR_ATTACH_LONG_FILENAME, PT_UNICODE, f"part{i}.txt"),
+                    (PR_ATTACH_MIME_TAG, PT_UNICODE, "text/plain"),
+                    (PR_ATTACH_DATA, PT_BINARY, f"part {i}\r\n".encode()),
+                ],
+            )
+        )
+
+    if attachment_size > 0:
+        children.append(
+            _properties(
+                b"\x00" * 8,
+                [
+                    (PR_ATTACH_METHOD, PT_LONG, ATTACH_BY_VALUE),
+                    (PR_ATTACH_LONG_FILENAME, PT_UNICODE, "random.bin"),
+                    (PR_ATTACH_MIME_TAG, PT_UNICODE, "application/octet-stream"),
+                    (PR_ATTACH_DATA, PT_BINARY, rng.randbytes(attachment_size)),
+                ],
+            )
+        )
+
+    if depth > 0:
+        embedded = _message(
+            top_level=False,
+            attachment_size=0,
+            links=0,
+            hops=0,
+            attachments=1,
+            depth=depth - 1,
+            subject=f"{subject} ({depth - 1})",
+            rng=rng,
+        )
+        children.append(
+            _properties(
+                b"\x00" * 8,
+                [
+                    (PR_ATTACH_METHOD, PT_LONG, ATTACH_EMBEDDED_MSG),
+                    (PR_ATTACH_LONG_FILENAME, PT_UNICODE, "embedded.msg"),
+                    (PR_ATTACH_DATA, PT_OBJECT, embedded),
+                ],
+            )
+        )
+
+    # next recipient id, next attachment id, recipient and attachment counts
+    counts = struct.pack("<IIII", 0, len(children), 0, len(children))
+    header = b"\x00" * 8 + counts + (b"\x00" * 8 if top_level else b"")
+    message = _properties(
+        header,
+        [
+            (PR_SUBJECT, PT_UNICODE, subject),
+            (PR_TRANSPORT_MESSAGE_HEADERS, PT_UNICODE, headers),
+            (PR_BODY, PT_UNICODE, f"See https://example.com/plain\r\n{urls}"),
+        ],
+    )
+    for i, child in enumerate(children):
+        message[f"__attach_version1.0_#{i:08X}"] = child
+
+    return message
+
+
+def msg(
+    *,
+    attachment_size: int = 0,
+    links: int = 0,
+    hops: int = 0,
+    attachments: int = 0,
+    depth: int = 0,
+    subject: str = "synthetic",
+    seed: int = 0,
+) -> bytes:
+    """Build an Outlook message with an attachment of attachment_size random
+    bytes, links URLs in its body, hops Received headers, attachments extra
+    attachments (text) and depth messages embedded in one another."""
+    return compound_file(
+        _message(
+            top_level=True,
+            attachment_size=attachment_size,
+            links=links,
+            hops=hops,
+            attachments=attachments,
+            depth=depth,
+            subject=subject,
+            rng=random.Random(seed),
+        )
+    )
+
+
+class Axis(typing.NamedTuple):
+    suffix: str
+    build: typing.Callable[[int], bytes]
+    sizes: list[int]
+
+
+# from sizes seen every day up to the ones seen in incidents
+AXES: dict[str, Axis] = {
+    "attachment_size": Axis(
+        ".eml",
+        lambda size: eml(attachment_size=size),
+        [MEGABYTE, 5 * MEGABYTE, 10 * MEGABYTE, 25 * MEGABYTE, 50 * MEGABYTE],
+    ),
+    "links": Axis(".eml", lambda size: eml(links=size), [100, 1000, 5000, 20000]),
+    "hops": Axis(".eml", lambda size: eml(hops=size), [5, 10, 20, 40]),
+    "parts": Axis(".eml", lambda size: eml(parts=size), [10, 50, 100, 500]),
+    # MIME_MAX_DEPTH is 50, the multipart holding the parts is one more level
+    "depth": Axis(".eml", lambda size: eml(depth=size), [5, 10, 25, 45]),
+    "msg_attachment_size": Axis(
+        ".msg",
+        lambda size: msg(attachment_size=size),
+        [MEGABYTE, 5 * MEGABYTE, 10 * MEGABYTE, 25 * MEGABYTE, 50 * MEGABYTE],
+    ),
+    "msg_attachments": Axis(
+        ".msg", lambda size: msg(attachments=size), [10, 50, 100, 500]
+    ),
+    "msg_depth": Axis(".msg", lambda size: msg(depth=size), [1, 2, 5, 10]),
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.corpus")
+    parser.add_argument("output", help="directory to write the files to")
+    parser.add_argument("axes", nargs="*", help=f"{', '.join(AXES)} (default: all)")
+    args = parser.parse_args(argv)
+    for name in args.axes:
+        if name not in AXES:
+            parser.error(f"unknown axis: {name}")
+
+    os.makedirs(args.output, exist_ok=True)
+    for name in args.axes or AXES:
+        axis = AXES[name]
+        for size in axis.sizes:
+            path = os.path.join(args.output, f"{name}-{size}{axis.suffix}")
+            with open(path, "wb") as f:
+                f.write(axis.build(size))
+
+            print(path)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,155 @@
+# Report what importing the API costs a fresh worker: the import time per
+# package (python -X importtime), the total and the RSS once imported, then
+# the time and RSS the preload step (backend.preload) adds on top of it.
+#
+# Every run is a new interpreter, so that nothing is imported already; the
+# median of the runs is reported.
+#
+# usage: python -m benchmarks.imports [-n RUNS] [--top N] [--module MODULE]
+#                                     [--no-preload] [--save PATH]
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import typing
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# the script run by every interpreter, it prints the RSS and the preload cost
+SCRIPT = """
+import resource, sys, time
+import {module}
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+print("{marker}", file=sys.stderr)
+if {preload}:
+    from backend import preload
+    from backend.main import app
+    start = time.perf_counter()
+    preload.warm_app(app, isolation=False)
+    print(time.perf_counter() - start)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+# separates the imports of the module from the ones of the preload
+MARKER = "-- preload --"
+
+# ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class Run(typing.NamedTuple):
+    # self time per top-level package, in seconds
+    packages: dict[str, float]
+    total: float
+    rss: int
+    preload: float | None
+    preload_rss: int | None
+
+
+def parse_importtime(stderr: str) -> dict[str, float]:
+    packages: dict[str, float] = {}
+    for line in stderr.partition(MARKER)[0].splitlines():
+        match = IMPORTTIME.match(line)
+        if match is None:
+            continue
+
+        package = match.group(4).split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(match.group(1)) / 1e6
+
+    return packages
+
+
+def run_once(module: str, preload: bool) -> Run:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            SCRIPT.format(module=module, preload=preload, marker=MARKER),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        # the parser stays in process, the preload warms it up as well
+        env={**os.environ, "PARSER_ISOLATION": "false"},
+    )
+    lines = result.stdout.split()
+    packages = parse_importtime(result.stderr)
+    return Run(
+        packages=packages,
+        total=sum(packages.values()),
+        rss=int(lines[0]) * RSS_UNIT,
+        preload=float(lines[1]) if preload else None,
+        preload_rss=int(lines[2]) * RSS_UNIT if preload else None,
+    )
+
+
+def median(values: list[typing.Any]) -> typing.Any:
+    return statistics.median(values) if len(values) > 0 else None
+
+
+def summarize(runs: list[Run]) -> dict[str, typing.Any]:
+    names = {name for run in runs for name in run.packages}
+    packages = {
+        name: median([run.packages.get(name, 0.0) for run in runs]) for name in names
+    }
+    return {
+        "total": median([run.total for run in runs]),
+        "rss": median([run.rss for run in runs]),
+        "preload": median([run.preload for run in runs if run.preload is not None]),
+        "preload_rss": median(
+            [run.preload_rss for run in runs if run.preload_rss is not None]
+        ),
+        "packages": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        ),
+    }
+
+
+def report(summary: dict[str, typing.Any], top: int):
+    megabyte = 1024 * 1024
+    print(f"{'package':<32}{'ms':>10}")  # noqa: T201
+    for name, seconds in list(summary["packages"].items())[:top]:
+        print(f"{name:<32}{seconds * 1000:>10.1f}")  # noqa: T201
+
+    print(  # noqa: T201
+        f"import: {summary['total'] * 1000:.0f} ms, "
+        f"RSS {summary['rss'] / megabyte:.0f} MB"
+    )
+    if summary["preload"] is not None:
+        print(  # noqa: T201
+            f"preload: {summary['preload'] * 1000:.0f} ms, "
+            f"RSS {summary['preload_rss'] / megabyte:.0f} MB"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.imports")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--module", default="backend.main", help="module to import")
+    parser.add_argument(
+        "--no-preload", action="store_true", help="only measure the import"
+    )
+    parser.add_argument("--save", help="write the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.module, not args.no_preload) for _ in range(args.runs)]
+    summary = summarize(runs)
+    report(summary, args.top)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
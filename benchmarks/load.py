@@ -0,0 +1,292 @@
+# Load test POST /api/analyze/file end to end, with every third party provider
+# replaced by a local stand-in (benchmarks.providers).
+#
+# The API is started with uvicorn (--workers), pointed at the fake providers
+# through settings, and driven with concurrent uploads. The report gives the
+# throughput, the latency percentiles, the status codes and the calls made to
+# each provider. Uploads are the fixture corpus by default; with --unique
+# every upload is a different email, so nothing is served from the cache.
+#
+# usage: python -m benchmarks.load [-n REQUESTS] [-c CONCURRENCY] [--workers N]
+#            [--latency SECONDS] [--error-rate RATIO] [--rate-limit RPS]
+#            [--provider NAME:KEY=VALUE,...] [--query QUERY] [--unique]
+#            [--save PATH] [--server-log PATH] [PATH ...]
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import httpx
+
+from . import providers, stages
+
+# magic number of the compound files (.msg)
+CFB_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+class Result(typing.NamedTuple):
+    status: int | None
+    latency: float
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(
+    env: dict[str, str],
+    workers: int,
+    port: int,
+    log: typing.IO[bytes],
+    ready_timeout: float = 60,
+) -> typing.Generator[str, None, None]:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "backend.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=log,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + ready_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"The API exited with {process.returncode}")
+
+            if time.monotonic() > deadline:
+                raise RuntimeError("The API did not get ready in time")
+
+            with contextlib.suppress(httpx.HTTPError):
+                if httpx.get(f"{url}/api/status/").status_code == 200:
+                    break
+
+            time.sleep(0.2)
+
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def uploads(paths: list[str], unique: bool) -> typing.Iterator[tuple[str, bytes]]:
+    files: list[tuple[str, bytes]] = []
+    for path in paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+
+    for index, (name, data) in enumerate(itertools.cycle(files)):
+        if unique and not data.startswith(CFB_SIGNATURE):
+            # a different sha256, hence a different analysis id
+            data = f"X-Load-Test: {index}\n".encode() + data
+
+        yield name, data
+
+
+async def drive(
+    url: str,
+    files: typing.Iterator[tuple[str, bytes]],
+    *,
+    requests: int,
+    concurrency: int,
+    query: str,
+    request_timeout: float,
+) -> list[Result]:
+    results: list[Result] = []
+    pending = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=url, limits=limits, timeout=request_timeout
+    ) as client:
+
+        async def work():
+            for _ in pending:
+                name, data = next(files)
+                start = time.perf_counter()
+                try:
+                    r = await client.post(
+                        f"/api/analyze/file?{query}", files={"file": (name, data)}
+                    )
+                    status = r.status_code
+                except httpx.HTTPError:
+                    status = None
+
+                results.append(Result(status, time.perf_counter() - start))
+
+        await asyncio.gather(*[work() for _ in range(concurrency)])
+
+    return results
+
+
+def summarize(
+    results: list[Result], duration: float, counters: dict[str, dict[str, int]]
+) -> dict[str, typing.Any]:
+    latencies = sorted(result.latency for result in results)
+    # 99 cut points: the percentiles 1 to 99
+    cuts = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    statuses: dict[str, int] = {}
+    for result in results:
+        key = str(result.status) if result.status is not None else "error"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    return {
+        "requests": len(results),
+        "duration": duration,
+        "throughput": len(results) / duration,
+        "statuses": dict(sorted(statuses.items())),
+        "latency": {
+            "p50": cuts[49],
+            "p90": cuts[89],
+            "p99": cuts[98],
+            "max": latencies[-1],
+        },
+        "providers": counters,
+    }
+
+
+def report(summary: dict[str, typing.Any]):
+    latency = summary["latency"]
+    statuses = ", ".join(
+        f"{key}: {count}" for key, count in summary["statuses"].items()
+    )
+    print(  # noqa: T201
+        f"{summary['requests']} requests in {summary['duration']:.2f} s, "
+        f"{summary['throughput']:.2f} req/s ({statuses})"
+    )
+    print(  # noqa: T201
+        f"latency (ms): p50 {latency['p50'] * 1000:.0f}, "
+        f"p90 {latency['p90'] * 1000:.0f}, p99 {latency['p99'] * 1000:.0f}, "
+        f"max {latency['max'] * 1000:.0f}"
+    )
+    print(f"{'provider':<16}{'calls':>8}{'errors':>8}{'throttled':>10}")  # noqa: T201
+    for name, counters in summary["providers"].items():
+        print(  # noqa: T201
+            f"{name:<16}{counters['calls']:>8}{counters['errors']:>8}"
+            f"{counters['throttled']:>10}"
+        )
+
+
+def parse_behaviors(
+    default: providers.Behavior, overrides: list[str]
+) -> dict[str, providers.Behavior]:
+    # e.g. virustotal:latency=0.5,rate_limit=4
+    behaviors = dict.fromkeys(providers.PROVIDERS, default)
+    for override in overrides:
+        name, _, values = override.partition(":")
+        if name not in behaviors:
+            raise ValueError(f"unknown provider: {name}")
+
+        changes: dict[str, float] = {}
+        for value in values.split(","):
+            key, _, number = value.partition("=")
+            if key not in providers.Behavior._fields:
+                raise ValueError(f"unknown setting: {key}")
+
+            changes[key] = float(number)
+
+        behaviors[name] = behaviors[name]._replace(**changes)
+
+    return behaviors
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--latency", type=float, default=0.1, help="in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="requests per second (0: none)"
+    )
+    parser.add_argument(
+        "--provider",
+        action="append",
+        default=[],
+        help="per provider settings, e.g. virustotal:latency=0.5,rate_limit=4",
+    )
+    parser.add_argument(
+        "--query", default="", help="analysis options, e.g. providers=oleid"
+    )
+    parser.add_argument(
+        "--unique", action="store_true", help="make every upload a new email"
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="per request")
+    parser.add_argument("--save", help="write the summary to this JSON file")
+    parser.add_argument(
+        "--server-log", default=os.devnull, help="write the API output to this file"
+    )
+    parser.add_argument("paths", nargs="*", help="files to upload (default: fixtures)")
+    args = parser.parse_args(argv)
+
+    try:
+        behaviors = parse_behaviors(
+            providers.Behavior(
+                latency=args.latency,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+                rate_limit=args.rate_limit,
+            ),
+            args.provider,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    files = uploads(args.paths or stages.corpus(), args.unique)
+    with (
+        open(args.server_log, "wb") as log,
+        providers.FakeProviders(behaviors) as fakes,
+        serve(fakes.env(), args.workers, free_port(), log) as url,
+    ):
+        start = time.perf_counter()
+        results = asyncio.run(
+            drive(
+                url,
+                files,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                query=args.query,
+                request_timeout=args.timeout,
+            )
+        )
+        summary = summarize(results, time.perf_counter() - start, fakes.counters())
+
+    report(summary)
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
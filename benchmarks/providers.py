@@ -0,0 +1,337 @@
+# Local stand-ins for the third party providers, to load test the API without
+# hitting (or paying for) the real ones: VirusTotal, InQuest, urlscan.io,
+# EmailRep and OpenAI over HTTP, SpamAssassin over the spamd protocol.
+#
+# Every provider answers with a benign result after a latency, fails a share
+# of the requests and throttles the requests above a rate (429 with
+# Retry-After, as the real APIs do). Calls are counted per provider.
+
+import asyncio
+import collections
+import random
+import socket
+import threading
+import time
+import typing
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+HTTP_PROVIDERS = ["virustotal", "inquest", "urlscan", "emailrep", "openai"]
+PROVIDERS = [*HTTP_PROVIDERS, "spamassassin"]
+
+
+class Behavior(typing.NamedTuple):
+    # seconds, each response takes latency +/- jitter
+    latency: float = 0.1
+    jitter: float = 0.0
+    # share of the requests failing with a 500
+    error_rate: float = 0.0
+    # requests per second above which requests are throttled, 0: no limit
+    rate_limit: float = 0.0
+
+
+class Counters:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def to_dict(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+        }
+
+
+class FakeProvider:
+    def __init__(self, name: str, behavior: Behavior, rng: random.Random):
+        self.name = name
+        self.behavior = behavior
+        self.rng = rng
+        self.counters = Counters()
+        # start times of the requests of the last second
+        self._window: collections.deque[float] = collections.deque()
+
+    def _throttle(self) -> bool:
+        if self.behavior.rate_limit <= 0:
+            return False
+
+        now = time.monotonic()
+        while len(self._window) > 0 and self._window[0] <= now - 1:
+            self._window.popleft()
+
+        if len(self._window) >= self.behavior.rate_limit:
+            return True
+
+        self._window.append(now)
+        return False
+
+    async def admit(self) -> int | None:
+        """Wait for the latency, return the status code of a failure if the
+        request fails."""
+        self.counters.calls += 1
+        if self._throttle():
+            self.counters.throttled += 1
+            return 429
+
+        latency, jitter = self.behavior.latency, self.behavior.jitter
+        await asyncio.sleep(max(latency + self.rng.uniform(-jitter, jitter), 0))
+        if self.rng.random() < self.behavior.error_rate:
+            self.counters.errors += 1
+            return 500
+
+        return None
+
+
+def virustotal(request: Request) -> dict[str, typing.Any]:
+    sha256 = request.path_params["sha256"]
+    return {
+        "data": {
+            "type": "file",
+            "id": sha256,
+            "attributes": {
+                "sha256": sha256,
+                "last_analysis_stats": {"malicious": 0, "harmless": 0},
+            },
+        }
+    }
+
+
+def inquest(request: Request) -> dict[str, typing.Any]:
+    return {
+        "data": {
+            "sha256": request.query_params.get("sha256", ""),
+            "classification": "UNKNOWN",
+            "inquest_alerts": [],
+        }
+    }
+
+
+def urlscan(request: Request) -> dict[str, typing.Any]:
+    return {"results": []}
+
+
+def emailrep(request: Request) -> dict[str, typing.Any]:
+    return {
+        "email": request.path_params["email"],
+        "reputation": "none",
+        "suspicious": False,
+        "references": 0,
+        "details": {},
+    }
+
+
+def openai(request: Request) -> dict[str, typing.Any]:
+    # the smallest Responses API object the client reads output_text from
+    return {
+        "id": "resp_fake",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "gpt-4o-mini",
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_fake",
+                "role": "assistant",
+                "status": "completed",
+                "content": [
+                    {"type": "output_text", "text": "Looks safe.", "annotations": []}
+                ],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+def endpoint(
+    provider: FakeProvider,
+    build: typing.Callable[[Request], dict[str, typing.Any]],
+) -> typing.Callable[[Request], typing.Awaitable[Response]]:
+    async def handle(request: Request) -> Response:
+        await request.body()
+        failure = await provider.admit()
+        if failure == 429:
+            return JSONResponse(
+                {"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"}
+            )
+
+        if failure is not None:
+            return JSONResponse({"error": "fake failure"}, status_code=failure)
+
+        return JSONResponse(build(request))
+
+    return handle
+
+
+def create_app(providers: dict[str, FakeProvider]) -> Starlette:
+    # each provider under its own prefix, which is its base URL
+    return Starlette(
+        routes=[
+            Mount(
+                "/virustotal",
+                routes=[
+                    Route(
+                        "/api/v3/files/{sha256}",
+                        endpoint(providers["virustotal"], virustotal),
+                    )
+                ],
+            ),
+            Mount(
+                "/inquest",
+                routes=[
+                    Route("/api/dfi/details", endpoint(providers["inquest"], inquest))
+                ],
+            ),
+            Mount(
+                "/urlscan",
+                routes=[
+                    Route("/api/v1/search/", endpoint(providers["urlscan"], urlscan))
+                ],
+            ),
+            Mount(
+                "/emailrep",
+                routes=[Route("/{email}", endpoint(providers["emailrep"], emailrep))],
+            ),
+            Mount(
+                "/openai",
+                routes=[
+                    Route(
+                        "/v1/responses",
+                        endpoint(providers["openai"], openai),
+                        methods=["POST"],
+                    )
+                ],
+            ),
+        ]
+    )
+
+
+SPAMD_REPORT = """Spam detection software has NOT identified this incoming email as spam.
+
+Content analysis details:   (0.1 points, 5.0 required)
+
+ pts rule name              description
+---- ---------------------- --------------------------------------------------
+ 0.1 MISSING_MID            Missing Message-Id: header
+"""
+
+
+async def spamd(
+    provider: FakeProvider, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+):
+    try:
+        request = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in request.decode().split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+
+        await reader.readexactly(length)
+        # spamd has no throttling, a busy one fails (EX_TEMPFAIL)
+        if await provider.admit() is not None:
+            writer.write(b"SPAMD/1.5 75 EX_TEMPFAIL\r\n\r\n")
+        else:
+            body = SPAMD_REPORT.encode()
+            writer.write(
+                b"SPAMD/1.5 0 EX_OK\r\n"
+                + f"Content-length: {len(body)}\r\n".encode()
+                + b"Spam: False ; 0.1 / 5.0\r\n\r\n"
+                + body
+            )
+
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+class FakeProviders:
+    """Serve the fake providers from a thread, until stopped."""
+
+    def __init__(
+        self,
+        behaviors: dict[str, Behavior] | None = None,
+        host: str = "127.0.0.1",
+        seed: int = 0,
+    ):
+        behaviors = behaviors or {}
+        rng = random.Random(seed)
+        self.providers = {
+            name: FakeProvider(name, behaviors.get(name, Behavior()), rng)
+            for name in PROVIDERS
+        }
+        self.host = host
+
+        self._http = socket.create_server((host, 0))
+        self._spamd = socket.create_server((host, 0))
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                create_app(self.providers), log_level="warning", access_log=False
+            )
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._http.getsockname()[1]}"
+
+    def env(self) -> dict[str, str]:
+        """The settings pointing the API to the fake providers."""
+        return {
+            "VIRUSTOTAL_API_KEY": "fake",
+            "VIRUSTOTAL_URL": f"{self.url}/virustotal",
+            "INQUEST_API_KEY": "fake",
+            "INQUEST_URL": f"{self.url}/inquest",
+            "URLSCAN_API_KEY": "fake",
+            "URLSCAN_URL": f"{self.url}/urlscan",
+            "EMAIL_REP_API_KEY": "fake",
+            "EMAIL_REP_URL": f"{self.url}/emailrep",
+            # read by the OpenAI client itself
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": f"{self.url}/openai/v1",
+            "SPAMASSASSIN_HOST": self.host,
+            "SPAMASSASSIN_PORT": str(self._spamd.getsockname()[1]),
+        }
+
+    def counters(self) -> dict[str, dict[str, int]]:
+        return {
+            name: provider.counters.to_dict()
+            for name, provider in self.providers.items()
+        }
+
+    async def _serve(self):
+        spamd_server = await asyncio.start_server(
+            lambda reader, writer: spamd(
+                self.providers["spamassassin"], reader, writer
+            ),
+            sock=self._spamd,
+        )
+        async with spamd_server:
+            await self._server.serve(sockets=[self._http])
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join()
+
+    def __enter__(self) -> "FakeProviders":
+        self.start()
+        return self
+
+    def __exit__(self, *args: typing.Any):
+        self.stop()
@@ -0,0 +1,98 @@
+# Time and memory of EmlFactory and of the verdict pipeline against the size of
+# synthetic emails (benchmarks.corpus), one axis at a time, as CSV to plot the
+# scaling curves from.
+#
+# The pipeline runs the OleID verdict only, the other providers are remote.
+# Memory is measured in this process, the parser must not run in a
+# subprocess: run with PARSER_ISOLATION=false.
+#
+# usage: PARSER_ISOLATION=false python -m benchmarks.scaling [-n ITERATIONS]
+#            [--sizes SIZE,...] [--output PATH] [AXIS ...]
+
+import argparse
+import asyncio
+import csv
+import sys
+import typing
+
+from returns.result import safe
+
+from backend import clients, schemas, settings
+from backend.factories.response import ResponseFactory
+
+from . import corpus, stages
+
+FIELDS = ["axis", "size", "bytes", "stage", "seconds", "peak"]
+
+
+@safe
+def pipeline(data: bytes) -> schemas.Response:
+    return asyncio.run(
+        ResponseFactory.call(
+            data,
+            spam_assassin=clients.SpamAssassin(),
+            optional_email_rep=None,
+            options=schemas.AnalysisOptions(providers=["oleid"]),
+        )
+    )
+
+
+def run(axes: list[str], sizes: list[int] | None, number: int, output: typing.TextIO):
+    writer = csv.DictWriter(output, fieldnames=FIELDS)
+    writer.writeheader()
+    for name in axes:
+        axis = corpus.AXES[name]
+        for size in sizes or axis.sizes:
+            data = axis.build(size)
+            for stage, call in [("eml", stages.total), ("pipeline", pipeline)]:
+                measurement = stages.measure(call, data, number)
+                writer.writerow(
+                    {
+                        "axis": name,
+                        "size": size,
+                        "bytes": len(data),
+                        "stage": stage,
+                        "seconds": f"{measurement['time']:.6f}",
+                        "peak": measurement["peak"],
+                    }
+                )
+                output.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scaling")
+    parser.add_argument("-n", "--number", type=int, default=3, help="runs per size")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        help="sizes to run instead of the ones of the axes (e.g. 100,1000)",
+    )
+    parser.add_argument("--output", help="write the CSV to this file (default: stdout)")
+    parser.add_argument(
+        "axes", nargs="*", help=f"{', '.join(corpus.AXES)} (default: all)"
+    )
+    args = parser.parse_args(argv)
+    for name in args.axes:
+        if name not in corpus.AXES:
+            parser.error(f"unknown axis: {name}")
+
+    if settings.PARSER_ISOLATION:
+        print("run with PARSER_ISOLATION=false", file=sys.stderr)  # noqa: T201
+        return 2
+
+    # the first run warms up caches (libmagic, dateparser, ...)
+    stages.measure(pipeline, corpus.eml(), 1)
+
+    axes = args.axes or list(corpus.AXES)
+    if args.output is None:
+        run(axes, args.sizes, args.number, sys.stdout)
+        return 0
+
+    with open(args.output, "w", newline="") as f:
+        run(axes, args.sizes, args.number, f)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
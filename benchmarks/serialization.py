@@ -0,0 +1,59 @@
+# Compare serializing an analysis the old way (FastAPI response model for the
+# HTTP body + model_dump_json for the cache) with the single pass used now.
+#
+# usage: python -m benchmarks.serialization [attachment size in MB]
+
+import functools
+import sys
+import timeit
+import typing
+from email.message import EmailMessage
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend import cache, factories, schemas
+
+
+def build_response(size: int) -> schemas.Response:
+    message = EmailMessage()
+    message["From"] = "foo@example.com"
+    message["To"] = "bar@example.com"
+    message["Subject"] = "benchmark"
+    message.set_content("http://example.com\n" * 1000)
+    message.add_attachment(
+        b"\x00" * size,
+        maintype="application",
+        subtype="octet-stream",
+        filename="foo.bin",
+    )
+    eml = factories.EmlFactory().call(message.as_bytes())
+    return schemas.Response(eml=eml, id="benchmark")
+
+
+def twice(response: schemas.Response):
+    JSONResponse(jsonable_encoder(response)).body  # noqa: B018
+    response.model_dump_json()
+
+
+def once(response: schemas.Response):
+    cache.serialize(response)
+
+
+def main(size_mb: float = 10.0, number: int = 10):
+    response = build_response(int(size_mb * 1024 * 1024))
+    size = len(cache.serialize(response))
+
+    print(f"serialized size: {size / 1024 / 1024:.1f} MB")  # noqa: T201
+    funcs: list[typing.Callable[[schemas.Response], None]] = [twice, once]
+    for func in funcs:
+        elapsed = timeit.timeit(functools.partial(func, response), number=number)
+        elapsed /= number
+        print(f"{func.__name__}: {elapsed * 1000:.1f} ms")  # noqa: T201
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(size_mb=float(sys.argv[1]))
+    else:
+        main()
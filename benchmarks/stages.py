@@ -0,0 +1,320 @@
+# Time every stage of EmlFactory.call, and the whole of it, over the fixture
+# corpus (tests/fixtures/emails/**/*.eml and the .msg fixtures), and measure
+# how much memory each stage allocates.
+#
+# A run can be saved as a JSON baseline and compared with one. The comparison
+# fails (exit code 1) when a stage got slower, or peaks higher, than in the
+# baseline by more than the threshold. Timings depend on the machine: compare
+# runs made on the same one.
+#
+# With --msg, the .msg files (by default the fixtures and synthetic ones with
+# a large attachment, see corpus) are parsed both ways instead: converted to
+# an email, serialized and parsed again (to_eml + parse), and with the binary
+# attachments detached from the conversion (parse_msg).
+#
+# usage: python -m benchmarks.stages [-n ITERATIONS] [--save PATH]
+#                                    [--baseline PATH] [--threshold RATIO]
+#                                    [--msg]
+
+import argparse
+import copy
+import glob
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import typing
+
+from returns.result import ResultE, safe
+
+from backend.factories.eml import (
+    EmlFactory,
+    check_structure,
+    normalize_attachments,
+    normalize_bodies,
+    normalize_header,
+    parse,
+    parse_msg,
+    to_eml,
+    to_parsed,
+    transform,
+)
+
+from . import corpus as synthetic
+
+# in the order of EmlFactory.call, each one gets the output of the previous one
+STAGES: dict[str, typing.Callable[[typing.Any], ResultE[typing.Any]]] = {
+    "check_structure": check_structure,
+    "to_parsed": to_parsed,
+    "normalize_attachments": normalize_attachments,
+    "normalize_bodies": normalize_bodies,
+    "normalize_header": normalize_header,
+    "transform": transform,
+}
+TOTAL = "total"
+
+# in MB, the attachments of the synthetic .msg files of --msg
+MSG_ATTACHMENT_SIZES = (1, 5)
+
+# differences below these are noise, whatever the ratio
+MIN_TIME_DELTA = 0.001
+MIN_MEMORY_DELTA = 64 * 1024
+
+
+class Measurement(typing.TypedDict):
+    time: float
+    peak: int
+    allocated: int
+
+
+def corpus() -> list[str]:
+    return sorted(
+        glob.glob("tests/fixtures/emails/**/*.eml", recursive=True)
+        + glob.glob("tests/fixtures/*.msg")
+    )
+
+
+@safe
+def total(data: bytes) -> typing.Any:
+    # end to end, in the shape of a stage
+    return EmlFactory().call(data)
+
+
+@safe
+def reparsed(data: bytes) -> typing.Any:
+    # what parse_msg replaced, attachments go through base64 and back
+    return to_eml(data).bind(parse).unwrap()
+
+
+# .msg parsing, the way it was and the way it is
+MSG_PATHS: dict[str, typing.Callable[[typing.Any], ResultE[typing.Any]]] = {
+    "serialized": reparsed,
+    "detached": parse_msg,
+}
+
+
+def inputs(data: bytes) -> dict[str, typing.Any]:
+    # the input of each stage, produced by running the ones before it
+    stage_inputs: dict[str, typing.Any] = {TOTAL: data}
+    value: typing.Any = data
+    for name, stage in STAGES.items():
+        stage_inputs[name] = copy.deepcopy(value)
+        value = stage(value).unwrap()
+
+    return stage_inputs
+
+
+def measure(
+    stage: typing.Callable[[typing.Any], ResultE[typing.Any]],
+    value: typing.Any,
+    number: int,
+) -> Measurement:
+    # the normalize stages modify their input, each run gets a fresh copy
+    copies = [copy.deepcopy(value) for _ in range(number + 1)]
+
+    times: list[float] = []
+    for _ in range(number):
+        arg = copies.pop()
+        start = time.perf_counter()
+        stage(arg).unwrap()
+        times.append(time.perf_counter() - start)
+
+    # tracing slows everything down, so memory is measured in a separate run
+    arg = copies.pop()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = stage(arg).unwrap()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del result
+    return {
+        "time": statistics.median(times),
+        "peak": peak - before,
+        "allocated": after - before,
+    }
+
+
+def run(paths: list[str], number: int) -> dict[str, typing.Any]:
+    files: dict[str, dict[str, Measurement]] = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        stage_inputs = inputs(data)
+        stages = {**STAGES, TOTAL: total}
+        files[path] = {
+            name: measure(stage, stage_inputs[name], number)
+            for name, stage in stages.items()
+        }
+
+    # per stage: the time over the whole corpus, the memory of the worst file
+    summary: dict[str, Measurement] = {
+        name: {
+            "time": sum(measurements[name]["time"] for measurements in files.values()),
+            "peak": max(measurements[name]["peak"] for measurements in files.values()),
+            "allocated": max(
+                measurements[name]["allocated"] for measurements in files.values()
+            ),
+        }
+        for name in [*STAGES, TOTAL]
+    }
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": number,
+        "stages": summary,
+        "files": files,
+    }
+
+
+def msg_corpus(paths: list[str]) -> dict[str, bytes]:
+    files: dict[str, bytes] = {}
+    for path in paths or sorted(glob.glob("tests/fixtures/*.msg")):
+        with open(path, "rb") as f:
+            files[path] = f.read()
+
+    if len(paths) == 0:
+        # the fixtures only have small attachments
+        for size in MSG_ATTACHMENT_SIZES:
+            files[f"synthetic-{size}MB.msg"] = synthetic.msg(
+                attachment_size=size * synthetic.MEGABYTE
+            )
+
+    return files
+
+
+def compare_msg(files: dict[str, bytes], number: int) -> dict[str, typing.Any]:
+    measured: dict[str, dict[str, Measurement]] = {
+        path: {name: measure(func, data, number) for name, func in MSG_PATHS.items()}
+        for path, data in files.items()
+    }
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": number,
+        "files": measured,
+    }
+
+
+def report_msg(result: dict[str, typing.Any]):
+    print(  # noqa: T201
+        f"{'file':<32}{'path':<12}{'time (ms)':>12}{'peak (KB)':>12}"
+        f"{'time':>8}{'peak':>8}"
+    )
+    for path, measurements in result["files"].items():
+        before = measurements["serialized"]
+        for name, measurement in measurements.items():
+            ratios = ""
+            if name == "detached":
+                ratios = (
+                    f"{measurement['time'] / before['time']:>8.0%}"
+                    f"{measurement['peak'] / before['peak']:>8.0%}"
+                )
+
+            print(  # noqa: T201
+                f"{path[-31:]:<32}{name:<12}{measurement['time'] * 1000:>12.2f}"
+                f"{measurement['peak'] / 1024:>12.0f}{ratios}"
+            )
+
+
+def regressions(
+    result: dict[str, typing.Any], baseline: dict[str, typing.Any], threshold: float
+) -> list[str]:
+    found: list[str] = []
+    for name, measurement in result["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+
+        for key, min_delta in [("time", MIN_TIME_DELTA), ("peak", MIN_MEMORY_DELTA)]:
+            delta = measurement[key] - base[key]
+            if delta > min_delta and delta > base[key] * threshold:
+                found.append(f"{name}: {key} {base[key]:.6g} -> {measurement[key]:.6g}")
+
+    return found
+
+
+def report(result: dict[str, typing.Any], baseline: dict[str, typing.Any] | None):
+    stages: dict[str, Measurement] = result["stages"]
+    print(  # noqa: T201
+        f"{len(result['files'])} files, median of {result['iterations']} runs"
+    )
+    print(  # noqa: T201
+        f"{'stage':<24}{'time (ms)':>12}{'share':>8}{'peak (KB)':>12}"
+        f"{'alloc (KB)':>12}{'vs baseline':>14}"
+    )
+    for name, measurement in stages.items():
+        share = measurement["time"] / stages[TOTAL]["time"]
+        change = ""
+        if baseline is not None and name in baseline["stages"]:
+            base = baseline["stages"][name]["time"]
+            change = f"{(measurement['time'] - base) / base:+.1%}" if base > 0 else ""
+
+        print(  # noqa: T201
+            f"{name:<24}{measurement['time'] * 1000:>12.2f}{share:>8.1%}"
+            f"{measurement['peak'] / 1024:>12.0f}"
+            f"{measurement['allocated'] / 1024:>12.0f}{change:>14}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stages")
+    parser.add_argument("-n", "--number", type=int, default=5, help="runs per file")
+    parser.add_argument("--save", help="write the result to this JSON file")
+    parser.add_argument("--baseline", help="compare with this JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed regression (0.2: 20%% slower or higher peak memory)",
+    )
+    parser.add_argument(
+        "--msg", action="store_true", help="compare the two ways of parsing .msg"
+    )
+    parser.add_argument("paths", nargs="*", help="files to run (default: fixtures)")
+    args = parser.parse_args(argv)
+
+    if args.msg:
+        files = msg_corpus(args.paths)
+        compare_msg(dict(list(files.items())[:1]), 1)
+        result = compare_msg(files, args.number)
+        report_msg(result)
+        if args.save is not None:
+            with open(args.save, "w") as f:
+                json.dump(result, f, indent=2)
+
+        return 0
+
+    baseline: dict[str, typing.Any] | None = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # the first run of a stage warms up caches (libmagic, dateparser, ...)
+    paths = args.paths or corpus()
+    run(paths[:1], 1)
+    result = run(paths, args.number)
+    report(result, baseline)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if baseline is None:
+        return 0
+
+    found = regressions(result, baseline, args.threshold)
+    for regression in found:
+        print(f"regression: {regression}")  # noqa: T201
+
+    return 1 if len(found) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# Measure the transform step (model_validate over the normalized parser
+# output) against the whole EmlFactory pipeline, per fixture.
+#
+# usage: python -m benchmarks.transform [number of iterations]
+
+import copy
+import glob
+import sys
+import timeit
+
+from returns.pipeline import flow
+from returns.pointfree import bind
+
+from backend.factories.eml import (
+    EmlFactory,
+    check_structure,
+    normalize_attachments,
+    normalize_bodies,
+    normalize_header,
+    to_parsed,
+    transform,
+)
+
+
+def normalize(data: bytes) -> dict:
+    return flow(
+        check_structure(data),
+        bind(to_parsed),
+        bind(normalize_attachments),
+        bind(normalize_bodies),
+        bind(normalize_header),
+    ).unwrap()
+
+
+def measure(data: bytes, number: int) -> tuple[float, float]:
+    parsed = normalize(data)
+    # validation may mutate its input, give each run a fresh copy
+    copies = [copy.deepcopy(parsed) for _ in range(number)]
+    transform_time = timeit.timeit(lambda: transform(copies.pop()), number=number)
+    total_time = timeit.timeit(lambda: EmlFactory().call(data), number=number)
+    return transform_time / number, total_time / number
+
+
+def main(number: int = 10):
+    results: list[tuple[str, float, float]] = []
+    for path in sorted(glob.glob("tests/fixtures/emails/**/*.eml", recursive=True)):
+        with open(path, "rb") as f:
+            results.append((path, *measure(f.read(), number)))
+
+    results.sort(key=lambda result: result[1], reverse=True)
+    for path, transform_time, total_time in results[:10]:
+        print(  # noqa: T201
+            f"{path}: transform={transform_time * 1000:.2f} ms "
+            f"({transform_time / total_time:.1%} of {total_time * 1000:.2f} ms)"
+        )
+
+    transform_time = sum(result[1] for result in results)
+    total_time = sum(result[2] for result in results)
+    print(  # noqa: T201
+        f"all fixtures: transform={transform_time * 1000:.2f} ms "
+        f"({transform_time / total_time:.1%} of {total_time * 1000:.2f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -1,6 +1,13 @@
 import axios from 'axios'
 
-import { ResponseSchema, type ResponseType, StatusSchema, type StatusType } from '@/schemas'
+import {
+  CachePageSchema,
+  type CachePageType,
+  ResponseSchema,
+  type ResponseType,
+  StatusSchema,
+  type StatusType
+} from '@/schemas'
 
 const client = axios.create()
 
@@ -19,9 +26,9 @@ export const API = {
     const res = await client.get(`/api/lookup/${id}`)
     return ResponseSchema.parse(res.data)
   },
-  async getCacheKeys(): Promise<string[]> {
-    const res = await client.get<string[]>(`/api/cache/`)
-    return res.data
+  async getCacheSummaries(cursor?: string): Promise<CachePageType> {
+    const res = await client.get(`/api/cache/`, { params: { cursor } })
+    return CachePageSchema.parse(res.data)
   },
   async getStatus(): Promise<StatusType> {
     const res = await client.get(`/api/status/`)
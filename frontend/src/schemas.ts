@@ -127,6 +127,24 @@ export const ResponseSchema = z.object({
 
 export type ResponseType = z.infer<typeof ResponseSchema>
 
+export const CacheSummarySchema = z.object({
+  id: z.string(),
+  subject: z.string(),
+  from: z.string().nullish(),
+  date: z.string().nullish(),
+  analyzedAt: z.string(),
+  verdicts: z.array(z.object({ name: z.string(), malicious: z.boolean() }))
+})
+
+export type CacheSummaryType = z.infer<typeof CacheSummarySchema>
+
+export const CachePageSchema = z.object({
+  items: z.array(CacheSummarySchema),
+  nextCursor: z.string().nullish()
+})
+
+export type CachePageType = z.infer<typeof CachePageSchema>
+
 export const SubmissionResultSchema = z.object({
   referenceUrl: z.string(),
   status: z.string().nullish()
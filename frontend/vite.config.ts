@@ -1,15 +1,54 @@
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { join } from 'node:path'
 import { fileURLToPath, URL } from 'node:url'
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
 
 import tailwindcss from '@tailwindcss/vite'
 import vue from '@vitejs/plugin-vue'
-import { defineConfig, loadEnv } from 'vite'
+import { defineConfig, loadEnv, type Plugin } from 'vite'
 import vueDevTools from 'vite-plugin-vue-devtools'
 
+// write .br and .gz siblings of the bundle, the backend serves them as they are
+const precompress = (): Plugin => {
+  const extensions = /\.(js|mjs|css|html|svg|json|txt|map|wasm)$/
+  const minSize = 1024
+
+  const walk = (dir: string): string[] =>
+    readdirSync(dir).flatMap((name) => {
+      const path = join(dir, name)
+      return statSync(path).isDirectory() ? walk(path) : [path]
+    })
+
+  let outDir = 'dist'
+  return {
+    name: 'precompress',
+    apply: 'build',
+    configResolved(config) {
+      outDir = config.build.outDir
+    },
+    closeBundle() {
+      for (const path of walk(outDir)) {
+        if (!extensions.test(path) || statSync(path).size < minSize) {
+          continue
+        }
+        const data = readFileSync(path)
+        writeFileSync(`${path}.gz`, gzipSync(data, { level: 9 }))
+        writeFileSync(
+          `${path}.br`,
+          brotliCompressSync(data, {
+            params: { [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY }
+          })
+        )
+      }
+    }
+  }
+}
+
 export default defineConfig(({ mode }) => {
   const env = loadEnv(mode, process.cwd())
   const target = env.VITE_BACKEND_URL || 'http://localhost:8000'
   return {
-    plugins: [tailwindcss(), vue(), vueDevTools()],
+    plugins: [tailwindcss(), vue(), vueDevTools(), precompress()],
     server: {
       proxy: {
         '/api/': target
@@ -20,6 +20,7 @@ use_errorlog = errorlog_var or None
 graceful_timeout_str = os.getenv("GRACEFUL_TIMEOUT", "120")
 timeout_str = os.getenv("TIMEOUT", "120")
 keepalive_str = os.getenv("KEEP_ALIVE", "5")
+preload_app_str = os.getenv("PRELOAD_APP", "true")
 
 cores = multiprocessing.cpu_count()
 workers_per_core = float(workers_per_core_str)
@@ -41,3 +42,36 @@ accesslog = use_accesslog
 graceful_timeout = int(graceful_timeout_str)
 timeout = int(timeout_str)
 keepalive = int(keepalive_str)
+preload_app = preload_app_str.lower() in ("1", "true", "yes")
+
+# the metrics write to it as soon as they are created, the preloaded app
+# creates them before any server hook runs
+prometheus_multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if prometheus_multiproc_dir:
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # the samples of the workers of a previous run would be aggregated forever
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(".db"):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    # warm the preloaded app up and freeze it in the master, right before the
+    # workers are forked: they share its pages copy-on-write
+    if server.cfg.preload_app:
+        from backend import preload
+
+        preload.preload(server.app.wsgi())
+
+
+def child_exit(server, worker):
+    # drop the live gauges of a dead worker (Prometheus multiprocess mode)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
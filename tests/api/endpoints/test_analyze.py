@@ -1,5 +1,11 @@
+import types
+import typing
+
+import openai
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 
 
 def test_analyze(client: TestClient, sample_eml: bytes):
@@ -37,3 +43,57 @@ def test_analyze_plaintext_body(client: TestClient, sample_eml: bytes):
     response = client.post("/api/analyze/body", json=payload)
     json = response.json()
     assert "Lorem ipsum dolor sit amet" in json.get("body", "")
+
+
+def test_analyze_headers(client: TestClient, sample_eml: bytes):
+    payload = {"file": sample_eml.decode()}
+    response = client.post("/api/analyze/headers", json=payload)
+    json = response.json()
+    assert json.get("subject") == "Winter promotions"
+    assert json.get("from") == "no-reply@example.com"
+
+
+def test_analyze_with_options(client: TestClient, encrypted_docx_eml: bytes):
+    payload = {"file": encrypted_docx_eml.decode()}
+    params = {"providers": ["oleid"], "extract_iocs": False, "include_raw": False}
+    response = client.post("/api/analyze/", json=payload, params=params)
+
+    json = response.json()
+    assert [verdict.get("name") for verdict in json.get("verdicts", [])] == ["oleid"]
+    assert json["eml"]["attachments"][0]["raw"] == ""
+    assert all(body["content"] == "" for body in json["eml"]["bodies"])
+
+
+def test_analyze_with_invalid_provider(client: TestClient, sample_eml: bytes):
+    payload = {"file": sample_eml.decode()}
+    response = client.post("/api/analyze/", json=payload, params={"providers": "foo"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_analyze_with_openai(
+    client: TestClient, sample_eml: bytes, monkeypatch: pytest.MonkeyPatch
+):
+    class Responses:
+        async def create(self, **kwargs: typing.Any):
+            return types.SimpleNamespace(output_text="safe")
+
+    class AsyncOpenAI:
+        def __init__(self, api_key: str):
+            self.responses = Responses()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "foo")
+    monkeypatch.setattr(openai, "AsyncOpenAI", AsyncOpenAI)
+    labels = {"pool": "openai", "lane": "bulk"}
+    before = REGISTRY.get_sample_value("eml_analyzer_pool_wait_seconds_count", labels)
+
+    payload = {"file": sample_eml.decode()}
+    response = client.post(
+        "/api/analyze/",
+        json=payload,
+        params={"providers": ["openai"]},
+        headers={"X-Priority": "bulk"},
+    )
+    assert all(body["aiText"] == "safe" for body in response.json()["eml"]["bodies"])
+    # the call waits in the lane of the analysis
+    after = REGISTRY.get_sample_value("eml_analyzer_pool_wait_seconds_count", labels)
+    assert (after or 0) - (before or 0) == 1
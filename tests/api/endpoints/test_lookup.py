@@ -0,0 +1,122 @@
+import json
+
+import fakeredis
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from backend import (
+    cache,
+    dependencies,
+    factories,
+    local_cache,
+    projection,
+    schemas,
+    stores,
+)
+from backend.api.endpoints.lookup import (
+    _entity_tags,
+    _matching_tag,
+    _stream_bulk,
+)
+
+
+def test_stream_bulk(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    fields = cache.to_fields("foo", cache.serialize_parts(response))
+    got = [None, cache.CachedAnalysis("foo", dict(fields))]
+
+    streamed = json.loads(b"".join(_stream_bulk(["bar", "foo"], got)))
+    assert streamed == [
+        {"id": "bar", "analysis": None},
+        {"id": "foo", "analysis": json.loads(cache.serialize(response))},
+    ]
+
+    streamed = json.loads(
+        b"".join(_stream_bulk(["foo"], got[1:], projection.PROFILES["verdicts"]))
+    )
+    assert streamed == [{"id": "foo", "analysis": {"verdicts": [], "id": "foo"}}]
+
+
+def test_bulk_lookup_with_invalid_payload(client: TestClient):
+    response = client.post("/api/lookup/bulk", json={"ids": []})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_lookup_with_invalid_fields(client: TestClient):
+    response = client.get("/api/lookup/foo", params={"fields": "eml.foo"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture
+def store(client: TestClient, sample_eml: bytes) -> stores.RedisStore:
+    store = stores.RedisStore(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+    store.cache_response(
+        schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    )
+    client.app.dependency_overrides[dependencies.get_optional_store] = lambda: store  # type: ignore
+    # not served from what another test left in the local cache
+    local_cache.local_cache.clear()
+    return store
+
+
+def test_lookup_with_fields_id(client: TestClient, store: stores.RedisStore):
+    # no part of the entry is needed, it is found all the same
+    response = client.get("/api/lookup/foo", params={"fields": "id"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"id": "foo"}
+
+    response = client.get("/api/lookup/bar", params={"fields": "id"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_lookup_with_gzip(client: TestClient, store: stores.RedisStore):
+    response = client.get("/api/lookup/foo", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    # the stored body is passed through
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    (cached,) = store.fetch(["foo"])
+    assert cached is not None
+    assert response.content == cached.serialized
+    assert response.headers["ETag"] == f'"{cached.etag}-gzip"'
+
+    response = client.get("/api/lookup/foo", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "Content-Encoding" not in response.headers
+    assert response.content == cached.serialized
+    assert response.headers["ETag"] == f'W/"{cached.etag}"'
+
+
+def test_lookup_not_modified(client: TestClient, store: stores.RedisStore):
+    etag = store.fetch_etag("foo")
+    for accept_encoding, tag in [
+        ("gzip", f'"{etag}-gzip"'),
+        ("identity", f'W/"{etag}"'),
+    ]:
+        response = client.get(
+            "/api/lookup/foo",
+            headers={"Accept-Encoding": accept_encoding, "If-None-Match": tag},
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == tag
+        assert response.content == b""
+
+    # a projection is another representation
+    response = client.get(
+        "/api/lookup/foo",
+        params={"profile": "verdicts"},
+        headers={"If-None-Match": f'"{etag}-gzip"'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"].startswith(f'W/"{etag}-')
+
+
+def test_matching_tag():
+    tags = _entity_tags("foo", None)
+    assert tags == ['W/"foo"', '"foo-gzip"']
+    assert _matching_tag('"bar", W/"foo-gzip"', tags) == '"foo-gzip"'
+    assert _matching_tag('W/"foo"', tags) == 'W/"foo"'
+    assert _matching_tag('"bar"', tags) is None
+    # a projection is a different representation
+    assert _matching_tag('"foo"', _entity_tags("foo", {"id": True})) is None
@@ -1,7 +1,17 @@
 import pytest
+from returns.pipeline import flow
+from returns.pointfree import bind
 
 from backend import factories
-from backend.factories.eml import is_inline_forward_attachment
+from backend.factories.eml import (
+    is_inline_forward_attachment,
+    normalize_attachments,
+    normalize_bodies,
+    normalize_header,
+    parse,
+    to_eml,
+    transform,
+)
 
 
 @pytest.fixture()
@@ -55,6 +65,21 @@ def test_encrypted_docx(encrypted_docx_eml: bytes, factory: factories.EmlFactory
     )
 
 
+def test_encrypted_docx_without_iocs_and_data(
+    encrypted_docx_eml: bytes, factory: factories.EmlFactory
+):
+    eml = factory.call(
+        encrypted_docx_eml, extract_iocs=False, include_attachment_data=False
+    )
+    # hashes are still there for lookups
+    assert (
+        eml.attachments[0].hash.sha256
+        == "28df2d6dfa10dc85c8ebb5defffcb15c196dca7b26d4fd6859b9ec75ac60cf9e"
+    )
+    assert eml.attachments[0].raw == ""
+    assert all(body.urls == [] and body.domains == [] for body in eml.bodies)
+
+
 def test_emails(emails: list[bytes], factory: factories.EmlFactory):
     for email in emails:
         eml = factory.call(email)
@@ -66,6 +91,42 @@ def test_complete_msg(complete_msg: bytes, factory: factories.EmlFactory):
     assert eml.header.subject == "Test Multiple attachments complete email!!"
 
 
+@pytest.mark.parametrize("fixture", ["outer_msg", "other_msg"])
+def test_msg_matches_serialized_eml(
+    fixture: str, request: pytest.FixtureRequest, factory: factories.EmlFactory
+):
+    msg: bytes = request.getfixturevalue(fixture)
+    expected = flow(
+        to_eml(msg),
+        bind(parse),
+        bind(normalize_attachments),
+        bind(normalize_bodies),
+        bind(normalize_header),
+        bind(transform),
+    ).unwrap()
+    eml = factory.call(msg)
+
+    # MIME boundaries are randomly generated on each serialization
+    assert eml.header.model_dump(exclude={"header"}) == expected.header.model_dump(
+        exclude={"header"}
+    )
+    assert eml.bodies == expected.bodies
+    assert len(eml.attachments) == len(expected.attachments)
+    for got, want in zip(eml.attachments, expected.attachments, strict=True):
+        assert got.filename == want.filename
+        if want.mime_type_short != "message/rfc822":
+            assert got == want
+
+
+def test_header_factory(emails: list[bytes], factory: factories.EmlFactory):
+    header_factory = factories.HeaderFactory()
+    for email in emails:
+        header = header_factory.call(email)
+        assert header.model_dump(exclude={"defect"}) == factory.call(
+            email
+        ).header.model_dump(exclude={"defect"})
+
+
 @pytest.mark.parametrize(
     "attachment,expected",
     [
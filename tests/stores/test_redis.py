@@ -0,0 +1,137 @@
+import time
+
+import fakeredis
+import pytest
+from redis import Redis
+
+from backend import cache, factories, schemas, settings, stores
+
+
+@pytest.fixture
+def redis() -> Redis:
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+@pytest.fixture
+def store(redis: Redis) -> stores.RedisStore:
+    return stores.RedisStore(redis, expire=3600)
+
+
+@pytest.fixture
+def response(sample_eml: bytes) -> schemas.Response:
+    return schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+
+
+def test_list_summaries(store: stores.RedisStore, response: schemas.Response):
+    for id in ("foo", "bar", "baz"):
+        store.cache_response(response.model_copy(update={"id": id}))
+
+    page = store.list_summaries(limit=2)
+    assert [item.id for item in page.items] == ["baz", "bar"]
+    assert page.next_cursor is not None
+
+    page = store.list_summaries(cursor=cache.parse_cursor(page.next_cursor), limit=2)
+    assert [item.id for item in page.items] == ["foo"]
+    assert page.next_cursor is None
+
+
+def test_list_summaries_with_tied_scores(
+    store: stores.RedisStore,
+    response: schemas.Response,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    ids = [f"id{index:02}" for index in range(7)]
+    for id in ids:
+        store.cache_response(response.model_copy(update={"id": id}))
+
+    served: list[str] = []
+    cursor: cache.Cursor | None = None
+    while True:
+        page = store.list_summaries(cursor=cursor, limit=2)
+        served.extend(item.id for item in page.items)
+        if page.next_cursor is None:
+            break
+
+        cursor = cache.parse_cursor(page.next_cursor)
+
+    assert served == sorted(ids, reverse=True)
+
+
+def test_trim_index(
+    redis: Redis, response: schemas.Response, monkeypatch: pytest.MonkeyPatch
+):
+    cache.cache_response(redis, response, expire=3600)
+
+    later = time.time() + 3601
+    monkeypatch.setattr(time, "time", lambda: later)
+    cache.trim_index(redis, expire=3600)
+    assert redis.zcard(cache.index_key()) == 0
+    assert redis.hlen(cache.summaries_key()) == 0
+
+
+def test_backfill_index(
+    redis: Redis, store: stores.RedisStore, response: schemas.Response
+):
+    # entries cached as a JSON string, before the hash layout and the index
+    redis.set(f"{settings.REDIS_KEY_PREFIX}:foo", response.model_dump_json(), ex=3000)
+    redis.set(f"{settings.REDIS_KEY_PREFIX}:bar", b"not an analysis")
+    # corrupt and truncated gzip are skipped
+    encoded = cache.encode(response.model_dump_json().encode(), 6)
+    redis.set(f"{settings.REDIS_KEY_PREFIX}:baz", cache.FORMAT_GZIP + b"corrupt")
+    redis.set(f"{settings.REDIS_KEY_PREFIX}:qux", encoded[:-8])
+    redis.set(f"{settings.REDIS_KEY_PREFIX}:quux", encoded[:12] + b"\x00" * 32)
+    # a miss until rewritten
+    assert store.fetch(["foo"]) == [None]
+    assert store.fetch_etag("foo") is None
+
+    cache.backfill_index(redis, expire=3600)
+
+    (cached,) = store.fetch(["foo"], with_ttl=True)
+    assert cached is not None
+    assert cached.serialized == cache.serialize(response)
+    assert cached.ttl is not None and 2990 < cached.ttl <= 3000
+
+    score: float | None = redis.zscore(cache.index_key(), "foo")  # type: ignore
+    assert score is not None
+    # analyzed when the entry had its full TTL left
+    assert time.time() - 600 - 5 < score <= time.time() - 600
+    page = cache.list_summaries(redis)
+    assert [item.id for item in page.items] == ["foo"]
+
+
+def test_search(redis: Redis, store: stores.RedisStore, response: schemas.Response):
+    store.cache_response(response)
+    store.cache_response(response.model_copy(update={"id": "bar"}))
+    assert response.eml.header.from_ is not None
+
+    sender = ("from", response.eml.header.from_.upper())
+    assert [summary.id for summary in store.search([sender])] == ["bar", "foo"]
+    assert [summary.id for summary in store.search([sender], limit=1)] == ["bar"]
+
+    attachment = ("sha256", sorted(response.sha256s)[0])
+    assert [summary.id for summary in store.search([sender, attachment])] == [
+        "bar",
+        "foo",
+    ]
+    assert store.search([sender, ("domain", "example.invalid")]) == []
+    # the intersections do not outlive the searches
+    assert redis.keys(f"{settings.REDIS_KEY_PREFIX}-search:*") == []
+
+
+def test_indicators_expire(
+    redis: Redis,
+    store: stores.RedisStore,
+    response: schemas.Response,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    store.cache_response(response)
+
+    later = time.time() + 3601
+    monkeypatch.setattr(time, "time", lambda: later)
+    store.cache_response(response.model_copy(update={"id": "bar"}))
+
+    assert response.eml.header.from_ is not None
+    key = cache.indicator_key("from", response.eml.header.from_)
+    assert redis.zrange(key, 0, -1) == [b"bar"]
@@ -0,0 +1,103 @@
+import pathlib
+import time
+
+import pytest
+
+from backend import cache, factories, projection, schemas, stores
+
+
+@pytest.fixture
+def store(tmp_path: pathlib.Path) -> stores.SQLiteStore:
+    return stores.SQLiteStore(str(tmp_path / "cache.db"), expire=3600)
+
+
+@pytest.fixture
+def response(sample_eml: bytes) -> schemas.Response:
+    return schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+
+
+def test_fetch(store: stores.SQLiteStore, response: schemas.Response):
+    store.cache_response(response)
+
+    (cached, missing) = store.fetch(["foo", "bar"], with_ttl=True)
+    assert missing is None
+    assert cached is not None
+    assert cached.serialized == cache.serialize(response)
+    assert cached.ttl is not None and 3590 < cached.ttl <= 3600
+    assert store.fetch_etag("foo") == cached.etag
+    assert store.fetch_etag("bar") is None
+
+    # the body is not read for a projection on the small parts
+    (cached,) = store.fetch(["foo"], projection.PROFILES["verdicts"])
+    assert cached is not None
+    assert "response" not in cached.fields
+    assert cached.to_json(projection.PROFILES["verdicts"]) == cache.assemble(
+        "foo", cache.serialize_parts(response), projection.PROFILES["verdicts"]
+    )
+
+    (cached,) = store.fetch(["foo"], {"id": True})
+    assert cached is not None
+    assert "response" not in cached.fields
+    assert cached.to_json({"id": True}) == b'{"id":"foo"}'
+
+
+def test_list_summaries(store: stores.SQLiteStore, response: schemas.Response):
+    for id in ("foo", "bar", "baz"):
+        store.cache_response(response.model_copy(update={"id": id}))
+
+    page = store.list_summaries(limit=2)
+    assert [item.id for item in page.items] == ["baz", "bar"]
+    assert page.next_cursor is not None
+
+    page = store.list_summaries(cursor=cache.parse_cursor(page.next_cursor), limit=2)
+    assert [item.id for item in page.items] == ["foo"]
+    assert page.next_cursor is None
+
+
+def test_list_summaries_with_tied_scores(
+    store: stores.SQLiteStore,
+    response: schemas.Response,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    for id in ("foo", "bar", "baz"):
+        store.cache_response(response.model_copy(update={"id": id}))
+
+    page = store.list_summaries(limit=2)
+    assert [item.id for item in page.items] == ["foo", "baz"]
+    assert page.next_cursor is not None
+
+    page = store.list_summaries(cursor=cache.parse_cursor(page.next_cursor), limit=2)
+    assert [item.id for item in page.items] == ["bar"]
+
+
+def test_search(store: stores.SQLiteStore, response: schemas.Response):
+    store.cache_response(response)
+    assert response.eml.header.from_ is not None
+
+    sender = ("from", response.eml.header.from_.upper())
+    assert [summary.id for summary in store.search([sender])] == ["foo"]
+    assert store.search([sender, ("domain", "example.invalid")]) == []
+
+
+def test_expire(
+    store: stores.SQLiteStore,
+    response: schemas.Response,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    store.cache_response(response)
+
+    later = time.time() + 3601
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.fetch(["foo"]) == [None]
+    assert store.list_summaries().items == []
+
+    # expired rows are deleted on the next write
+    store.cache_response(response.model_copy(update={"id": "bar"}))
+    (count,) = store.connection.execute("SELECT COUNT(*) FROM analyses").fetchone()
+    assert count == 1
+    (count,) = store.connection.execute(
+        "SELECT COUNT(*) FROM indicators WHERE id = 'foo'"
+    ).fetchone()
+    assert count == 0
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from backend import admission
+
+
+async def test_admit():
+    gate = admission.Admission(limit=1, queue_size=1, queue_timeout=1)
+    order: list[str] = []
+
+    async def analyze(name: str, event: asyncio.Event):
+        async with gate.admit():
+            order.append(name)
+            await event.wait()
+
+    first, second = asyncio.Event(), asyncio.Event()
+    running = asyncio.create_task(analyze("first", first))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(analyze("second", second))
+    await asyncio.sleep(0)
+    assert gate.running == 1 and gate.waiting == 1
+
+    # the queue is full
+    with pytest.raises(admission.RejectedError) as e:
+        async with gate.admit():
+            pass
+
+    assert e.value.status_code == 429 and e.value.retry_after >= 1
+
+    # the slot is handed over to the queued analysis
+    first.set()
+    await running
+    await asyncio.sleep(0)
+    assert order == ["first", "second"]
+    assert gate.running == 1 and gate.waiting == 0
+
+    second.set()
+    await queued
+    assert gate.running == 0
+
+
+async def test_admit_timeout():
+    gate = admission.Admission(limit=1, queue_size=1, queue_timeout=0.05)
+    event = asyncio.Event()
+
+    async def analyze():
+        async with gate.admit():
+            await event.wait()
+
+    running = asyncio.create_task(analyze())
+    await asyncio.sleep(0)
+    with pytest.raises(admission.RejectedError) as e:
+        async with gate.admit():
+            pass
+
+    assert e.value.status_code == 503
+    assert gate.waiting == 0
+
+    event.set()
+    await running
+    assert gate.running == 0
+
+
+async def test_admit_unlimited():
+    gate = admission.Admission(limit=0, queue_size=0)
+    async with gate.admit(), gate.admit():
+        assert gate.running == 0
+
+
+def test_middleware():
+    gate = admission.Admission(limit=1, queue_size=0)
+
+    async def ok(_):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/api/analyze/", ok), Route("/api/status/", ok)])
+    app.add_middleware(admission.AdmissionMiddleware, admission=gate)
+    client = TestClient(app)
+
+    assert client.get("/api/analyze/").status_code == 200
+
+    # the only slot is taken, the analysis is rejected but the status is served
+    gate.running = 1
+    response = client.get("/api/analyze/")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many analyses queued"}
+    assert int(response.headers["Retry-After"]) >= 1
+
+    assert client.get("/api/status/").status_code == 200
+
+
+async def test_admit_lanes():
+    gate = admission.Admission(limit=1, queue_size=1, queue_timeout=1, bulk_share=0)
+    order: list[str] = []
+    event = asyncio.Event()
+
+    async def analyze(lane: admission.lanes.Lane):
+        async with gate.admit(lane):
+            order.append(lane)
+            await event.wait()
+
+    running = asyncio.create_task(analyze("bulk"))
+    await asyncio.sleep(0)
+    queued = [asyncio.create_task(analyze(lane)) for lane in ("bulk", "interactive")]
+    await asyncio.sleep(0)
+
+    # every lane has its own queue
+    assert gate.waiting == 2
+
+    event.set()
+    await asyncio.gather(running, *queued)
+    assert order == ["bulk", "interactive", "bulk"]
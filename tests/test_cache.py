@@ -0,0 +1,110 @@
+import gzip
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from backend import cache, factories, projection, schemas
+
+
+def test_serialize(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    serialized = cache.serialize(response)
+    assert json.loads(serialized) == jsonable_encoder(response)
+    assert cache.decode(serialized) is serialized
+
+
+def test_serialize_parts(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    parts = cache.serialize_parts(response)
+    assert set(parts.keys()) == set(cache.PARTS)
+    assert cache.assemble("foo", parts) == cache.response_adapter.dump_json(
+        response, by_alias=True
+    )
+
+    # only the parts a projection touches are needed
+    assert cache.needed_parts(projection.PROFILES["verdicts"]) == ("verdicts",)
+    assert cache.needed_parts(projection.PROFILES["summary"]) == (
+        "header",
+        "verdicts",
+    )
+
+
+def test_cached_analysis(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    parts = cache.serialize_parts(response)
+    fields = cache.to_fields("foo", parts, 6)
+    assert set(fields.keys()) == {"response", "header", "verdicts", "etag"}
+    assert fields["response"].startswith(cache.FORMAT_GZIP)
+
+    cached = cache.CachedAnalysis("foo", dict(fields))
+    assert cached.serialized == cache.serialize(response)
+    assert gzip.decompress(cached.gzipped or b"") == cached.serialized
+    assert cached.etag == cache.to_fields("foo", parts, 1)["etag"].decode()
+    for name in cache.PARTS:
+        assert json.loads(cached.part(name)) == json.loads(parts[name])
+
+    # the summary is made of the small parts alone, the body is not read
+    names = cache.field_names(projection.PROFILES["summary"])
+    assert names == ["etag", "header", "verdicts"]
+    cached = cache.CachedAnalysis("foo", {name: fields[name] for name in names})
+    assert cached.to_json(projection.PROFILES["summary"]) == cache.assemble(
+        "foo", parts, projection.PROFILES["summary"]
+    )
+
+    # attachments and bodies are cut out of the body
+    assert cache.field_names({"eml": {"bodies": True}}) == ["response", "etag"]
+    cached = cache.CachedAnalysis("foo", {"response": fields["response"]})
+    assert json.loads(cached.part("bodies")) == json.loads(parts["bodies"])
+
+
+def test_encode(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    serialized = cache.serialize(response)
+
+    encoded = cache.encode(serialized, 6)
+    assert encoded.startswith(cache.FORMAT_GZIP)
+    assert len(encoded) < len(serialized)
+    assert cache.decode(encoded) == serialized
+
+    # level 0 keeps plain JSON
+    assert cache.encode(serialized, 0) is serialized
+    assert cache.decode(serialized) == serialized
+
+
+def test_decode_with_unknown_format():
+    with pytest.raises(ValueError):
+        cache.decode(b"\xff")
+
+
+def test_summarize(sample_eml: bytes):
+    eml = factories.EmlFactory().call(sample_eml)
+    response = schemas.Response(
+        eml=eml,
+        id="foo",
+        verdicts=[schemas.Verdict(name="bar", malicious=True)],
+    )
+    summary = cache.summarize(response, 0)
+    assert summary.id == "foo"
+    assert summary.subject == eml.header.subject
+    assert summary.from_ == eml.header.from_
+    assert summary.analyzed_at.timestamp() == 0
+    assert summary.verdicts == [schemas.CacheVerdict(name="bar", malicious=True)]
+
+    # the index keys never match the pattern of cached entries
+    assert not cache.index_key("analysis").startswith("analysis:")
+    assert not cache.summaries_key("analysis").startswith("analysis:")
+
+
+def test_indicator_keys(sample_eml: bytes):
+    eml = factories.EmlFactory().call(sample_eml)
+    response = schemas.Response(eml=eml, id="foo")
+    keys = cache.indicator_keys(response, "analysis")
+    for sha256 in response.sha256s:
+        assert f"analysis-ioc:sha256:{sha256}" in keys
+
+    assert f"analysis-ioc:from:{eml.header.from_}" in keys
+    assert cache.indicator_key("sha256", "ABC") == cache.indicator_key("sha256", "abc")
+    assert cache.indicator_key("url", "http://A/") != cache.indicator_key(
+        "url", "http://a/"
+    )
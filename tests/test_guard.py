@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import forkserver
+from multiprocessing.context import ForkServerContext
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from backend import factories, guard
+from benchmarks import corpus
+
+
+def spin():
+    while True:
+        pass
+
+
+def allocate():
+    return bytearray(1024 * 1024 * 1024)
+
+
+def sleep():
+    time.sleep(60)
+
+
+async def test_run(sample_eml: bytes):
+    eml = await guard.run(factories.EmlFactory().call, sample_eml, isolation=True)
+    assert eml.header.subject == "Winter promotions"
+
+
+async def test_run_with_exception():
+    with pytest.raises(ValueError):
+        await guard.run(int, "foo", isolation=True)
+
+
+@pytest.mark.timeout(10)
+async def test_cpu_time_limit():
+    with pytest.raises(guard.LimitExceededError, match="CPU time"):
+        await guard.run(spin, isolation=True, cpu_time=1)
+
+
+@pytest.mark.timeout(10)
+async def test_memory_limit():
+    with pytest.raises(guard.LimitExceededError, match="Memory"):
+        await guard.run(allocate, isolation=True, memory=512)
+
+
+@pytest.mark.timeout(10)
+async def test_timeout():
+    with pytest.raises(guard.LimitExceededError, match="Time"):
+        await guard.run(sleep, isolation=True, time_limit=1)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        read(
+            "tests/fixtures/emails/mime_emails/raw_email_encoded_stack_level_too_deep.eml"
+        ),
+        read("tests/fixtures/emails/mime_emails/email_with_similar_boundaries.eml"),
+    ],
+)
+async def test_pathological_fixtures(data: bytes):
+    started = time.perf_counter()
+    await guard.run(factories.EmlFactory().call, data, isolation=True)
+    assert time.perf_counter() - started < 10
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        corpus.eml(depth=200, subject="nested"),
+        corpus.eml(parts=5000),
+        corpus.msg(depth=30),
+        corpus.msg(attachments=1200),
+    ],
+    # the default ids (the emails themselves) overflow PYTEST_CURRENT_TEST,
+    # which the forkserver inherits
+    ids=["eml-depth", "eml-parts", "msg-depth", "msg-parts"],
+)
+async def test_mime_limits(data: bytes):
+    started = time.perf_counter()
+    with pytest.raises(guard.LimitExceededError, match="MIME"):
+        await guard.run(factories.EmlFactory().call, data, isolation=True)
+    assert time.perf_counter() - started < 10
+
+
+def test_analyze_with_mime_limit(client: TestClient):
+    payload = {"file": corpus.eml(depth=200, subject="nested").decode()}
+    response = client.post("/api/analyze/", json=payload)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    detail = response.json()["detail"]
+    assert "MIME depth" in detail["message"]
+    assert detail["header"]["subject"] == "nested"
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        corpus.eml(attachment_size=5 * corpus.MEGABYTE, hops=40, parts=500, depth=45),
+        corpus.msg(attachment_size=5 * corpus.MEGABYTE, attachments=100, depth=5),
+    ],
+    ids=["eml", "msg"],
+)
+async def test_synthetic_within_limits(data: bytes):
+    started = time.perf_counter()
+    eml = await guard.run(factories.EmlFactory().call, data, isolation=True)
+    assert time.perf_counter() - started < 10
+
+    filenames = [attachment.filename for attachment in eml.attachments]
+    assert "random.bin" in filenames
+    assert "part99.txt" in filenames
+
+
+async def test_start(monkeypatch: pytest.MonkeyPatch):
+    forked: list[multiprocessing.process.BaseProcess] = []
+    process = guard._context.Process
+
+    def fork(*args, **kwargs):
+        forked.append(process(*args, **kwargs))
+        return forked[-1]
+
+    monkeypatch.setattr(guard._context, "Process", fork)
+
+    # nothing is started without isolation
+    await guard.start(isolation=False)
+    assert forked == []
+
+    await guard.start(isolation=True)
+    assert len(forked) == 1
+    if isinstance(guard._context, ForkServerContext):
+        # the forkserver outlives the worker, to fork the next ones
+        pid = forkserver._forkserver._forkserver_pid  # type: ignore
+        assert pid is not None
+        os.kill(pid, 0)  # raises unless running
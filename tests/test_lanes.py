@@ -0,0 +1,101 @@
+import asyncio
+
+from backend import lanes
+
+
+def test_from_headers():
+    assert lanes.from_headers([(b"x-priority", b"Bulk")]) == "bulk"
+    assert lanes.from_headers([(b"x-priority", b"interactive")]) == "interactive"
+    assert lanes.from_headers([(b"x-priority", b"foo")]) == "interactive"
+    assert lanes.from_headers([]) == "interactive"
+
+
+def test_assign():
+    assert lanes.current() == "interactive"
+    with lanes.assign("bulk"):
+        assert lanes.current() == "bulk"
+
+    assert lanes.current() == "interactive"
+
+
+async def test_waiters():
+    waiters = lanes.Waiters(bulk_share=0.25)
+    loop = asyncio.get_running_loop()
+    interactive = [loop.create_future() for _ in range(6)]
+    bulk = [loop.create_future() for _ in range(2)]
+    for waiter in bulk:
+        waiters.append("bulk", waiter)
+
+    for waiter in interactive:
+        waiters.append("interactive", waiter)
+
+    order: list[str] = []
+    while waiters.wake():
+        woken = sum(waiter.done() for waiter in interactive)
+        order.append("interactive" if woken > order.count("interactive") else "bulk")
+
+    # interactive first, bulk gets one slot out of four while both wait
+    assert order == [
+        "interactive",
+        "interactive",
+        "interactive",
+        "bulk",
+        "interactive",
+        "interactive",
+        "interactive",
+        "bulk",
+    ]
+
+
+async def test_pool():
+    pool = lanes.Pool("test", limit=1, bulk_share=0)
+    order: list[str] = []
+    event = asyncio.Event()
+
+    async def hold():
+        async with pool.acquire("interactive"):
+            await event.wait()
+
+    async def run(lane: lanes.Lane):
+        with lanes.assign(lane):
+            async with pool.acquire():
+                order.append(lane)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(run(lane)) for lane in ("bulk", "interactive")]
+    await asyncio.sleep(0)
+    assert pool.running == 1 and len(pool.waiters) == 2
+
+    # the interactive analysis goes first even though it came last
+    event.set()
+    await asyncio.gather(holder, *tasks)
+    assert order == ["interactive", "bulk"]
+    assert pool.running == 0
+
+
+async def test_pool_cancel():
+    pool = lanes.Pool("test", limit=1)
+    event = asyncio.Event()
+
+    async def hold():
+        async with pool.acquire():
+            await event.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    assert len(pool.waiters) == 0
+
+    event.set()
+    await holder
+    assert pool.running == 0
+
+
+async def test_pool_unlimited():
+    pool = lanes.Pool("test", limit=0)
+    async with pool.acquire(), pool.acquire():
+        assert pool.running == 0
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from backend import launcher
+
+
+def test_main(monkeypatch: pytest.MonkeyPatch):
+    calls: list[tuple[str, list[str]]] = []
+    monkeypatch.setattr(os, "execvp", lambda file, args: calls.append((file, args)))
+    # main writes to the environment, a copy of it is patched in so that nothing
+    # leaks into later tests
+    monkeypatch.setattr(os, "environ", {**os.environ, "WEB_CONCURRENCY": "3"})
+    os.environ.pop("SPAMD_MAX_CHILDREN", None)
+
+    launcher.main([])
+    assert calls == [("circusd", ["circusd", "circus.ini"])]
+    # a spamd child per web worker
+    assert os.environ["SPAMD_MAX_CHILDREN"] == "3"
+
+    # unless set
+    os.environ["SPAMD_MAX_CHILDREN"] = "1"
+    launcher.main(["other.ini"])
+    assert calls[-1] == ("circusd", ["circusd", "other.ini"])
+    assert os.environ["SPAMD_MAX_CHILDREN"] == "1"
@@ -0,0 +1,96 @@
+import fakeredis
+
+from backend import cache, factories, local_cache, schemas, stores
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def analysis(id: str, size: int = 10, ttl: float | None = None):
+    return cache.CachedAnalysis(id, {"response": b"{" + b" " * (size - 2) + b"}"}, ttl)
+
+
+def test_local_cache():
+    clock = Clock()
+    local = local_cache.LocalCache(max_size=60, ttl=10, clock=clock)
+    assert local.get("foo") is None
+
+    foo = analysis("foo")
+    local.put(foo)
+    assert local.get("foo") is foo
+    # the decompressed body counts as well as the stored fields
+    assert local.size == 20
+
+    stats = local.stats()
+    assert (stats.hits, stats.misses, stats.hit_ratio) == (1, 1, 0.5)
+
+    # the entry expires with its Redis entry if that comes first
+    local.put(analysis("bar", ttl=5))
+    clock.now = 6
+    assert local.get("bar") is None
+    assert local.get("foo") is foo
+
+    clock.now = 11
+    assert local.get("foo") is None
+
+
+def test_local_cache_eviction():
+    local = local_cache.LocalCache(max_size=60, ttl=10, clock=Clock())
+    for id in ("foo", "bar", "baz"):
+        local.put(analysis(id))
+
+    # foo is the most recently used one
+    assert local.get("foo") is not None
+    local.put(analysis("qux"))
+    assert local.get("bar") is None
+    assert local.get("foo") is not None
+    assert local.stats().evictions == 1
+    assert local.size == 60
+
+    # an entry larger than the cache is never kept
+    local.put(analysis("large", size=100))
+    assert local.get("large") is None
+
+
+def test_local_cache_invalidate():
+    local = local_cache.LocalCache(max_size=60, ttl=10, clock=Clock())
+    local.put(analysis("foo"))
+    local.invalidate("foo")
+    local.invalidate("bar")
+    assert local.get("foo") is None
+    assert local.stats().invalidations == 1
+    assert local.size == 0
+
+
+def test_conditional_lookup_counted_once():
+    local = local_cache.LocalCache(max_size=60, ttl=10, clock=Clock())
+    store = stores.RedisStore(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+
+    # a conditional request missing the local cache, then reading the body
+    assert local_cache.fetch_etag(store, "foo", local) is None
+    assert local_cache.fetch(store, ["foo"], local=local, counted=True) == [None]
+    assert (local.hits, local.misses) == (0, 1)
+
+    local.put(analysis("foo"))
+    assert local_cache.fetch_etag(store, "foo", local) is None
+    assert local_cache.fetch(store, ["foo"], local=local, counted=True) != [None]
+    assert (local.hits, local.misses) == (1, 1)
+
+
+def test_fetch_keeps_every_field(sample_eml: bytes):
+    local = local_cache.LocalCache(max_size=10 * 1024 * 1024, ttl=10, clock=Clock())
+    store = stores.RedisStore(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+    store.cache_response(
+        schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    )
+
+    # read for a full lookup, the entry serves the small projections as well
+    local_cache.fetch(store, ["foo"], local=local)
+    cached = local.get("foo")
+    assert cached is not None
+    assert set(cached.fields.keys()) == {"response", "header", "verdicts", "etag"}
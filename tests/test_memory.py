@@ -0,0 +1,81 @@
+import json
+import tracemalloc
+
+import pytest
+
+from backend import cache, factories, guard, memory, metrics, schemas
+from backend.api.endpoints.analyze import _with_debug
+
+STAGES = [
+    "check_structure",
+    "to_parsed",
+    "normalize_attachments",
+    "normalize_bodies",
+    "normalize_header",
+    "transform",
+]
+
+
+def test_new_tracker():
+    assert memory.new_tracker(False, 0) is None
+
+    tracker = memory.new_tracker(False, 64)
+    assert tracker is not None
+    assert tracker.budget == 64 * memory.MEGABYTE
+    assert not tracker.detailed
+
+
+@pytest.mark.parametrize("isolation", [True, False])
+async def test_usages(sample_eml: bytes, isolation: bool):
+    with memory.collect(memory.Tracker(detailed=True)) as tracker:
+        await guard.run(factories.EmlFactory().call, sample_eml, isolation=isolation)
+
+    assert tracker is not None
+    assert [usage.stage for usage in tracker.usages] == STAGES
+    (to_parsed,) = [usage for usage in tracker.usages if usage.stage == "to_parsed"]
+    assert to_parsed.peak > 0
+    assert len(to_parsed.sites) > 0
+    assert not tracemalloc.is_tracing()
+
+    histogram = metrics.STAGE_MEMORY_BYTES.labels("to_parsed")
+    before = histogram._sum.get()
+    memory.observe(tracker)
+    assert histogram._sum.get() == before + to_parsed.peak
+
+
+async def test_untracked(sample_eml: bytes):
+    # nothing traced without a tracker
+    await guard.run(factories.EmlFactory().call, sample_eml, isolation=False)
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.parametrize("isolation", [True, False])
+async def test_budget(sample_eml: bytes, isolation: bool):
+    with (
+        pytest.raises(guard.LimitExceededError, match="Memory budget"),
+        memory.collect(memory.Tracker(budget=1024)) as tracker,
+    ):
+        await guard.run(factories.EmlFactory().call, sample_eml, isolation=isolation)
+
+    # the stage exceeding the budget is accounted, not the next ones
+    assert tracker is not None
+    assert 0 < len(tracker.usages) < len(STAGES)
+
+
+def test_with_debug(sample_eml: bytes):
+    response = schemas.Response(eml=factories.EmlFactory().call(sample_eml), id="foo")
+    response.debug = schemas.Debug(
+        memory=[
+            schemas.StageMemory(
+                stage="to_parsed", allocated=1, peak=2, peak_rss=3, sites=[]
+            )
+        ]
+    )
+
+    # never in the cached analysis
+    serialized = cache.serialize(response)
+    assert "debug" not in json.loads(serialized)
+
+    body = json.loads(_with_debug(serialized, response.debug))
+    assert body["id"] == "foo"
+    assert body["debug"]["memory"][0]["peakRss"] == 3
@@ -0,0 +1,83 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import factories, guard, metrics
+
+
+def test_server_timing():
+    spans: list[metrics.Span] = [
+        ("stage", "to_parsed", 0.0123),
+        ("provider", "oleid", 0.5),
+    ]
+    assert (
+        metrics.server_timing(spans, 1.0)
+        == "to_parsed;dur=12.3, oleid;dur=500.0, total;dur=1000.0"
+    )
+
+
+def test_span():
+    with metrics.collect() as spans, metrics.span("provider", "oleid"):
+        pass
+
+    assert [(kind, name) for kind, name, _ in spans] == [("provider", "oleid")]
+
+    # no request, nothing to collect into
+    with metrics.span("provider", "oleid"):
+        pass
+
+
+async def test_spans_from_worker(sample_eml: bytes):
+    with metrics.collect() as spans:
+        await guard.run(factories.EmlFactory().call, sample_eml, isolation=True)
+
+    assert [name for _, name, _ in spans] == [
+        "check_structure",
+        "to_parsed",
+        "normalize_attachments",
+        "normalize_bodies",
+        "normalize_header",
+        "transform",
+    ]
+
+
+def http_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://example.com")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+@pytest.mark.parametrize(
+    ("error", "reason"),
+    [
+        (http_error(429), "rate_limited"),
+        (http_error(404), "not_found"),
+        (http_error(500), "error"),
+        (httpx.ReadTimeout("timeout"), "timeout"),
+        (TimeoutError(), "timeout"),
+    ],
+)
+def test_count_failures(error: Exception, reason: str):
+    counter = metrics.PROVIDER_FAILURES.labels("urlscan", reason)
+    before = counter._value.get()
+    with pytest.raises(type(error)), metrics.count_failures("urlscan"):
+        raise error
+
+    assert counter._value.get() == before + 1
+
+
+def test_analyze_file_server_timing(client: TestClient, sample_eml: bytes):
+    response = client.post(
+        "/api/analyze/file", files={"file": sample_eml}, params={"providers": "oleid"}
+    )
+    names = [
+        entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")
+    ]
+    assert names[0] == "check_structure"
+    assert names[-2:] == ["oleid", "total"]
+
+    text = client.get("/metrics").text
+    assert 'eml_analyzer_stage_seconds_count{stage="to_parsed"}' in text
+    assert 'eml_analyzer_provider_seconds_count{provider="oleid"}' in text
+    assert "eml_analyzer_analyses_in_flight 0.0" in text
@@ -0,0 +1,38 @@
+import email
+import email.policy
+
+from backend.factories.eml import LimitExceededError, check_structure
+from backend.mime import LazyMessage
+from benchmarks import corpus
+
+
+def test_walk(multipart_eml: bytes):
+    message = LazyMessage(multipart_eml)
+    expected = email.message_from_bytes(multipart_eml, policy=email.policy.default)
+
+    assert [part.content_type for part in message.walk()] == [
+        part.get_content_type() for part in expected.walk()
+    ]
+
+
+def test_depth(multipart_eml: bytes):
+    parts = list(LazyMessage(multipart_eml).walk())
+    assert parts[0].depth == 0
+    assert all(child.depth == 1 for child in parts[0].children)
+    assert max(part.depth for part in parts) >= 1
+
+
+def test_header_bytes(sample_eml: bytes):
+    message = LazyMessage(sample_eml)
+    assert message.headers["subject"] == "Winter promotions"
+    assert sample_eml.startswith(message.header_bytes)
+
+
+def test_walk_deep():
+    # deeper than the recursion limit allows for nested generators
+    message = LazyMessage(corpus.eml(depth=2000))
+    assert max(part.depth for part in message.walk()) >= 2000
+
+    # the limit is not capped by the walk
+    result = check_structure(corpus.eml(depth=200), max_depth=150)
+    assert isinstance(result.failure(), LimitExceededError)
@@ -0,0 +1,35 @@
+import gc
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from backend import factories, preload
+
+
+def test_sample():
+    eml = factories.EmlFactory().call(preload.sample())
+    assert eml.header.subject == "Preload"
+    assert eml.header.date.year == 2025
+    assert [attachment.filename for attachment in eml.attachments] == ["a.bin"]
+    assert "https://example.com" in eml.bodies[0].urls
+
+
+def test_preload(client: TestClient):
+    try:
+        preload.preload(client.app)  # type: ignore
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+
+def test_lazy_imports():
+    # the parsing libraries are left to the parser workers
+    modules = [*preload.PARSER_MODULES, "openai"]
+    code = (
+        f"import sys, backend.main; print([m for m in {modules} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,96 @@
+import pathlib
+import time
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from starlette.datastructures import Secret
+
+from backend import dependencies, factories, guard, profiler, settings, stores
+
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture
+def store(tmp_path: pathlib.Path) -> stores.SQLiteStore:
+    return stores.SQLiteStore(str(tmp_path / "cache.db"), expire=3600)
+
+
+def test_profile():
+    with profiler.profile(0.001) as profile:
+        busy(0.1)
+
+    assert sum(profile.stacks.values()) > 10
+    stack, count = profile.collapsed().decode().splitlines()[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("busy (test_profiler.py:")
+    assert int(count) == profile.stacks.most_common(1)[0][1]
+
+    # nothing is sampled with no interval
+    with profiler.profile(0) as profile:
+        busy(0.01)
+
+    assert profile.stacks == {}
+
+
+async def test_profile_from_worker(sample_eml: bytes):
+    # the worker samples itself, the parent thread only waits
+    with profiler.profile(0.0001) as profile:
+        await guard.run(factories.EmlFactory().call, sample_eml, isolation=True)
+
+    assert any("(eml.py:" in stack for stack in profile.stacks)
+
+
+def test_capture(store: stores.SQLiteStore):
+    with profiler.capture("foo", requested=True, optional_store=store):
+        busy(0.05)
+
+    profile = store.fetch_profile("foo")
+    assert profile is not None and b"busy (test_profiler.py:" in profile
+
+    # fast enough, not kept
+    with profiler.capture("bar", requested=False, optional_store=store, threshold=10):
+        busy(0.01)
+
+    assert store.fetch_profile("bar") is None
+
+    # too slow, kept even though it failed
+    with (
+        pytest.raises(ValueError),
+        profiler.capture("baz", requested=False, optional_store=store, threshold=0.01),
+    ):
+        busy(0.05)
+        raise ValueError
+
+    assert store.fetch_profile("baz") is not None
+
+
+def test_lookup_profile(
+    client: TestClient,
+    store: stores.SQLiteStore,
+    sample_eml: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    url = "/api/lookup/foo/profile"
+    assert client.get(url).status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", Secret("secret"))
+    client.app.dependency_overrides[dependencies.get_optional_store] = lambda: store  # type: ignore
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+    headers = {"X-Profile": "secret"}
+    assert client.get(url, headers=headers).status_code == status.HTTP_404_NOT_FOUND
+
+    response = client.post(
+        "/api/analyze/file",
+        files={"file": sample_eml},
+        params={"providers": "oleid"},
+        headers=headers,
+    )
+    id = response.json()["id"]
+    response = client.get(f"/api/lookup/{id}/profile", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
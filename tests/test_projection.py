@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from backend import cache, factories, projection, schemas
+
+
+def test_parse_fields():
+    assert projection.parse_fields("id, eml.header.from,eml.header") == {
+        "id": True,
+        "eml": {"header": True},
+    }
+    assert projection.parse_fields("eml.bodies.contentType") == {
+        "eml": {"bodies": {"contentType": True}}
+    }
+
+
+@pytest.mark.parametrize("fields", ["foo", "eml.foo", "id.foo", "eml..header", ""])
+def test_parse_fields_with_invalid_fields(fields: str):
+    with pytest.raises(projection.InvalidProjectionError):
+        projection.parse_fields(fields)
+
+
+@pytest.mark.parametrize(
+    "projected",
+    [
+        projection.PROFILES["summary"],
+        projection.PROFILES["verdicts"],
+        projection.parse_fields("eml.attachments.hash.sha256,eml.bodies.urls"),
+    ],
+)
+def test_project_cached_parts(emails: list[bytes], projected: projection.Projection):
+    for email in emails:
+        response = schemas.Response(eml=factories.EmlFactory().call(email), id="foo")
+        # projecting the cached JSON parts gives the same as pydantic's include
+        assert json.loads(
+            cache.assemble("foo", cache.serialize_parts(response), projected)
+        ) == json.loads(
+            cache.response_adapter.dump_json(
+                response, by_alias=True, include=projection.to_include(projected)
+            )
+        )
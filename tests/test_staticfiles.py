@@ -0,0 +1,78 @@
+import gzip
+import pathlib
+
+import pytest
+from fastapi import status
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from backend import staticfiles
+
+SCRIPT = b"console.log('foo');\n" * 100
+
+
+@pytest.fixture
+def client(tmp_path: pathlib.Path) -> TestClient:
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "index-B9SHoNqY.js").write_bytes(SCRIPT)
+    (assets / "index-B9SHoNqY.js.br").write_bytes(b"br")
+    (assets / "index-B9SHoNqY.js.gz").write_bytes(gzip.compress(SCRIPT))
+    (tmp_path / "index.html").write_bytes(b"<html></html>")
+
+    app = Starlette(
+        routes=[
+            Mount(
+                "/",
+                staticfiles.PrecompressedStaticFiles(html=True, directory=tmp_path),
+            )
+        ]
+    )
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,content_encoding,body",
+    [
+        ("gzip, deflate, br", "br", b"br"),
+        # TestClient decodes gzip by itself
+        ("gzip", "gzip", SCRIPT),
+        ("identity", None, SCRIPT),
+    ],
+    ids=["br", "gzip", "identity"],
+)
+def test_precompressed(
+    client: TestClient,
+    accept_encoding: str,
+    content_encoding: str | None,
+    body: bytes,
+):
+    res = client.get(
+        "/assets/index-B9SHoNqY.js", headers={"Accept-Encoding": accept_encoding}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers.get("content-encoding") == content_encoding
+    assert res.headers["content-type"].startswith("text/javascript")
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["cache-control"] == staticfiles.IMMUTABLE_CACHE_CONTROL
+    assert res.content == body
+
+
+def test_index(client: TestClient):
+    res = client.get("/")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["cache-control"] == staticfiles.REVALIDATE_CACHE_CONTROL
+    assert "vary" not in res.headers
+
+    res = client.get("/", headers={"If-None-Match": res.headers["etag"]})
+    assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_range(client: TestClient):
+    res = client.get(
+        "/assets/index-B9SHoNqY.js",
+        headers={"Accept-Encoding": "identity", "Range": "bytes=0-9"},
+    )
+    assert res.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert res.content == SCRIPT[:10]
@@ -0,0 +1,21 @@
+import pytest
+
+from backend import utils
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.5", True),
+        ("gzip;q=0", False),
+        ("*", True),
+        ("*;q=0, gzip", True),
+        ("gzip;q=0, *", False),
+        ("*;q=0", False),
+        ("identity", False),
+        ("", False),
+    ],
+)
+def test_accepts_encoding(accept_encoding: str, expected: bool):
+    assert utils.accepts_encoding(accept_encoding, "gzip") is expected